@@ -10,7 +10,7 @@
 # Description: This program does dynamic FREEZEs, VACUUMs, and ANALYZEs based on PG statistics.
 #              For large tables, it does these asynchronously, synchronous for all others.
 #              The program constrains the number of processes running in asynchronous mode.
-#              The program waits occasionally for 5 minutes if max processes is still surpassed.
+#              The program waits for running jobs to finish if max processes is still surpassed.
 #              The program avoids extremely large tables over 400GB, expecting them to be done manually.
 #
 # Date Created : June 19, 2016    Original Coding (v 1.0)
@@ -86,6 +86,68 @@
 # July 22, 2023    V5.4  Changed logic for freezing tables. Now it is based on an xid_age minimum value instead of a percentage of max freeze threshold
 # July 31, 2023    V5.5  Fixed bugs for FREEZE query and removed limit clause
 # Aug. 02, 2023    V5.6  Fixed bug with empty list for vacuums in progress
+# Oct. 16, 2026    V5.7  Replaced nohup psql async jobs with an in-process pool of worker threads, each with its own autocommit connection.
+#                        Async jobs now report duration and errors, and never exceed threshold_max_processes.
+# Oct. 16, 2026    V5.8  Added --jobs parameter to run sync actions on N concurrent connections, like vacuumdb -j.
+#                        Replaced the fixed half second sleep before each action with an adaptive pacing delay.
+# Oct. 16, 2026    V5.9  Added --engine asyncio to drive jobs from one event loop on psycopg2 async connections.
+#                        It polls pg_stat_progress_vacuum and starts queued async jobs as soon as a slot frees up.
+# Oct. 16, 2026    V6.0  Replaced the 5 minute sleeps of the max processes throttle and of the final wait with waits that end
+#                        as soon as a job finishes, falling back to polling every --pollinterval seconds.
+# Oct. 16, 2026    V6.1  Replaced the per section catalog queries of sections 5 through 9 and the inquiry with one snapshot query
+#                        per run, filtered in Python.
+# Oct. 16, 2026    V6.2  Track processed tables in a set of pg_class oids instead of a list of names, and keep snapshot rows in
+#                        slotted Relation records.
+# Oct. 16, 2026    V6.3  Added --priority to process candidates and queued jobs by a cost-based score instead of by name:
+#                        dead tuples, stale statistics and xid/multixact freeze headroom per second of expected I/O.
+# Oct. 16, 2026    V6.4  Added --deadline and --budget for maintenance windows. Each job's duration is estimated from its size and the
+#                        throughput of the jobs finished so far, and only jobs expected to finish in time are started.
+#                        Jobs still running at the deadline are waited for or cancelled, see --deadlinepolicy. A job cannot be
+#                        left running past the exit: the worker connections it runs on close with the process.
+# Oct. 16, 2026    V6.5  Added --history to record every job in a local SQLite file: start/end time, heap and index pages,
+#                        dead tuples removed and WAL bytes. Measured per table throughput then drives duration estimates,
+#                        the async vs sync decision and the planned duration shown by dry runs.
+# Oct. 16, 2026    V6.6  Added --progress to print a periodic status line for the jobs pg_vacuum started, sampled from
+#                        pg_stat_progress_vacuum (and pg_stat_progress_analyze on PG13+), with scan rates and ETAs.
+# Oct. 16, 2026    V6.7  Added --adaptive: a controller samples server side pressure during the run (active backends, buffer writes,
+#                        WAL rate, replication lag) and shrinks or grows the number of concurrent jobs to stay under the targets.
+# Oct. 16, 2026    V6.8  Added --maxlag: while the replay/flush lag of any streaming replica is over it, new jobs are paused or,
+#                        with --lagpolicy throttle, started with a lowered vacuum_cost_limit. Both resume once the lag drains to half.
+# Oct. 16, 2026    V6.9  Each job now starts with session settings sized to its table: small tables run without cost delay, large ones
+#                        get more maintenance_work_mem and (PG16+) a larger BUFFER_USAGE_LIMIT, and are paced while the server is under pressure.
+# Oct. 16, 2026    V7.0  Size maintenance_work_mem per vacuum from the table's dead tuples, under a --membudget shared by all concurrent jobs.
+#                        Vacuums that still needed more than one index pass are flagged so the budget can be tuned.
+# Oct. 16, 2026    V7.1  PARALLEL degree per table from its indexes over min_parallel_index_scan_size, instead of max_parallel_maintenance_workers
+#                        for every vacuum, with parallel workers of concurrent jobs accounted against max_parallel_workers.
+#                        Fixed NameError (parallel_statement) when both disabling page skipping and parallel vacuum applied.
+# Oct. 16, 2026    V7.2  Predict the heap pages a vacuum must read from the visibility map (pg_class.relallvisible, or pg_visibility_map_summary()
+#                        when the extension is installed). Plain vacuums that would read less than --vmskip percent of the table are skipped,
+#                        --priority costs vacuums by their predicted I/O, and a dry run reports it per table.
+# Oct. 16, 2026    V7.3  Estimate reclaimable heap and btree index bytes per table in bulk from pg_stats widths and pg_class pages,
+#                        or the heap from pgstattuple_approx() with --bloat approx. Candidates and the --inquiry report can be
+#                        ranked by it, and --minbloat skips vacuums that would reclaim less.
+# Oct. 16, 2026    V7.4  Freeze planner also weighs mxid_age(relminmxid) against autovacuum_multixact_freeze_max_age, the --freeze
+#                        threshold scaled to it, and orders candidates by whichever of the two limits is closest.
+# Oct. 16, 2026    V7.5  Every run with --history samples the cluster's next xid and multixact id. --freezewindows forecasts from their
+#                        burn rate when each table crosses its freeze max age and spreads the freezes due over the next windows.
+# Oct. 16, 2026    V7.6  Partition tree read once from pg_inherits, replacing the per row pg_inherits subqueries of the PG<10 paths.
+#                        Cold partitions, untouched since their last vacuum and analyze and all-visible, are skipped, hot ones go
+#                        first with siblings of different parents interleaved, and a partitioned parent is analyzed once, after its partitions
+#                        (as ANALYZE ONLY on PG18+ when they were processed in the same run).
+# Oct. 16, 2026    V7.7  Added --alldatabases: every connectable database from pg_database, closest to wraparound first and then the
+#                        quietest, run one after another under the same jobs, memory and deadline budget. Fixed NameErrors on the
+#                        error paths of the instance and server version checks.
+# Oct. 16, 2026    V7.8  Added --inventory: a fleet of clusters from an INI (or YAML) file, each with its own options, run --fleetjobs
+#                        at a time in child processes with their output prefixed, and their final counters merged. The client host
+#                        load check is done once by the run that starts the others.
+# Oct. 16, 2026    V7.9  Added --metrics and --metricsport: jobs by action and result, duration histograms, pages, bytes and WAL processed,
+#                        queue depth, active workers, throttling, and catalog query versus job time, in the Prometheus text format.
+# Oct. 16, 2026    V8.0  Added --events: a JSON lines stream of every candidate evaluated (sync, async or skip and why), job started,
+#                        skipped at the deadline or finished, and throttle action, with typed fields.
+# Oct. 16, 2026    V8.1  Added --profile: wall time by phase, every statement of the main, monitor and controller connections
+#                        (get_query_cnt() polls included), jobs and waits (pacing, max processes, replication lag, high load),
+#                        printed as a breakdown at exit and optionally dumped to a CSV file. --alldatabases plans every database
+#                        in this process, their jobs sharing the same pools, memory budget and controller.
 #
 # Notes:
 #   1. Do not run this program multiple times since it may try to vacuum or analyze the same table again
@@ -110,12 +172,12 @@
 # 00 03 * * * /home/postgres/mjv/pg_vacuumb.py -H localhost -d <dbname> -u postgres -p 5432 -y 5 -t 5000 --dryrun >/home/postgres/mjv/optimize_db_`/bin/date +'\%Y-\%m-\%d-\%H.\%M.\%S'`.log 2>&1
 #
 ##################################################################################################
-import sys, os, threading, argparse, time, datetime, signal
+import sys, os, threading, argparse, time, datetime, signal, heapq, re, math, shlex, atexit
 from optparse import OptionParser
 import psycopg2
 import subprocess
 
-version = '5.6  August 02, 2023'
+version = '8.1  October 16, 2026'
 pgversion = 0
 OK = 0
 BAD = -1
@@ -143,12 +205,108 @@ threshold_max_sync = 1073741824000
 # max async processes
 threshold_max_processes = 12
 
+# v8.1: statements counted as vacuums/analyzes in pg_stat_activity, case insensitive
+job_query_re = '^(vacuum|analyze)'
+
+# v6.5: with --history, tables whose measured duration is expected to exceed this many seconds are done asynchronously,
+#       instead of going by threshold_async_rows and threshold_max_sync
+threshold_async_secs = 3600
+
+# v6.5: throughput of a table is averaged over its last runs
+history_runs = 5
+
+# v7.5: --freezewindows plans freezes over this many upcoming maintenance windows, one window being the usual time
+#       between runs (gaps under min_window_secs are reruns of the same window). Burn rates use the last burn_days of samples.
+freeze_windows  = -1
+burn_days       = 30
+min_window_secs = 3600
+
 # load threshold, wait for a time if very high
 load_threshold = 250
 
+# v5.8: adaptive pacing between dispatched actions replaces the fixed half second sleep.
+# The delay is a fraction of the time the last action took, capped at the old half second, and doubles on errors.
+pace_ratio = 0.1
+pace_max   = 0.5
+
+# v6.3: --priority scoring. Assumed vacuum I/O rate in bytes/sec and fixed overhead in seconds per statement,
+# used to turn a table's size into an expected duration. Freeze max ages are read from the server at startup.
+io_rate      = 104857600
+job_overhead = 0.1
+freeze_max_age           = 200000000
+multixact_freeze_max_age = 400000000
+
+# v6.4: an ANALYZE reads a sample of 300 x default_statistics_target pages, not the whole table
+analyze_sample_bytes = 300 * 100 * 8192
+
+# v6.4: epoch seconds by which work must be done (--deadline/--budget), and what happens to jobs still running then
+deadline        = None
+deadline_policy = 'wait'
+
+# v6.7: --adaptive pressure targets, sampled on the database server every --pollinterval seconds.
+#       Concurrency is halved when any one is exceeded and grows by one job while all are below 80% of theirs.
+#       Active backends exclude pg_vacuum's own, buffer writes are 8 kB blocks per second, WAL and lag are in bytes.
+pressure_active_backends = 32
+pressure_buffer_writes   = 12800
+pressure_wal_rate        = 67108864
+pressure_repl_lag        = 1073741824
+
+# v6.8: --maxlag in bytes (-1 = off), and the vacuum_cost_limit jobs start with under --lagpolicy throttle while lag is over it.
+#       Manual vacuums default to vacuum_cost_delay 0, which disables cost limiting, so a delay in ms is set along with it.
+max_repl_lag   = -1
+lag_policy     = 'pause'
+lag_cost_limit = 50
+lag_cost_delay = 2
+
+# v6.9: per job settings by table size, first tier whose max size (bytes) the table is under:
+#       (max size, maintenance_work_mem, BUFFER_USAGE_LIMIT). None leaves the server setting alone.
+# v7.0: maintenance_work_mem in bytes, only used for tables whose dead tuples are not known
+job_tiers = [(1073741824,   None,       None),
+             (107374182400, 536870912,  '256MB'),
+             (None,         1073741824, '1GB')]
+
+# v7.0: bytes of maintenance_work_mem per dead tuple: a 6 byte TID, plus headroom since n_dead_tup is an estimate.
+#       Before PG17 vacuum cannot use more than 1GB for dead TIDs. --membudget (MB) is shared by all concurrent vacuums.
+dead_tuple_bytes = 8
+memory_budget    = 4294967296
+
+# v7.2: a plain VACUUM expected to read less than this percent of its heap pages, the rest being all-visible, is skipped (0 = never).
+#       block_size is read at startup, vm_summary is set when the pg_visibility extension can read the map itself.
+vm_skip_pct = 1.0
+block_size  = 8192
+vm_summary  = False
+
+# v7.3: --bloat estimate | approx ranks candidates by reclaimable bytes, --minbloat (MB) skips vacuums reclaiming less.
+#       Fixed sizes of the estimate: heap and btree page headers, btree special space, index tuple header and line pointer.
+bloat_mode        = ''
+bloat_min         = -1
+page_header_bytes = 24
+btree_special     = 16
+index_tuple_bytes = 8
+line_pointer      = 4
+
+# v8.1: statements listed by name in the --profile breakdown, the rest are summed up in one line
+profile_top = 15
+
+# v6.9: pacing of jobs above the first tier while the --adaptive controller has cut concurrency, autovacuum's defaults
+load_cost_limit = 200
+load_cost_delay = 2
+
+# v6.9: vacuum_cost_delay of our sessions, read at startup. Small tables only need a SET if it is not 0 already.
+session_cost_delay = 0.0
+
+# v5.9: seconds between pg_stat_progress_vacuum polls of the asyncio engine
+# v6.0: also the fallback poll interval while waiting for a free slot or for vacuums to finish, see --pollinterval
+poll_interval = 5
+
 # PG v13+ enable parallel vacuuming for indexes > 130000
 bParallel = False
 parallelworkers = 0
+# v7.1: oid -> number of indexes over min_parallel_index_scan_size, a partitioned table gets the most of its partitions
+parallel_indexes = {}
+# v7.6: partition tree from pg_inherits, child oid -> parent oid and parent oid -> child oids, read once per database
+partition_parent   = {}
+partition_children = {}
 
 class Range(object):
     def __init__(self, start, end):
@@ -188,16 +346,22 @@ def signal_handler(signal, frame):
 def check_maxtables():
     if len(tablist) > threshold_max_tables:
         printit ("Max Tables Reached (%d). Consider increasing max tables." % (len(tablist)))
+        # v5.7: let the async jobs already dispatched finish before leaving
+        finish_jobs()
         conn.close()
         sys.exit (1)
 
+# v5.7: worker threads print too, so serialize the output lines
+printlock = threading.Lock()
+
 def printit(text):
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     txt = now + ' ' + text
-    print (txt)
-    # don't use v3 way to flush output since we want this to work for v2 and 3
-    #print (txt, flush=True)
-    sys.stdout.flush()
+    with printlock:
+        print (txt)
+        # don't use v3 way to flush output since we want this to work for v2 and 3
+        #print (txt, flush=True)
+        sys.stdout.flush()
     return
 
 def execute_cmd(text):
@@ -264,12 +428,34 @@ def getload():
         os.system("mail -s \"Load Average is Higher than Number of CPU's abc@abc.com 123@123.com < /tmp/load_average.out")
 '''
 
-def get_query_cnt(conn, cur):
-    sql = "select count(*) from pg_stat_activity where state = 'active' and application_name = 'pg_vacuum' and query like 'VACUUM (FREEZE, VERBOSE)%' OR query like 'VACUUM (ANALYZE, VERBOSE%' OR query like 'VACUUM (VERBOSE%' OR query like 'ANALYZE VERBOSE%'"
+def get_query_cnt(conn, cur, excludepids=None):
+    # v5.7 fix: parenthesize the ORs, otherwise idle sessions whose last query was a vacuum were counted as running
+    # v8.1: only other pg_vacuum sessions are counted here, by application_name and any statement starting with
+    #       VACUUM or ANALYZE, so option lists (PARALLEL, BUFFER_USAGE_LIMIT, no VERBOSE) no longer slip through.
+    #       Jobs of this run are counted from pool state by own_processes().
+    sql = "select count(*) from pg_stat_activity where state = 'active' and application_name = 'pg_vacuum' and query ~* '%s' and pid <> pg_backend_pid()" % job_query_re
+    if excludepids:
+        # v5.7: ignore backends of our own worker pool that already finished but have not exited yet
+        sql = sql + " and pid not in (%s)" % ','.join([str(pid) for pid in excludepids])
     cur.execute(sql)
     rows = cur.fetchone()
     return int(rows[0])
 
+def own_processes():
+    # v8.1: jobs of this run, async ones running or queued and sync ones running on --jobs workers.
+    #       Sync jobs on the main connection never run while the main thread counts.
+    cnt = 0
+    if async_pool is not None:
+        cnt = cnt + async_pool.active()
+    if sync_pool is not None:
+        with sync_pool.cond:
+            cnt = cnt + sync_pool.running
+    return cnt
+
+def running_processes(conn, cur):
+    # v8.1: what threshold_max_processes is compared against
+    return own_processes() + get_query_cnt(conn, cur, pool_pids())
+
 def get_vacuums_in_progress(conn, cur):
     sql = "SELECT 'tables', array_agg(relid::regclass) from pg_stat_progress_vacuum group by 1"
     cur.execute(sql)
@@ -280,9 +466,10 @@ def get_vacuums_in_progress(conn, cur):
         return rows[1]
        
 
-def skip_table (atable, tablist):
-    #print ("table=%s  tablist=%s" % (atable, tablist))
-    if atable in tablist:
+def skip_table (aoid, tablist):
+    # v6.2: tablist is a set of pg_class oids, so this is a constant time lookup instead of a scan of table name strings
+    #print ("oid=%s  tablist=%s" % (aoid, tablist))
+    if aoid in tablist:
         #print ("table is in the list")
         return True
     else:
@@ -290,21 +477,609 @@ def skip_table (atable, tablist):
         return False
 
 def wait_for_processes(conn,cur):
-    cnt = 0
+    # v6.0: poll every poll_interval seconds (or as soon as one of our jobs finishes) instead of sleeping 5 minutes at a time.
+    #       Still gives up after 100 minutes like the 20 five minute sleeps did before.
+    profile_phase('wait for running vacuums')
+    started = time.time()
+    lastrc  = -1
     while True:
-        rc = get_query_cnt(conn, cur)
-        cnt = cnt + 1
-        if cnt > 20:
+        rc = get_query_cnt(conn, cur, pool_pids())
+        if rc == 0:
+            break
+        if time.time() - started > 6000:
             printit ("NOTE: Program ending, but vacuums/analyzes(%d) still in progress." % (rc))
             break
-        if rc > 0:
-            tables = get_vacuums_in_progress(conn, cur)
-            printit ("NOTE: vacuums still running: %d (%s) Waiting another 5 minutes before exiting..." % (rc, tables))
-            time.sleep(300)
-        else:
+        if deadline_passed():
+            # v6.4
+            printit ("NOTE: Deadline reached, vacuums/analyzes(%d) still in progress." % (rc))
             break
+        if rc != lastrc:
+            tables = get_vacuums_in_progress(conn, cur)
+            printit ("NOTE: vacuums still running: %d (%s) Waiting for them to finish before exiting..." % (rc, tables))
+            lastrc = rc
+        polled = time.time()
+        wait_for_job(poll_interval)
+        waited('running_vacuums', time.time() - polled)
     return
 
+def wait_for_slot(conn, cur):
+    # v6.0: completion driven throttle. Wake up whenever one of our jobs finishes, or every poll_interval seconds
+    #       to notice vacuums of other sessions ending, and continue as soon as the count drops to the threshold.
+    #       Gives up after 5 minutes like the old fixed sleep did.
+    # v8.1: a slot is free only below the threshold, so threshold_max_processes is the most that run at once
+    rc = running_processes(conn, cur)
+    if rc < threshold_max_processes:
+        printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
+        return rc
+    printit ("Current process cnt(%d) has reached the threshold (%d). Waiting up to 5 minutes for one to finish..." % (rc, threshold_max_processes))
+    started = time.time()
+    while rc >= threshold_max_processes and time.time() - started < 300 and not deadline_passed():
+        wait_for_job(min(poll_interval, 300 - (time.time() - started), time_left()))
+        rc = running_processes(conn, cur)
+    waited('max_processes', time.time() - started)
+    if metrics is not None:
+        metrics.add('pg_vacuum_throttle_pauses_total', reason='max_processes')
+    if events is not None:
+        events.emit('throttle', reason='max_processes', running=rc, threshold=threshold_max_processes, waited=round(time.time() - started, 3))
+    if rc < threshold_max_processes:
+        printit ("Current process cnt(%d) is less than threshold (%d) after %.1f sec.  Processing will continue..." % (rc, threshold_max_processes, time.time() - started))
+    return rc
+
+def waited(reason, seconds):
+    # v8.1: time new work was held back, for the metrics and the profile
+    if metrics is not None:
+        metrics.add('pg_vacuum_throttle_seconds_total', seconds, reason=reason)
+    if profiler is not None:
+        profiler.record('wait', reason, time.time() - seconds, seconds)
+
+def profile_phase(name):
+    # v8.1: the main flow moves on to the next phase of the profile
+    if profiler is not None:
+        profiler.phase(name)
+
+def time_left():
+    # v6.4: seconds until the deadline, or effectively forever without one
+    if deadline is None:
+        return 86400.0
+    return deadline - time.time()
+
+def deadline_passed():
+    return deadline is not None and time.time() >= deadline
+
+def wait_for_job(timeout):
+    # v6.0: block until any pool job completes or the timeout expires
+    if timeout > 0:
+        job_done.wait(timeout)
+    job_done.clear()
+
+def size_pretty(size):
+    # v6.1: same output as pg_size_pretty(bigint), so the snapshot does not need it per row
+    if size < 10240:
+        return "%d bytes" % size
+    size = size // 512
+    for unit in ('kB', 'MB', 'GB', 'TB'):
+        if size < 20479 or unit == 'TB':
+            return "%d %s" % ((size + 1) // 2, unit)
+        size = size // 1024
+
+class Relation(object):
+    # v6.2: one relation of the catalog snapshot. Slots keep 100k+ of these compact, the names match the snapshot columns.
+    __slots__ = ('oid', 'table', 'relkind', 'size', 'reltuples', 'n_tup', 'n_live_tup', 'n_dead_tup', 'n_mod_since_analyze', 'partitioned', 'xid_age',
+                 'last_vacuum', 'last_autovacuum', 'last_analyze', 'last_autoanalyze', 'last_analyze_ts', 'last_autoanalyze_ts', 'last_vacuumed_ts',
+                 'last_vacuumed', 'last_analyzed', 'days_vacuum', 'days_analyze', 'days_last_analyze', 'av_threshold', 'expect_av', 'mxid_age',
+                 'relpages', 'relallvisible', 'relallfrozen')
+
+    def __init__(self, columns, row):
+        for column, value in zip(columns, row):
+            setattr(self, column, value)
+
+def load_snapshot(conn, cur):
+    # v6.1: one catalog/stats query per run. Sections 5 through 9 and the inquiry used to run their own large
+    #       pg_class x pg_namespace x pg_stat_user_tables joins, calling pg_total_relation_size and pg_size_pretty per row.
+    #       Now every column they need is pulled once, in table name order, and their predicates are evaluated in Python.
+    # v6.3: multixact age for the priority score, mxid_age() is new in 9.5
+    if pgversion >= 90500:
+        mxidage = "mxid_age(c.relminmxid)"
+    else:
+        mxidage = "0"
+    if pgversion > 100000:
+        partitioned = "c.relispartition"
+    else:
+        partitioned = "c.oid IN (SELECT inhrelid FROM pg_inherits)"
+    # v7.2: visibility map counts for the I/O prediction, relallfrozen is new in 18
+    if pgversion >= 180000:
+        allfrozen = "c.relallfrozen"
+    else:
+        allfrozen = "NULL::integer"
+    sql = "SELECT c.oid, n.nspname || '.\"' || c.relname || '\"' as table, c.relkind, pg_total_relation_size(c.oid) as size, c.reltuples, c.reltuples::bigint as n_tup, " \
+          "u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint as n_dead_tup, u.n_mod_since_analyze::bigint as n_mod_since_analyze, %s as partitioned, age(c.relfrozenxid) as xid_age, " \
+          "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, " \
+          "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze, " \
+          "u.last_analyze as last_analyze_ts, u.last_autoanalyze as last_autoanalyze_ts, GREATEST(u.last_vacuum, u.last_autovacuum) as last_vacuumed_ts, " \
+          "GREATEST(u.last_vacuum, u.last_autovacuum)::date as last_vacuumed, GREATEST(u.last_analyze, u.last_autoanalyze)::date as last_analyzed, " \
+          "now()::date - GREATEST(u.last_vacuum, u.last_autovacuum)::date as days_vacuum, now()::date - GREATEST(u.last_analyze, u.last_autoanalyze)::date as days_analyze, " \
+          "now()::date - u.last_analyze::date as days_last_analyze, " \
+          "to_char(CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + (CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples), '9G999G999G999') AS av_threshold, " \
+          "CASE WHEN CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + (CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples) < u.n_dead_tup THEN '*' ELSE '' END AS expect_av, %s as mxid_age, " \
+          "c.relpages, c.relallvisible, %s as relallfrozen " \
+          "FROM pg_class c JOIN pg_namespace n ON (c.relnamespace = n.oid) JOIN pg_stat_user_tables u ON (u.relid = c.oid) WHERE c.relkind in ('r','m','p') " % (partitioned, mxidage, allfrozen)
+    if schema != "":
+        sql = sql + "AND n.nspname = '%s' " % schema
+    sql = sql + "ORDER BY 2"
+    if debug: printit("DEBUG   MODE: snapshot %s" % sql)
+
+    started = time.time()
+    try:
+        cur.execute(sql)
+    except Exception as error:
+        printit("Snapshot Exception: %s *** %s" % (type(error), error))
+        conn.close()
+        sys.exit (1)
+    columns = [desc[0] for desc in cur.description]
+    rels = [Relation(columns, row) for row in cur.fetchall()]
+    # v6.3: oid index over the snapshot
+    relations.clear()
+    for rel in rels:
+        relations[rel.oid] = rel
+    if _verbose: printit("VERBOSE MODE: catalog snapshot: %d relations in %.2f sec" % (len(rels), time.time() - started))
+    return rels
+
+def priority_score(rel, action):
+    # v6.3: expected benefit per second of I/O, in tuples fixed per second.
+    #       Benefit counts dead tuples removed by a vacuum, modified or never analyzed tuples refreshed by an analyze,
+    #       and for a vacuum the tuples it must freeze once xid or multixact age passes half of its freeze max age.
+    #       Cost is the expected duration: fixed per statement overhead plus the table size at the assumed I/O rate.
+    # v6.4: the I/O rate is learned from finished jobs, see Estimator
+    # v7.6: a partitioned table has no storage and an age of INT_MAX, its freeze benefit and size are those of its partitions
+    leaves = []
+    if rel.relkind == 'p':
+        leaves = [relations[oid] for oid in partition_leaves(rel.oid) if oid in relations]
+    live = max(rel.n_live_tup, 0)
+    dead = max(rel.n_dead_tup, 0)
+    benefit = 0.0
+    if 'VACUUM' in action:
+        benefit = benefit + dead
+        if rel.relkind == 'p':
+            benefit = benefit + sum([freeze_benefit(leaf) for leaf in leaves])
+        else:
+            benefit = benefit + freeze_benefit(rel)
+    if 'ANALYZE' in action:
+        if rel.last_analyzed is None:
+            benefit = benefit + live
+        else:
+            benefit = benefit + min(rel.n_mod_since_analyze, live + dead)
+    if rel.relkind == 'p':
+        size = sum([vacuum_size(leaf, action) for leaf in leaves])
+    else:
+        size = vacuum_size(rel, action)
+    return benefit / estimator.estimate(size, action, rel.table)
+
+def freeze_benefit(rel):
+    # v6.3: tuples a vacuum must freeze, once xid or multixact age passes half of its freeze max age
+    headroom = max(float(rel.xid_age) / freeze_max_age, float(rel.mxid_age) / multixact_freeze_max_age)
+    if headroom > 0.5:
+        return max(rel.reltuples, rel.n_live_tup, 0) * (headroom - 0.5) * 2
+    return 0.0
+
+def vacuum_size(rel, action):
+    # v7.2: a vacuum costs the I/O the visibility map leaves it
+    size = rel.size
+    if 'VACUUM' in action:
+        predicted = vacuum_io(rel, False)
+        if predicted is not None:
+            size = predicted[2]
+    return size
+
+def partition_leaves(oid):
+    # v7.6: the partitions with storage under a partitioned table, at any depth
+    leaves = []
+    for child in partition_children.get(oid, []):
+        if child in partition_children:
+            leaves.extend(partition_leaves(child))
+        else:
+            leaves.append(child)
+    return leaves
+
+def visibility(rel):
+    # v7.2: (heap pages, all-visible, all-frozen or None) of a table. pg_visibility_map_summary() reads the map itself.
+    #       Otherwise pg_class, whose counts only move at vacuum/analyze: every tuple changed since may have cleared a bit.
+    global vm_summary
+    if vm_summary and rel.oid not in vm_cache:
+        try:
+            cur.execute("SELECT pg_relation_size(%d) / %d, all_visible, all_frozen FROM pg_visibility_map_summary(%d)" % (rel.oid, block_size, rel.oid))
+            vm_cache[rel.oid] = tuple([int(value) for value in cur.fetchone()])
+        except Exception as error:
+            printit ("Unable to read the visibility map of %s, using pg_class from now on: %s" % (rel.table, error))
+            vm_summary = False
+    if rel.oid in vm_cache:
+        return vm_cache[rel.oid]
+    pages   = max(rel.relpages, 0)
+    changed = max(rel.n_dead_tup or 0, rel.n_mod_since_analyze or 0, 0)
+    visible = max(min(rel.relallvisible, pages) - changed, 0)
+    frozen  = None
+    if rel.relallfrozen is not None:
+        frozen = min(rel.relallfrozen, visible)
+    return pages, visible, frozen
+
+def vacuum_io(rel, aggressive):
+    # v7.2: (heap pages, pages to read, bytes to read) for a vacuum of the table, None when its size is unknown.
+    #       A normal vacuum skips all-visible pages, an aggressive one (freeze) only all-frozen ones, and indexes and
+    #       TOAST are read when there are dead tuples to remove.
+    if rel.relkind == 'p' or rel.relpages <= 0:
+        return None
+    pages, visible, frozen = visibility(rel)
+    if disablepageskipping:
+        scan = pages
+    elif aggressive:
+        scan = pages - (frozen or 0)
+    else:
+        scan = pages - visible
+    io = scan * block_size
+    if max(rel.n_dead_tup or 0, 0) > 0:
+        io = io + max(rel.size - pages * block_size, 0)
+    return pages, scan, io
+
+def vm_note(oid, action, action_name):
+    # v7.2: predicted I/O of a vacuum candidate, kept for the dry run report
+    global snapshot
+    if 'VACUUM' not in action:
+        return None
+    if snapshot is None:
+        snapshot = load_snapshot(conn, cur)
+    if oid not in relations:
+        return None
+    predicted = vacuum_io(relations[oid], 'FREEZE' in action)
+    if predicted is not None:
+        vm_predicted[oid] = (action_name,) + predicted
+    return predicted
+
+def vm_skip(oid, action_name):
+    # v7.2: skip a plain VACUUM that would read less than vm_skip_pct of its heap. Every section building a plain
+    #       or analyze vacuum asks, a freeze is never skipped since even an all-frozen table needs it to advance relfrozenxid.
+    if (dbname, oid) in vm_skipped:
+        return True
+    predicted = vm_note(oid, 'VACUUM', action_name)
+    if predicted is None or vm_skip_pct <= 0 or disablepageskipping:
+        return False
+    pages, scan, io = predicted
+    if scan * 100.0 >= pages * vm_skip_pct:
+        return False
+    printit ("VM skip    %10s: %-57s pages: %10d  to read: %10d  io: %10s" % (action_name, relations[oid].table, pages, scan, size_pretty(io)))
+    vm_skipped.add((dbname, oid))
+    skipped(oid, action_name, 'all_visible')
+    return True
+
+def vm_plan():
+    # v7.2: dry run report of the pages and bytes the planned vacuums are expected to read
+    planned = sorted([oid for oid in tablist if oid in vm_predicted], key=lambda oid: relations[oid].table)
+    skips = len([key for key in vm_skipped if key[0] == dbname])
+    pages = 0
+    scan  = 0
+    io    = 0
+    for oid in planned:
+        action_name, relpages, relscan, relio = vm_predicted[oid]
+        printit ("Predicted  %10s: %-57s pages: %10d  to read: %10d  io: %10s" % (action_name, relations[oid].table, relpages, relscan, size_pretty(relio)))
+        pages = pages + relpages
+        scan  = scan + relscan
+        io    = io + relio
+    if pages > 0:
+        printit ("Predicted vacuum I/O: %s for %d tables, %d of %d heap pages to read (%.1f%%)  Skipped as all-visible: %d" % (size_pretty(io), len(planned), scan, pages, scan * 100.0 / pages, skips))
+    elif skips > 0:
+        printit ("Skipped as all-visible: %d" % skips)
+
+def load_partitions():
+    # v7.6: one pg_inherits read instead of a subquery per catalog row. Covers old style inheritance too.
+    try:
+        cur.execute("SELECT inhrelid, inhparent FROM pg_inherits")
+        rows = cur.fetchall()
+    except Exception as error:
+        printit("Partitions Exception: %s *** %s" % (type(error), error))
+        conn.close()
+        sys.exit (1)
+    partition_parent.clear()
+    partition_children.clear()
+    for child, parent in rows:
+        partition_parent[child] = parent
+        partition_children.setdefault(parent, []).append(child)
+    if _verbose: printit("VERBOSE MODE: partition tree: %d parents, %d children" % (len(partition_children), len(partition_parent)))
+
+def hotness(oid):
+    # v7.6: tuples changed since the last vacuum/analyze
+    if oid not in relations:
+        return 0
+    rel = relations[oid]
+    return max(rel.n_dead_tup or 0, 0) + max(rel.n_mod_since_analyze or 0, 0)
+
+def partition_order(rows):
+    # v7.6: partitions keep the places their section gave them, but refilled hottest first within each parent,
+    #       taking one from each parent in turn so that concurrent workers are spread over different partitioned tables
+    slots = [seq for seq, row in enumerate(rows) if row[-1] in partition_parent]
+    if len(slots) < 2:
+        return rows
+    families = {}
+    parents  = []
+    for seq in slots:
+        parent = partition_parent[rows[seq][-1]]
+        if parent not in families:
+            families[parent] = []
+            parents.append(parent)
+        families[parent].append(rows[seq])
+    for parent in parents:
+        families[parent].sort(key=lambda row: -hotness(row[-1]))
+    merged = []
+    while len(merged) < len(slots):
+        for parent in parents:
+            if len(families[parent]) > 0:
+                merged.append(families[parent].pop(0))
+    ordered = list(rows)
+    for seq, row in zip(slots, merged):
+        ordered[seq] = row
+    return ordered
+
+def partition_skip(oid, action_name):
+    # v7.6: skip a cold partition: nothing changed since its last vacuum and analyze, and every page all-visible,
+    #       all-frozen too where that is known. Freezes don't ask, a cold partition still needs one to advance relfrozenxid.
+    if (dbname, oid) in cold_skipped:
+        return True
+    if oid not in partition_parent or oid not in relations:
+        return False
+    rel = relations[oid]
+    if rel.relkind == 'p' or rel.relpages <= 0 or rel.last_vacuumed is None or rel.last_analyzed is None or hotness(oid) > 0:
+        return False
+    pages, visible, frozen = visibility(rel)
+    if visible < pages or (frozen is not None and frozen < pages):
+        return False
+    if _verbose: printit("VERBOSE MODE: Cold skip %10s: %s pages: %d" % (action_name, rel.table, pages))
+    cold_skipped.add((dbname, oid))
+    skipped(oid, action_name, 'cold_partition')
+    return True
+
+def defer_parent(job):
+    # v7.6: an ANALYZE of a partitioned table is held until the run's other jobs are done, see analyze_parents()
+    if job.deferred or job.action() != 'ANALYZE' or job.oid not in partition_children:
+        return False
+    if job.oid in relations and relations[job.oid].relkind != 'p':
+        return False
+    job.deferred   = True
+    job.partitions = partition_children[job.oid]
+    parent_jobs.append(job)
+    printit ("Deferred   %10s: %-57s until its partitions are done" % (job.action_name, job.table))
+    return True
+
+def analyze_parents():
+    # v7.6: analyze deferred partitioned tables once their partitions' jobs have finished. Where partitions were
+    #       processed in this run, PG18+ (ANALYZE ONLY) analyzes only the parent instead of recursing into every partition again.
+    global parent_jobs
+    if len(parent_jobs) == 0:
+        return
+    for pool in (sync_pool, async_pool):
+        if pool is not None and len(pool.threads) > 0:
+            if deadline is None:
+                pool.wait_idle(86400.0)
+            else:
+                pool.wait_idle(max(time_left(), 0.0))
+    jobs = parent_jobs
+    parent_jobs = []
+    for job in jobs:
+        if pgversion >= 180000 and len([oid for oid in job.partitions if oid in tablists.get(job.dbname, ())]) > 0:
+            job.only = True
+        # v8.1: without --jobs a parent runs on the main connection, which must be on its database
+        if sync_pool is None and not use_database(job.dbname):
+            continue
+        printit ("Parent     %10s: %-57s after its partitions" % (job.action_name, job.table))
+        run_sync(job)
+
+def maxalign(size):
+    return (int(math.ceil(size)) + 7) // 8 * 8
+
+def load_bloat():
+    # v7.3: reclaimable bytes per table, the pages it has over what its live tuples would need at its fillfactor.
+    #       Tuple widths come from pg_stats, so tables never analyzed are unknown. Btree indexes on plain columns
+    #       are estimated the same way and added to their table, a partitioned table gets the sum of its partitions.
+    global bloat
+    bloat = {}
+    fillfactor = "COALESCE(substring(array_to_string(%s.reloptions, ',') FROM 'fillfactor=([0-9]+)')::int, %d)"
+    heapsql = "SELECT c.oid, c.relpages, c.reltuples, %s, count(*), sum((1 - s.null_frac) * s.avg_width), max(s.null_frac) " \
+              "FROM pg_class c JOIN pg_namespace n ON (c.relnamespace = n.oid) JOIN pg_stats s ON (s.schemaname = n.nspname AND s.tablename = c.relname AND NOT s.inherited) " \
+              "WHERE c.relkind in ('r','m') GROUP BY 1, 2, 3, 4" % (fillfactor % ('c', 100))
+    indexsql = "SELECT i.indrelid, ic.relpages, ic.reltuples, %s, sum((1 - s.null_frac) * s.avg_width) " \
+               "FROM pg_index i JOIN pg_class ic ON (ic.oid = i.indexrelid) JOIN pg_am am ON (am.oid = ic.relam AND am.amname = 'btree') " \
+               "JOIN pg_class c ON (c.oid = i.indrelid) JOIN pg_namespace n ON (c.relnamespace = n.oid) " \
+               "JOIN pg_attribute a ON (a.attrelid = i.indrelid AND a.attnum = ANY (i.indkey)) " \
+               "JOIN pg_stats s ON (s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = a.attname AND NOT s.inherited) " \
+               "WHERE ic.relpages > 0 GROUP BY i.indexrelid, i.indrelid, i.indnatts, 2, 3, 4 HAVING count(*) = i.indnatts" % (fillfactor % ('ic', 90))
+    if debug: printit("DEBUG   MODE: bloat %s" % heapsql)
+    if debug: printit("DEBUG   MODE: bloat %s" % indexsql)
+    started = time.time()
+    try:
+        cur.execute(heapsql)
+        heaprows = cur.fetchall()
+        cur.execute(indexsql)
+        indexrows = cur.fetchall()
+    except Exception as error:
+        printit("Bloat Exception: %s *** %s" % (type(error), error))
+        conn.close()
+        sys.exit (1)
+    for oid, pages, tuples, ff, natts, width, nullfrac in heaprows:
+        if tuples < 0:
+            # never analyzed since PG14
+            continue
+        header = page_header_bytes - 1
+        if nullfrac > 0:
+            header = header + (natts + 7) // 8
+        tuple_bytes = maxalign(header) + maxalign(float(width)) + line_pointer
+        needed = int(math.ceil(tuples * tuple_bytes / ((block_size - page_header_bytes) * ff / 100.0)))
+        bloat[oid] = [max(pages - needed, 0) * block_size, 0, ff]
+    for oid, pages, tuples, ff, width in indexrows:
+        if oid not in bloat or tuples < 0:
+            continue
+        tuple_bytes = index_tuple_bytes + maxalign(float(width)) + line_pointer
+        needed = int(math.ceil(tuples * tuple_bytes / ((block_size - page_header_bytes - btree_special) * ff / 100.0))) + 1
+        bloat[oid][1] = bloat[oid][1] + max(pages - needed, 0) * block_size
+    for parent in partition_children:
+        partition_bloat(parent, partition_children)
+    if _verbose: printit("VERBOSE MODE: bloat estimate: %d tables in %.2f sec" % (len(bloat), time.time() - started))
+
+def partition_bloat(oid, children):
+    # v7.3: sum of the partitions' estimates, unknown if one of them is
+    if oid in bloat:
+        return bloat[oid]
+    if oid not in children:
+        # a partition without pg_stats has no estimate
+        return None
+    total = [0, 0, 100]
+    for child in children.get(oid, []):
+        part = partition_bloat(child, children)
+        if part is None:
+            return None
+        total[0] = total[0] + part[0]
+        total[1] = total[1] + part[1]
+    bloat[oid] = total
+    return total
+
+def reclaimable(oid):
+    # v7.3: estimated reclaimable heap plus index bytes of a table, None if unknown.
+    #       With --bloat approx the heap part comes from pgstattuple_approx(), which skips all-visible pages.
+    global bloat_mode
+    if bloat is None:
+        load_bloat()
+    if oid not in bloat:
+        return None
+    heap, index, ff = bloat[oid]
+    if bloat_mode == 'approx' and oid not in bloat_approx and oid in relations and relations[oid].relkind in ('r', 'm'):
+        try:
+            cur.execute("SELECT table_len, approx_tuple_len FROM pgstattuple_approx(%d)" % oid)
+            table_len, tuple_len = cur.fetchone()
+            bloat_approx[oid] = max(int(table_len - tuple_len * 100.0 / ff), 0)
+        except Exception as error:
+            printit ("Unable to run pgstattuple_approx on %s, estimating from pg_stats from now on: %s" % (relations[oid].table, error))
+            bloat_mode = 'estimate'
+    if oid in bloat_approx:
+        heap = bloat_approx[oid]
+    return heap + index
+
+def bloat_skip(oid, action_name):
+    # v7.3: with --minbloat, skip a vacuum expected to reclaim less. Tables without an estimate are kept.
+    if bloat_min < 0:
+        return False
+    if (dbname, oid) in bloat_skipped:
+        return True
+    space = reclaimable(oid)
+    if space is None or space >= bloat_min:
+        return False
+    if _verbose: printit("VERBOSE MODE: Bloat skip %10s: %s reclaimable: %s" % (action_name, oid in relations and relations[oid].table or oid, size_pretty(space)))
+    bloat_skipped.add((dbname, oid))
+    skipped(oid, action_name, 'min_bloat')
+    return True
+
+def prioritize(rows, action):
+    # v6.3: with --priority, pop section rows off a heap by priority score instead of walking them in name order
+    # v6.4: stop handing out candidates once the deadline has passed
+    # v7.3: with --bloat, by reclaimable bytes unless --priority is given too
+    if not priority and bloat_mode == '':
+        # v7.6: unless the user asked for date order, hot partitions first and siblings interleaved
+        if not orderbydate:
+            rows = partition_order(rows)
+        for seq, row in enumerate(rows):
+            if deadline_passed():
+                printit ("Deadline reached. Skipping the remaining %d candidates." % (len(rows) - seq))
+                return
+            yield row
+        return
+    heap = []
+    for seq, row in enumerate(rows):
+        # section rows end with the relation oid, sections 2 through 4 may find tables the snapshot does not have
+        if not priority:
+            score = float(reclaimable(row[-1]) or 0)
+        elif row[-1] in relations:
+            score = priority_score(relations[row[-1]], action)
+        else:
+            score = 0.0
+        heap.append((-score, seq, row))
+    heapq.heapify(heap)
+    while heap:
+        if deadline_passed():
+            printit ("Deadline reached. Skipping the remaining %d candidates." % len(heap))
+            return
+        score, seq, row = heapq.heappop(heap)
+        if _verbose: printit("VERBOSE MODE: priority %14.2f  %s" % (-score, row[0]))
+        yield row
+
+def never_processed(rel):
+    return rel.last_vacuum is None and rel.last_autovacuum is None and rel.last_analyze is None and rel.last_autoanalyze is None
+
+def vacs_flag(rel):
+    if rel.last_vacuum is None and rel.last_autovacuum is None:
+        return 'NOVACS'
+    return 'VACS'
+
+def gt(value, threshold):
+    # SQL comparison semantics: a NULL day difference never satisfies a threshold
+    return value is not None and value > threshold
+
+def ge(value, threshold):
+    return value is not None and value >= threshold
+
+def snapshot_vacuum_analyze():
+    # section 5: dead tups, days since analyze and days since vacuum all over their thresholds, or never processed when none given
+    rows = []
+    for rel in snapshot:
+        if not (rel.n_dead_tup >= threshold_dead_tups and gt(rel.days_analyze, threshold_max_days_analyze) and gt(rel.days_vacuum, threshold_max_days_vacuum)) and \
+           not (threshold_dead_tups == -1 and threshold_max_days_analyze == -1 and threshold_max_days_vacuum == -1 and never_processed(rel)):
+            continue
+        rows.append((rel.table, size_pretty(rel.size), rel.size, rel.n_tup, rel.n_live_tup, rel.n_dead_tup, rel.n_mod_since_analyze, rel.partitioned,
+                     rel.last_vacuum, rel.last_autovacuum, rel.last_analyze, rel.last_autoanalyze, vacs_flag(rel), rel.oid))
+    return rows
+
+def snapshot_vacuum():
+    # section 6: days since vacuum and dead tups over their thresholds, or never processed when neither given
+    rows = []
+    for rel in snapshot:
+        if not (ge(rel.days_vacuum, threshold_max_days_vacuum) and rel.n_dead_tup >= threshold_dead_tups) and \
+           not (threshold_max_days_vacuum == -1 and threshold_dead_tups == -1 and never_processed(rel)):
+            continue
+        rows.append((rel.table, rel.last_vacuum, rel.last_autovacuum, rel.n_tup, rel.n_dead_tup, size_pretty(rel.size), rel.size, rel.partitioned,
+                     rel.av_threshold, rel.expect_av, vacs_flag(rel), rel.last_vacuumed_ts, rel.oid))
+    if orderbydate:
+        # GREATEST(last_vacuum, last_autovacuum) asc, never vacuumed last
+        rows.sort(key=lambda row: (row[11] is None, row[11]))
+    return rows
+
+def snapshot_analyze():
+    # section 7: ordinary and partitioned tables not analyzed within max days and not too large
+    rows = []
+    for rel in snapshot:
+        if rel.relkind not in ('r', 'p'):
+            continue
+        if not (gt(rel.days_analyze, threshold_max_days_analyze) and rel.size <= threshold_max_size):
+            continue
+        if rel.reltuples == 0:
+            tupdiff = -1
+        else:
+            tupdiff = round((rel.n_live_tup / rel.reltuples) * 100)
+        rows.append((rel.table, rel.n_tup, rel.n_live_tup, rel.n_dead_tup, rel.n_mod_since_analyze, size_pretty(rel.size), rel.size, rel.partitioned,
+                     rel.last_analyze_ts, rel.last_autoanalyze_ts, tupdiff, rel.days_last_analyze, rel.oid))
+    return rows
+
+def snapshot_old_vacuums():
+    # section 9: ordinary and partitioned tables not vacuumed within max days with enough dead tups
+    rows = []
+    for rel in snapshot:
+        if rel.relkind not in ('r', 'p'):
+            continue
+        if not (gt(rel.days_vacuum, threshold_max_days_vacuum) and rel.n_dead_tup >= threshold_dead_tups):
+            continue
+        rows.append((rel.table, size_pretty(rel.size), rel.size, rel.n_tup, rel.n_live_tup, rel.n_dead_tup, rel.partitioned,
+                     rel.last_vacuum, rel.last_autovacuum, rel.last_analyze, rel.last_autoanalyze, rel.oid))
+    return rows
+
+def ratio(part, live):
+    if live == 0 and part == 0:
+        return 0.0
+    if live == 0:
+        return 100.0
+    return round(float(part) / live, 5)
+
 def _inquiry(conn,cur,tablist):
   # v 2.7 feature: if inquiry, then show results of 2 queries
   # print ("tables evaluated=%s" % tablist)
@@ -319,42 +1094,21 @@ def _inquiry(conn,cur,tablist):
   FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = u.schemaname and u.relname = c.relname and u.relid = c.oid and c.relkind in ('r','m','p')
   and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') order by 1;
   '''
-  if schema == "":
-    sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, " \
-          "pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-          "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, " \
-          "age(c.relfrozenxid) as xid_age," \
-          "c.reltuples::bigint AS n_tup, " \
-          "u.n_live_tup::bigint as n_live_tup, " \
-          "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint as anal_tup, " \
-          "CASE WHEN u.n_live_tup = 0 AND u.n_dead_tup = 0 THEN 0.00 WHEN u.n_live_tup = 0 AND u.n_dead_tup > 0 THEN 100.00 ELSE round((u.n_dead_tup::numeric / u.n_live_tup::numeric),5) END pct_dead, " \
-          "CASE WHEN u.n_live_tup = 0 AND u.n_mod_since_analyze = 0 THEN 0.00 WHEN u.n_live_tup = 0 AND u.n_mod_since_analyze > 0 THEN 100.00 ELSE round((u.n_mod_since_analyze::numeric / u.n_live_tup::numeric),5) END pct_analyze, " \
-          "GREATEST(u.last_vacuum, u.last_autovacuum)::date as last_vacuumed, " \
-          "GREATEST(u.last_analyze, u.last_autoanalyze)::date as last_analyzed " \
-          "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = u.schemaname and u.relname = c.relname and u.relid = c.oid and c.relkind in ('r','m','p') " \
-          "and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') order by 1"
-  else:
-    sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table,  " \
-           "pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-           "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size,  " \
-           "age(c.relfrozenxid) as xid_age,  " \
-           "c.reltuples::bigint AS n_tup,  " \
-           "u.n_live_tup::bigint as n_live_tup, " \
-           "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint as anal_tup, " \
-          "CASE WHEN u.n_live_tup = 0 AND u.n_dead_tup = 0 THEN 0.00 WHEN u.n_live_tup = 0 AND u.n_dead_tup > 0 THEN 100.00 ELSE round((u.n_dead_tup::numeric / u.n_live_tup::numeric),5) END pct_dead, " \
-          "CASE WHEN u.n_live_tup = 0 AND u.n_mod_since_analyze = 0 THEN 0.00 WHEN u.n_live_tup = 0 AND u.n_mod_since_analyze > 0 THEN 100.00 ELSE round((u.n_mod_since_analyze::numeric / u.n_live_tup::numeric),5) END pct_analyze, " \
-           "GREATEST(u.last_vacuum, u.last_autovacuum)::date as last_vacuumed, GREATEST(u.last_analyze, u.last_autoanalyze)::date as last_analyzed " \
-           "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and u.schemaname = n.nspname and u.relname = c.relname and u.relid = c.oid and c.relkind in ('r','m','p') " \
-           "order by 1" % schema
+  # v6.1: report from the run's catalog snapshot, taken here if no section needed it yet
+  global snapshot
+  if snapshot is None:
+      snapshot = load_snapshot(conn, cur)
+  rows = []
+  for rel in snapshot:
+      rows.append((rel.table, size_pretty(rel.size), rel.size, rel.xid_age, rel.n_tup, rel.n_live_tup, rel.n_dead_tup, rel.n_mod_since_analyze,
+                   ratio(rel.n_dead_tup, rel.n_live_tup), ratio(rel.n_mod_since_analyze, rel.n_live_tup), rel.last_vacuumed, rel.last_analyzed, rel.oid))
+  # v7.3: with --bloat, largest reclaimable first, and with --minbloat only tables over it.
+  #       Tables without an estimate are kept, as bloat_skip() keeps them.
+  if bloat_mode != '':
+      if bloat_min >= 0:
+          rows = [row for row in rows if reclaimable(row[-1]) is None or reclaimable(row[-1]) >= bloat_min]
+      rows.sort(key=lambda row: -(reclaimable(row[-1]) or 0))
 
-  try:
-    cur.execute(sql)
-  except Exception as error:
-   printit("Exception: %s *** %s" % (type(error), error))
-   conn.close()
-   sys.exit (1)
-
-  rows = cur.fetchall()
   if len(rows) == 0:
    printit ("Not able to retrieve inquiry results.")
   else:
@@ -376,10 +1130,11 @@ def _inquiry(conn,cur,tablist):
     anal_pct         = row[9]
     last_vacuumed    = str(row[10])
     last_analyzed    = str(row[11])
+    oid              = row[12]
 
     if cnt == 1:
-        printit("%55s %14s %14s %14s %12s %10s %10s %10s %10s %10s %12s %12s" % ('table', 'sizep', 'size', 'xid_age', 'n_tup', 'n_live_tup', 'dead_tup', 'anal_tup', 'dead_pct', 'anal_pct', 'last_vacuumed', 'last_analyzed'))
-        printit("%55s %14s %14s %14s %12s %10s %10s %10s %10s %10s %12s %12s" % ('-----', '-----', '----', '-------', '-----', '----------', '--------', '--------', '--------', '--------', '-------------', '-------------'))
+        printit("%55s %14s %14s %14s %12s %10s %10s %10s %10s %10s %12s %12s%s" % ('table', 'sizep', 'size', 'xid_age', 'n_tup', 'n_live_tup', 'dead_tup', 'anal_tup', 'dead_pct', 'anal_pct', 'last_vacuumed', 'last_analyzed', bloat_column('reclaimable')))
+        printit("%55s %14s %14s %14s %12s %10s %10s %10s %10s %10s %12s %12s%s" % ('-----', '-----', '----', '-------', '-----', '----------', '--------', '--------', '--------', '--------', '-------------', '-------------', bloat_column('-----------')))
 
     #print ("table = %s  len=%d" % (table, len(table)))
 
@@ -389,17 +1144,29 @@ def _inquiry(conn,cur,tablist):
     #    pretty_size_span = pretty_size_span - reduce
 
     if inquiry == 'all':
-        printit("%55s %14s %14d %14d %12d %10d %10d %10d %10f %10f %12s %12s" % (table, sizep, size, xid_age, n_tup, n_live_tup, dead_tup, anal_tup, dead_pct, anal_pct, last_vacuumed, last_analyzed))
+        printit("%55s %14s %14d %14d %12d %10d %10d %10d %10f %10f %12s %12s%s" % (table, sizep, size, xid_age, n_tup, n_live_tup, dead_tup, anal_tup, dead_pct, anal_pct, last_vacuumed, last_analyzed, bloat_column(oid)))
     else:
-        if skip_table(table, tablist):
-            printit("%55s %14s %14d %14d %12d %10d %10d %10d %10f %10f %12s %12s" % (table, sizep, size, xid_age, n_tup, n_live_tup, dead_tup, anal_tup, dead_pct, anal_pct, last_vacuumed, last_analyzed))
+        if skip_table(oid, tablist):
+            printit("%55s %14s %14d %14d %12d %10d %10d %10d %10f %10f %12s %12s%s" % (table, sizep, size, xid_age, n_tup, n_live_tup, dead_tup, anal_tup, dead_pct, anal_pct, last_vacuumed, last_analyzed, bloat_column(oid)))
 
   # end of inquiry section
 
   return
 
+def bloat_column(value):
+    # v7.3: extra inquiry column with --bloat, a heading or the reclaimable bytes of an oid
+    if bloat_mode == '':
+        return ''
+    if isinstance(value, str):
+        return " %14s" % value
+    space = reclaimable(value)
+    if space is None:
+        return " %14s" % '-'
+    return " %14d" % space
+
 def add_runningvacs_to_tablist(conn,cur,tablist):
-  sql = "SELECT query FROM pg_stat_activity WHERE query ilike 'vacuum %' or query ilike 'analyze %' ORDER BY 1"
+  # v8.1: of this database only, an --alldatabases run has jobs of its own running in the others
+  sql = "SELECT query FROM pg_stat_activity WHERE datname = current_database() AND (query ilike 'vacuum %' or query ilike 'analyze %') ORDER BY 1"
   try:
     cur.execute(sql)
   except Exception as error:
@@ -427,24 +1194,1783 @@ def add_runningvacs_to_tablist(conn,cur,tablist):
       if cnt2 == partlen:
         # must be table name
         apart = apart.replace(";", "")
-        tablist.append(apart)
-
-# for atable in tablist:
-#    print("excluded table: %s" % atable)
+        # v6.2: resolve the name to its oid, whichever way it was quoted
+        try:
+          cur.execute("SELECT %s::regclass::oid", (apart,))
+          tablist.add(cur.fetchone()[0])
+        except Exception as error:
+          if _verbose: printit ("VERBOSE MODE: Ignoring running vacuum/analyze on %s: %s" % (apart, error))
+
+# for aoid in tablist:
+#    print("excluded table: %s" % aoid)
   return
 
 def get_instance_cnt(conn,cur):
+  # pg_stat_activity lists the backends of every database, so this counts pg_vacuum instances cluster wide
   sql = "select count(*) from pg_stat_activity where application_name = 'pg_vacuum'"
   try:
       cur.execute(sql)
   except Exception as error:
-      printit ("Unable to check for multiple pg_vacuum instances: %s" % (e))
-      return rc, BAD
+      printit ("Unable to check for multiple pg_vacuum instances: %s" % (error))
+      return BAD, 0
 
   rows = cur.fetchone()
   instances = int(rows[0]) - 1
   return OK, instances
 
+def child_args(drop, extra, minutes):
+  # v7.8: this run's command line for a child run, less the options in drop (short, long, takes a value) and
+  #       followed by extra, which overrides what came before. --deadline/--budget become the minutes left,
+  #       since a child started after HH:MM would take tomorrow's.
+  drop = list(drop) + [('-D', '--deadline', True), ('-B', '--budget', True)]
+  argv = []
+  skip = False
+  for arg in sys.argv[1:]:
+      if skip:
+          skip = False
+          continue
+      for short, long, value in drop:
+          if arg in (short, long):
+              skip = value
+              break
+          if value and (arg.startswith(long + '=') or (arg.startswith(short) and len(arg) > 2)):
+              break
+      else:
+          argv.append(arg)
+  argv = argv + list(extra)
+  if minutes is not None:
+      argv = argv + ['-B', str(minutes)]
+  return [sys.executable, os.path.abspath(__file__)] + argv
+
+def child_file(path):
+  # v8.1: the file name of a per run output, with host, port and database added in runs started by --inventory
+  if os.environ.get('PG_VACUUM_DRIVER') is None:
+      return path
+  root, ext = os.path.splitext(path)
+  return "%s_%s%s" % (root, re.sub(r'[^A-Za-z0-9_]', '_', "%s_%d_%s" % (hostname or 'local', dbport, dbname)), ext)
+
+def minutes_left():
+  # v7.8: whole minutes before the deadline for a child run about to start, None without one
+  if deadline is None:
+      return None
+  return int((deadline - time.time()) // 60)
+
+def all_databases():
+  # v7.7: every database of the cluster for this run. Databases closest to wraparound go first; the rest start with
+  #       the quietest, by active backends right now.
+  # v8.1: planned one after the other by this run into the same pools, budgets and controller, see use_database().
+  #       mxid_age() is new in 9.5.
+  if pgversion >= 90500:
+      mxid = "mxid_age(d.datminmxid), current_setting('autovacuum_multixact_freeze_max_age')::bigint"
+  else:
+      mxid = "0, %d" % multixact_freeze_max_age
+  sql = "SELECT d.datname, age(d.datfrozenxid), %s, " \
+        "(SELECT count(*) FROM pg_stat_activity a WHERE a.datname = d.datname AND a.state = 'active' AND a.pid <> pg_backend_pid()), " \
+        "current_setting('autovacuum_freeze_max_age')::bigint " \
+        "FROM pg_database d WHERE d.datallowconn AND NOT d.datistemplate" % mxid
+  try:
+      cur.execute(sql)
+      rows = cur.fetchall()
+  except Exception as error:
+      printit ("Unable to list databases: %s" % (error))
+      conn.close()
+      sys.exit (1)
+
+  databases = []
+  for datname, xidage, mxidage, mxmax, active, maxage in rows:
+      ratio  = max(float(xidage) / maxage, float(mxidage) / mxmax)
+      urgent = ratio >= 0.5
+      databases.append(((not urgent, 0 if urgent else active, -ratio), datname, xidage, mxidage, active))
+  databases.sort()
+  for key, datname, xidage, mxidage, active in databases:
+      printit ("Database: %-30s xid_age: %10d  mxid_age: %10d  active backends: %3d%s" % (datname, xidage, mxidage, active, '  (wraparound first)' if not key[0] else ''))
+  return [datname for key, datname, xidage, mxidage, active in databases]
+
+def connect_string(datname):
+  # v4.7 fix for ident cases, ie, no hostname provided, even localhost
+  # v8.1: for every connection of the run, to the database given
+  if hostname == '':
+      return "dbname=%s port=%d user=%s application_name=%s connect_timeout=5" % (datname, dbport, dbuser, 'pg_vacuum' )
+  return "dbname=%s port=%d user=%s host=%s application_name=%s connect_timeout=5" % (datname, dbport, dbuser, hostname, 'pg_vacuum' )
+
+def use_database(datname):
+  # v8.1: move the main connection to another database of an --alldatabases run and drop what was read from the last one.
+  #       Jobs already handed to the pools took what they need along and connect to their own database.
+  global conn, cur, dbname, snapshot, bloat
+  if datname == dbname:
+      return True
+  try:
+      newconn = psycopg2.connect(connect_string(datname))
+  except Exception as error:
+      printit("Database Connection Error: %s *** %s" % (type(error), error))
+      return False
+  conn.close()
+  conn = newconn
+  conn.set_isolation_level(0)
+  cur = conn.cursor(cursor_factory=TimedCursor)
+  main_pids.append(conn.get_backend_pid())
+  dbname = datname
+  snapshot = None
+  relations.clear()
+  parallel_indexes.clear()
+  vm_cache.clear()
+  vm_predicted.clear()
+  bloat = None
+  bloat_approx.clear()
+  if events is not None:
+      events.common['dbname'] = dbname
+  if history is not None:
+      history.dbname = dbname
+  load_partitions()
+  return True
+
+def inquire_databases():
+  # v8.1: the inquiry of every database planned, once their jobs are done
+  for datname in databases:
+      if datname in tablists and use_database(datname):
+          if args.alldatabases:
+              printit ("Database %s" % datname)
+          _inquiry(conn, cur, tablists[datname])
+
+def load_inventory(path):
+  # v7.8: the clusters of a fleet, one INI section each (keys in [DEFAULT] apply to all of them), or a YAML
+  #       mapping of name to keys when the file ends in .yaml/.yml and PyYAML is installed.
+  #       Keys: host, port, dbname, user and options, the rest of the command line for that cluster.
+  clusters = []
+  try:
+      if path.endswith('.yaml') or path.endswith('.yml'):
+          try:
+              import yaml
+          except ImportError:
+              printit ("YAML inventories need the PyYAML package.  Use an INI file instead.")
+              sys.exit (1)
+          with open(path) as f:
+              data = yaml.safe_load(f) or {}
+          if isinstance(data, list):
+              data = dict((str(entry.get('name', i + 1)), entry) for i, entry in enumerate(data))
+          for name in data:
+              clusters.append((str(name), dict((k, v) for k, v in (data[name] or {}).items() if k != 'name')))
+      else:
+          try:
+              import configparser
+          except ImportError:
+              import ConfigParser as configparser
+          ini = configparser.RawConfigParser()
+          if not ini.read(path):
+              printit ("Inventory file not found: %s" % path)
+              sys.exit (1)
+          for name in ini.sections():
+              clusters.append((name, dict(ini.items(name))))
+  except Exception as error:
+      printit ("Unable to read inventory %s: %s" % (path, error))
+      sys.exit (1)
+
+  fleet = []
+  for name, keys in clusters:
+      extra = []
+      for key, flag in (('host', '-H'), ('port', '-p'), ('dbname', '-d'), ('user', '-U')):
+          if keys.get(key) not in (None, ''):
+              extra = extra + [flag, str(keys[key])]
+      options = keys.get('options') or []
+      if not isinstance(options, list):
+          options = shlex.split(str(options))
+      extra = extra + [str(option) for option in options]
+      unknown = set(keys) - set(['host', 'port', 'dbname', 'user', 'options'])
+      if unknown:
+          printit ("Unknown inventory keys for cluster %s: %s" % (name, ', '.join(sorted(unknown))))
+          sys.exit (1)
+      if keys.get('dbname') in (None, '') and dbname == '':
+          printit ("No dbname for cluster %s in the inventory or on the command line." % name)
+          sys.exit (1)
+      fleet.append((name, extra))
+  if not fleet:
+      printit ("No clusters in inventory %s" % path)
+      sys.exit (1)
+  return fleet
+
+# the final counters line of a run, summed up over the fleet
+summary_re = re.compile(r'Vacuum Freeze: (\d+)  Vacuum Analyze: (\d+)  Total Vacuums: (\d+)  Total Analyzes: (\d+)  '
+                        r'Skipped Partitioned Tables: (\d+)  Total Skipped Tables: (\d+)  Total Async Jobs: (\d+)')
+
+def fleet_cluster(name, extra, slots, results):
+  # v7.8: one cluster of the fleet in a child run of its own, its output prefixed with the cluster name
+  with slots:
+      minutes = minutes_left()
+      if minutes is not None and minutes < 1:
+          results[name] = (None, None)
+          return
+      counters = [0] * 7
+      # clusters run side by side, so only the textfile: one port cannot serve them all
+      drop = [('-I', '--inventory', True), ('-J', '--fleetjobs', True), ('-N', '--metricsport', True)]
+      try:
+          proc = subprocess.Popen(child_args(drop, extra, minutes), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                  env=dict(os.environ, PG_VACUUM_DRIVER='1'))
+      except Exception as error:
+          printit ("Unable to start pg_vacuum for cluster %s: %s" % (name, error))
+          results[name] = (1, counters)
+          return
+      for line in iter(proc.stdout.readline, b''):
+          line = line.decode('utf-8', 'replace').rstrip()
+          match = summary_re.search(line)
+          if match:
+              counters = [a + int(b) for a, b in zip(counters, match.groups())]
+          with printlock:
+              print ("[%s] %s" % (name, line))
+              sys.stdout.flush()
+      results[name] = (proc.wait(), counters)
+
+def run_fleet(path, fleetjobs):
+  # v7.8: every cluster of the inventory, at most fleetjobs at a time, each in its own process so a failure or a
+  #       hang in one cluster never holds up another. Counters are merged from their final summary lines.
+  fleet   = load_inventory(path)
+  slots   = threading.Semaphore(fleetjobs)
+  results = {}
+  threads = []
+  printit ("Fleet: %d clusters from %s, %d at a time" % (len(fleet), path, fleetjobs))
+  for name, extra in fleet:
+      thread = threading.Thread(target=fleet_cluster, args=(name, extra, slots, results))
+      thread.daemon = True
+      thread.start()
+      threads.append(thread)
+  for thread in threads:
+      while thread.is_alive():
+          thread.join(1)
+
+  totals  = [0] * 7
+  failed  = 0
+  skipped = 0
+  for name, extra in fleet:
+      rc, counters = results.get(name, (1, None))
+      if rc is None:
+          skipped = skipped + 1
+          printit ("Cluster: %-30s skipped at deadline" % name)
+          continue
+      if rc != 0:
+          failed = failed + 1
+      counters = counters or [0] * 7
+      totals = [a + b for a, b in zip(totals, counters)]
+      printit ("Cluster: %-30s rc: %3d  freezes: %6d  vacuum analyzes: %6d  vacuums: %6d  analyzes: %6d  skipped: %6d  async jobs: %6d" \
+               % (name, rc, counters[0], counters[1], counters[2], counters[3], counters[5], counters[6]))
+  printit ("Fleet totals: Vacuum Freeze: %d  Vacuum Analyze: %d  Total Vacuums: %d  Total Analyzes: %d  Skipped Partitioned Tables: %d  Total Skipped Tables: %d  Total Async Jobs: %d " % tuple(totals))
+  printit ("Clusters processed: %d  failed: %d  skipped at deadline: %d" % (len(fleet) - skipped, failed, skipped))
+  sys.exit(1 if failed else 0)
+
+class VacuumJob(object):
+    # v5.7: one VACUUM/ANALYZE statement handed to the worker pool
+    def __init__(self, table, command, options, action_name, size=0, tups=0, oid=None):
+        self.table       = table
+        self.command     = command
+        self.options     = options
+        self.action_name = action_name
+        self.size        = size
+        self.tups        = tups
+        self.oid         = oid
+        # v8.1: its database, and what tune_job() needs from it, since the main connection may be on the next one when it starts
+        self.dbname      = dbname
+        self.dead        = None
+        if oid in relations:
+            self.dead = relations[oid].n_dead_tup
+        self.indexes     = parallel_indexes.get(oid, 0)
+        # v6.3: pools start the most valuable queued job first, equal priorities in submit order
+        self.priority    = 0.0
+        if priority and oid in relations:
+            self.priority = priority_score(relations[oid], self.action())
+        self.started     = None
+        self.ended       = None
+        self.error       = None
+        self.output      = []
+        # v6.6: backend running the job, for the progress monitor
+        self.pid         = None
+        # v6.8: (name, value) session settings in force while the job runs, decided when it starts
+        self.settings    = []
+        # v6.9: PG16+ BUFFER_USAGE_LIMIT option, also decided when it starts
+        self.buffer_limit = None
+        # v7.0: maintenance_work_mem granted from the memory budget
+        self.memory       = 0
+        # v7.1: PARALLEL degree granted from the parallel worker budget
+        self.parallel     = None
+        # v7.6: partitioned parent ANALYZE held until its partitions are done, then possibly of the parent ONLY
+        self.deferred     = False
+        self.only         = False
+        self.partitions   = []
+
+    def sql(self):
+        command = self.command
+        opts    = [opt for opt in self.options if opt != '']
+        table   = self.table
+        if self.only:
+            table = 'ONLY ' + table
+        extra   = []
+        if self.parallel is not None:
+            extra.append("PARALLEL %d" % self.parallel)
+        if self.buffer_limit is not None:
+            extra.append("BUFFER_USAGE_LIMIT '%s'" % self.buffer_limit)
+        if len(extra) > 0:
+            # options only go in parentheses after the bare command
+            if command == 'VACUUM ANALYZE':
+                command = 'VACUUM'
+                opts    = ['ANALYZE'] + opts
+            opts = opts + extra
+        if len(opts) == 0:
+            return "%s %s" % (command, table)
+        if command == 'ANALYZE' and opts == ['VERBOSE']:
+            # parenthesized ANALYZE options are not valid prior to PG v11
+            return "ANALYZE VERBOSE %s" % table
+        return "%s (%s) %s" % (command, ', '.join(opts), table)
+
+    def setup_sql(self):
+        if len(self.settings) == 0:
+            return None
+        return '; '.join(["SET %s = %s" % (name, value) for name, value in self.settings])
+
+    def reset_sql(self):
+        return '; '.join(["RESET %s" % name for name, value in self.settings])
+
+    def action(self):
+        if self.command.startswith('ANALYZE'):
+            return 'ANALYZE'
+        if 'ANALYZE' in self.command or 'ANALYZE' in self.options:
+            return 'VACUUM ANALYZE'
+        return 'VACUUM'
+
+    def duration(self):
+        if self.started is None or self.ended is None:
+            return 0.0
+        return self.ended - self.started
+
+def tune_job(job):
+    # v6.8: session settings a job starts with
+    # v6.9: sized by table: small tables at full speed, larger ones with the memory and buffer ring of their tier,
+    #       paced like autovacuum while the adaptive controller sees pressure. A replication lag throttle overrides the pacing.
+    tier  = [t for t in job_tiers if t[0] is None or job.size < t[0]][0]
+    large = tier is not job_tiers[0]
+    settings = []
+    if controller is not None and controller.throttled:
+        settings.append(('vacuum_cost_limit', lag_cost_limit))
+        settings.append(('vacuum_cost_delay', lag_cost_delay))
+    elif large and controller is not None and controller.limit < controller.workers:
+        settings.append(('vacuum_cost_limit', load_cost_limit))
+        settings.append(('vacuum_cost_delay', load_cost_delay))
+    elif session_cost_delay != 0:
+        settings.append(('vacuum_cost_delay', 0))
+    # v7.0: memory for the dead TIDs of the table, or the tier's when its dead tuples are not known
+    if job.action() != 'ANALYZE':
+        if job.dead is not None:
+            need = max(job.dead, 0) * dead_tuple_bytes
+        else:
+            need = tier[1] or 0
+        job.memory = memory.reserve(job, need)
+        if job.memory > memory.floor:
+            settings.append(('maintenance_work_mem', "'%dkB'" % (job.memory // 1024)))
+        # v7.1: the leader vacuums one index itself, so a table with n large indexes can use n - 1 workers.
+        #       Always explicit, without a clause the server would pick a degree the budget does not know about.
+        if bParallel:
+            job.parallel = workers.reserve(job, min(max(job.indexes - 1, 0), parallelworkers))
+    job.settings = settings
+    if tier[2] is not None and pgversion >= 160000:
+        job.buffer_limit = tier[2]
+
+class Budget(object):
+    # v7.0: maintenance_work_mem accountant shared by every connection running vacuums. A job is granted what its dead tuples
+    #       need, capped by what vacuum can use and by what is left of the budget, but never less than the server setting,
+    #       which it would get anyway. Grants are returned when the job ends.
+    # v7.1: also the parallel worker accountant, with a floor of 0 workers
+    def __init__(self, budget, floor, cap):
+        self.budget = budget
+        self.floor  = floor
+        self.cap    = cap
+        self.used   = 0
+        self.grants = {}
+        self.lock   = threading.Lock()
+
+    def reserve(self, job, need):
+        with self.lock:
+            grant = max(min(need, self.cap, self.budget - self.used), self.floor)
+            self.used = self.used + grant
+            self.grants[id(job)] = grant
+            return grant
+
+    def release(self, job):
+        with self.lock:
+            self.used = self.used - self.grants.pop(id(job), 0)
+
+def index_passes(job):
+    # v7.0: index vacuuming passes from VACUUM VERBOSE output, "index scans: N" since PG14,
+    #       before that one "scanned index" line per index per pass
+    text  = '\n'.join(job.output)
+    found = re.findall(r'index scans: (\d+)', text)
+    if found:
+        return max([int(value) for value in found])
+    counts = {}
+    for name in re.findall(r'scanned index "([^"]*)"', text):
+        counts[name] = counts.get(name, 0) + 1
+    if counts:
+        return max(counts.values())
+    return 0
+
+def release_job(job):
+    # v7.0: return the job's memory and flag vacuums that ran out of it
+    # v7.1: and its parallel workers
+    global multipass_jobs
+    memory.release(job)
+    workers.release(job)
+    passes = index_passes(job)
+    if passes > 1:
+        with skiplock:
+            multipass_jobs = multipass_jobs + 1
+        printit ("Memory     %10s: %d index passes on %-57s maintenance_work_mem: %s. Consider a larger --membudget." % (job.action_name, passes, job.table, size_pretty(job.memory)))
+
+def run_job(conn, cur, job, pace):
+    # v5.7: run one job on the given autocommit connection and capture its duration, error and VACUUM output
+    # v8.1: paced by the pacer of that connection, before the statement
+    pace.wait()
+    job.started  = time.time()
+    job.pid      = conn.get_backend_pid()
+    tune_job(job)
+    setup        = job.setup_sql()
+    if events is not None:
+        events.job('job_started', job, threading.current_thread().name)
+    try:
+        del conn.notices[:]
+        # v6.8: VACUUM cannot run in a multi-statement string, so settings go first on their own
+        if setup is not None:
+            cur.execute(setup)
+        cur.execute(job.sql())
+    except Exception as error:
+        job.error = "%s *** %s" % (type(error), error)
+    job.ended = time.time()
+    job.output = [notice.strip() for notice in conn.notices]
+    if setup is not None:
+        # the connection runs the next job too
+        try:
+            cur.execute(job.reset_sql())
+        except Exception:
+            pass
+    release_job(job)
+    pace.update(job)
+    estimator.update(job)
+    if history is not None:
+        history.record(job)
+    if metrics is not None:
+        metrics.job(job)
+    if events is not None:
+        events.job('job_finished', job, threading.current_thread().name)
+    if profiler is not None:
+        profiler.record('job', job.action(), job.started, job.duration())
+    return job.error is None
+
+class Pacer(object):
+    # v5.8: adaptive rate limit for dispatching actions. Tiny tables are paced in milliseconds,
+    #       large ones close to the old fixed half second, and errors back off exponentially.
+    # v8.1: one per connection, so each worker waits after its own jobs and the others keep going
+    def __init__(self, ratio, maxdelay):
+        self.ratio    = ratio
+        self.maxdelay = maxdelay
+        self.delay    = 0.0
+        self.lock     = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.delay
+        if delay > 0:
+            time.sleep(delay)
+            waited('pacing', delay)
+
+    def update(self, job):
+        with self.lock:
+            if job.error is None:
+                self.delay = min(self.maxdelay, job.duration() * self.ratio)
+            else:
+                self.delay = min(self.maxdelay, max(self.delay * 2, 0.05))
+
+class Estimator(object):
+    # v6.4: expected job durations for --deadline/--budget admission and the --priority score.
+    #       Starts from the assumed I/O rate and switches to the bytes per second of the vacuums finished so far.
+    def __init__(self, rate, overhead):
+        self.rate     = rate
+        self.overhead = overhead
+        self.bytes    = 0
+        self.seconds  = 0.0
+        self.lock     = threading.Lock()
+
+    def update(self, job):
+        # analyzes read a sample and failed jobs stop early, neither says anything about the vacuum rate
+        if job.error is not None or job.action() == 'ANALYZE':
+            return
+        with self.lock:
+            self.bytes   = self.bytes + job.size
+            self.seconds = self.seconds + max(job.duration() - self.overhead, 0.0)
+
+    def throughput(self):
+        with self.lock:
+            if self.seconds < 1.0 or self.bytes == 0:
+                return self.rate
+            return self.bytes / self.seconds
+
+    def estimate(self, size, action, table=None, dbname=None):
+        # v6.5: a table's measured throughput from the run history comes first
+        if history is not None and table is not None:
+            rate = history.rate(table, action, dbname)
+            if rate is not None:
+                return self.overhead + float(size) / rate
+        if action == 'ANALYZE':
+            size = min(size, analyze_sample_bytes)
+        return self.overhead + float(size) / self.throughput()
+
+class History(object):
+    # v6.5: run history in a local SQLite file, one row per job. VACUUM VERBOSE and ANALYZE VERBOSE output is parsed
+    #       for pages, dead tuples and WAL, the columns stay NULL for jobs run without VERBOSE or on versions that don't report them.
+    patterns = {
+        'heap_pages':   [r'pages: \d+ removed, \d+ remain, (\d+) scanned', r'row versions in (\d+) out of \d+ pages', r'scanned (\d+) of \d+ pages'],
+        'index_pages':  [r'index "[^"]*": pages: (\d+) in total', r'index "[^"]*" now contains \d+ row versions in (\d+) pages'],
+        'dead_removed': [r'tuples: (\d+) removed', r'found (\d+) removable'],
+        'wal_bytes':    [r'WAL usage: \d+ records, \d+ full page images, (\d+) bytes'],
+    }
+
+    def __init__(self, path, server, dbname):
+        import sqlite3
+        self.path   = path
+        self.server = server
+        self.dbname = dbname
+        self.lock   = threading.Lock()
+        self.rates  = {}
+        # worker threads record their own jobs, serialized by the lock
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (server text, dbname text, tablename text, action text, started real, ended real, size integer, " \
+                        "heap_pages integer, index_pages integer, dead_removed integer, wal_bytes integer, error text)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_table ON runs (server, dbname, tablename, started)")
+        # v7.5: next xid and multixact id of the cluster, one row per run
+        self.db.execute("CREATE TABLE IF NOT EXISTS xids (server text, sampled real, xid integer, mxid integer)")
+        self.db.commit()
+        self.load()
+
+    def kind(self, action):
+        # a VACUUM ANALYZE reads the whole table like a VACUUM
+        if action == 'ANALYZE':
+            return 'ANALYZE'
+        return 'VACUUM'
+
+    def load(self):
+        # bytes per second of each table over its last history_runs successful runs
+        # v8.1: of every database of the server, an --alldatabases run moves dbname along
+        rows = self.db.execute("SELECT dbname, tablename, action, size, ended - started FROM runs WHERE server = ? AND error IS NULL ORDER BY started DESC",
+                               (self.server,)).fetchall()
+        totals = {}
+        for dbname, tablename, action, size, duration in rows:
+            key = (dbname, tablename, self.kind(action))
+            runs, bytes, seconds = totals.get(key, (0, 0, 0.0))
+            if runs < history_runs:
+                totals[key] = (runs + 1, bytes + size, seconds + max(duration - job_overhead, 0.001))
+        self.rates = dict([(key, float(bytes) / seconds) for key, (runs, bytes, seconds) in totals.items() if bytes > 0])
+        if _verbose: printit("VERBOSE MODE: history %s: %d runs, measured throughput for %d tables" % (self.path, len(rows), len(self.rates)))
+
+    def rate(self, table, action, dbname=None):
+        return self.rates.get((dbname or self.dbname, table, self.kind(action)))
+
+    def expected(self, table, action, size):
+        rate = self.rate(table, action)
+        if rate is None:
+            return None
+        return job_overhead + float(size) / rate
+
+    @classmethod
+    def parse(cls, output):
+        # v7.9: a class method, the metrics parse job output without a history file
+        text    = '\n'.join(output)
+        metrics = {}
+        for column, patterns in cls.patterns.items():
+            metrics[column] = None
+            for pattern in patterns:
+                found = re.findall(pattern, text)
+                if found:
+                    # a partitioned table reports once per partition
+                    metrics[column] = sum([int(value) for value in found])
+                    break
+        return metrics
+
+    def record(self, job):
+        metrics = self.parse(job.output)
+        with self.lock:
+            try:
+                self.db.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (self.server, job.dbname, job.table, job.action(), job.started, job.ended, job.size, metrics['heap_pages'],
+                                 metrics['index_pages'], metrics['dead_removed'], metrics['wal_bytes'], job.error))
+                self.db.commit()
+            except Exception as error:
+                printit ("History Exception: %s *** %s" % (type(error), error))
+
+    def sample(self, xid, mxid):
+        # v7.5: the cluster's xid and multixact counters at the start of this run
+        with self.lock:
+            try:
+                self.db.execute("INSERT INTO xids VALUES (?, ?, ?, ?)", (self.server, time.time(), xid, mxid))
+                self.db.commit()
+            except Exception as error:
+                printit ("History Exception: %s *** %s" % (type(error), error))
+
+    def burn_rates(self):
+        # v7.5: (xids per sec, multixacts per sec or None, secs per window) over the recent samples, None before there is an hour of them.
+        #       Multixact ids wrap at 2^32, xids are 64 bit epoch extended. A window is the median gap between runs.
+        rows = self.db.execute("SELECT sampled, xid, mxid FROM xids WHERE server = ? AND sampled > ? ORDER BY sampled",
+                               (self.server, time.time() - burn_days * 86400)).fetchall()
+        if len(rows) < 2 or rows[-1][0] - rows[0][0] < min_window_secs:
+            return None
+        span = rows[-1][0] - rows[0][0]
+        xid_rate  = float(rows[-1][1] - rows[0][1]) / span
+        mxid_rate = None
+        if rows[0][2] is not None and rows[-1][2] is not None:
+            mxid_rate = float((rows[-1][2] - rows[0][2]) % 4294967296) / span
+        gaps = sorted([b[0] - a[0] for a, b in zip(rows, rows[1:]) if b[0] - a[0] >= min_window_secs])
+        window = 86400.0
+        if len(gaps) > 0:
+            window = gaps[len(gaps) // 2]
+        return xid_rate, mxid_rate, window
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class Metrics(object):
+    # v7.9: counters and histograms of the run in the Prometheus text format, written as a node_exporter textfile at exit
+    #       and/or served on a local HTTP port while the run lasts. Run level counts and gauges are read when rendered.
+    families = {
+        'pg_vacuum_jobs_total':                    ('counter',   'Jobs finished by action and result'),
+        'pg_vacuum_job_duration_seconds':          ('histogram', 'Job duration by action'),
+        'pg_vacuum_bytes_processed_total':         ('counter',   'Table bytes of finished jobs by action'),
+        'pg_vacuum_pages_processed_total':         ('counter',   'Heap and index pages scanned, from VERBOSE output'),
+        'pg_vacuum_dead_tuples_removed_total':     ('counter',   'Dead tuples removed, from VERBOSE output'),
+        'pg_vacuum_wal_bytes_total':               ('counter',   'WAL bytes written by vacuums, from VERBOSE output'),
+        'pg_vacuum_throttle_pauses_total':         ('counter',   'Times new work was held back or slowed down, by reason'),
+        'pg_vacuum_throttle_seconds_total':        ('counter',   'Seconds new work waited, by reason'),
+        'pg_vacuum_catalog_query_seconds_total':   ('counter',   'Seconds in catalog and monitoring queries'),
+        'pg_vacuum_work_seconds_total':            ('counter',   'Seconds of jobs running, summed over connections'),
+        'pg_vacuum_actions_total':                 ('counter',   'Actions planned by type, as in the final summary'),
+        'pg_vacuum_tables_skipped_total':          ('counter',   'Tables skipped by reason'),
+        'pg_vacuum_async_jobs_total':              ('counter',   'Jobs handed to the async pool'),
+        'pg_vacuum_queue_depth':                   ('gauge',     'Jobs queued in the worker pools'),
+        'pg_vacuum_active_workers':                ('gauge',     'Jobs running right now'),
+        'pg_vacuum_run_start_timestamp_seconds':   ('gauge',     'Start of the run'),
+        'pg_vacuum_run_duration_seconds':          ('gauge',     'Seconds since the start of the run'),
+        'pg_vacuum_dry_run':                       ('gauge',     '1 for a dry run'),
+    }
+    buckets = (1, 5, 15, 60, 300, 900, 3600, 14400)
+
+    def __init__(self, server, dbname):
+        # v8.1: no dbname for an --alldatabases run, its job series are labeled with the database of each job instead
+        self.labels     = (('server', server),)
+        if dbname is not None:
+            self.labels = self.labels + (('dbname', dbname),)
+        self.perdb      = dbname is None
+        self.started    = time.time()
+        self.counters   = {}
+        self.histograms = {}
+        self.lock       = threading.Lock()
+        self.httpd      = None
+
+    def add(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            counts = self.histograms.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] = counts[i] + 1
+            counts[-2] = counts[-2] + 1
+            counts[-1] = counts[-1] + value
+
+    def job(self, job):
+        action = job.action().lower().replace(' ', '_')
+        if 'FREEZE' in job.options:
+            action = 'freeze'
+        db = {}
+        if self.perdb:
+            db = {'dbname': job.dbname}
+        self.add('pg_vacuum_jobs_total', action=action, result='ok' if job.error is None else 'error', **db)
+        self.observe('pg_vacuum_job_duration_seconds', job.duration(), action=action, **db)
+        self.add('pg_vacuum_work_seconds_total', job.duration(), **db)
+        if job.error is not None:
+            return
+        self.add('pg_vacuum_bytes_processed_total', job.size, action=action, **db)
+        parsed = History.parse(job.output)
+        for kind in ('heap', 'index'):
+            if parsed[kind + '_pages'] is not None:
+                self.add('pg_vacuum_pages_processed_total', parsed[kind + '_pages'], kind=kind, **db)
+        if parsed['dead_removed'] is not None:
+            self.add('pg_vacuum_dead_tuples_removed_total', parsed['dead_removed'], **db)
+        if parsed['wal_bytes'] is not None:
+            self.add('pg_vacuum_wal_bytes_total', parsed['wal_bytes'], **db)
+
+    def sample(self):
+        # run level values, read when rendered
+        pools   = [pool for pool in (async_pool, sync_pool) if pool is not None]
+        samples = [('pg_vacuum_actions_total', (('action', 'freeze'),), total_freezes),
+                   ('pg_vacuum_actions_total', (('action', 'vacuum_analyze'),), total_vacuums_analyzes),
+                   ('pg_vacuum_actions_total', (('action', 'vacuum'),), total_vacuums),
+                   ('pg_vacuum_actions_total', (('action', 'analyze'),), total_analyzes),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'partitioned'),), partitioned_tables_skipped),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'excluded'),), tables_skipped),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'deadline'),), deadline_skipped),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'all_visible'),), len(vm_skipped)),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'min_bloat'),), len(bloat_skipped)),
+                   ('pg_vacuum_tables_skipped_total', (('reason', 'cold_partition'),), len(cold_skipped)),
+                   ('pg_vacuum_async_jobs_total', (), asyncjobs),
+                   ('pg_vacuum_queue_depth', (), sum([len(pool.pending) for pool in pools])),
+                   ('pg_vacuum_active_workers', (), sum([pool.running for pool in pools]) + (sync_job is not None)),
+                   ('pg_vacuum_run_start_timestamp_seconds', (), self.started),
+                   ('pg_vacuum_run_duration_seconds', (), time.time() - self.started),
+                   ('pg_vacuum_dry_run', (), int(dryrun))]
+        return samples
+
+    def render(self):
+        series = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                series.setdefault(name, []).append((labels, value))
+            histograms = dict([(key, list(counts)) for key, counts in self.histograms.items()])
+        for name, labels, value in self.sample():
+            series.setdefault(name, []).append((labels, value))
+        for (name, labels), counts in histograms.items():
+            for bound, count in zip([str(bound) for bound in self.buckets] + ['+Inf'], counts[:-1]):
+                series.setdefault(name, []).append((labels + (('le', bound),), count))
+            series[name].append((labels + (('__suffix', '_count'),), counts[-2]))
+            series[name].append((labels + (('__suffix', '_sum'),), counts[-1]))
+        lines = []
+        for name in sorted(series):
+            kind, text = self.families[name]
+            lines.append("# HELP %s %s" % (name, text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            if kind != 'histogram':
+                series[name].sort()
+            for labels, value in series[name]:
+                suffix = ''
+                if kind == 'histogram':
+                    suffix = dict(labels).get('__suffix', '_bucket')
+                labels = [(k, v) for k, v in self.labels + tuple(labels) if k != '__suffix']
+                text   = ','.join(['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels])
+                lines.append("%s%s{%s} %s" % (name, suffix, text, repr(float(value)) if isinstance(value, float) else value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # renamed into place, so the textfile collector never reads half a file
+        try:
+            with open(path + '.tmp', 'w') as f:
+                f.write(self.render())
+            os.rename(path + '.tmp', path)
+        except Exception as error:
+            printit ("Metrics Exception: %s *** %s" % (type(error), error))
+
+    def serve(self, port):
+        try:
+            from http.server import HTTPServer, BaseHTTPRequestHandler
+        except ImportError:
+            from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.httpd = HTTPServer(('127.0.0.1', port), Handler)
+        except Exception as error:
+            printit ("Metrics endpoint disabled: %s *** %s" % (type(error), error))
+            return
+        thread = threading.Thread(target=self.httpd.serve_forever, name="Metrics")
+        thread.daemon = True
+        thread.start()
+        printit ("Metrics served on http://127.0.0.1:%d/metrics" % port)
+
+class EventLog(object):
+    # v8.0: one JSON object per line for every candidate evaluated, job started, skipped or finished and throttle action,
+    #       with typed fields instead of the fixed width report lines. Appended to, so one file can collect many runs.
+    def __init__(self, path, server, dbname):
+        import json
+        self.json   = json
+        self.common = {'server': server, 'dbname': dbname, 'pid': os.getpid()}
+        self.lock   = threading.Lock()
+        self.file   = open(path, 'a')
+
+    def emit(self, event, **fields):
+        record = dict(self.common)
+        record.update(fields)
+        record['event'] = event
+        record['ts']    = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        line = self.json.dumps(record, sort_keys=True)
+        with self.lock:
+            try:
+                self.file.write(line + '\n')
+                self.file.flush()
+            except Exception as error:
+                printit ("Events Exception: %s *** %s" % (type(error), error))
+
+    def job(self, event, job, where):
+        fields = {'dbname': job.dbname, 'oid': job.oid, 'relation': job.table, 'action': job.action_name, 'command': job.sql(),
+                  'size': job.size, 'tuples': job.tups, 'pool': where}
+        if event == 'job_started':
+            fields.update({'backend_pid': job.pid, 'maintenance_work_mem_bytes': job.memory or None, 'parallel': job.parallel,
+                           'settings': dict(job.settings)})
+        elif event == 'job_finished':
+            fields.update({'duration': round(job.duration(), 3), 'error': job.error})
+            fields.update(History.parse(job.output))
+        self.emit(event, **fields)
+
+def candidate(decision, action_name, table, oid, size, tups, dead, reason=None, **ages):
+    # v8.0: the outcome of evaluating one candidate in sections 2 to 9: sync, async or skip with a reason
+    if events is None:
+        return
+    rel = relations.get(oid)
+    if 'xid_age' not in ages and rel is not None:
+        ages = {'xid_age': rel.xid_age, 'mxid_age': rel.mxid_age}
+    if dead is None and rel is not None and 'FREEZE' not in action_name:
+        dead = rel.n_dead_tup
+    events.emit('candidate', decision=decision, reason=reason, action=action_name, relation=table, oid=oid, size=size,
+                tuples=tups, dead_tuples=dead, dryrun=dryrun, **ages)
+
+def skipped(oid, action_name, reason):
+    # v8.0: candidate skipped by one of the skip helpers, which only know the oid
+    if events is not None:
+        rel = relations.get(oid)
+        candidate('skip', action_name, rel.table if rel is not None else None, oid, rel.size if rel is not None else None,
+                  rel.n_tup if rel is not None else None, None, reason=reason)
+
+class Profiler(object):
+    # v8.1: wall time of the run by phase of the main flow, every statement on the timed cursors, every job and every wait.
+    #       A breakdown is printed at exit, and the raw timings go to a CSV file to compare runs of different versions.
+    def __init__(self, started, path):
+        self.started = started
+        self.path    = path
+        self.lock    = threading.Lock()
+        self.records = []
+        self.current = ('startup', started)
+
+    def phase(self, name):
+        now = time.time()
+        with self.lock:
+            self.records.append(('phase', self.current[0], self.current[0], threading.current_thread().name, self.current[1], now - self.current[1]))
+            self.current = (name, now)
+
+    def record(self, kind, name, started, seconds):
+        with self.lock:
+            self.records.append((kind, name, self.current[0], threading.current_thread().name, started, seconds))
+
+    def statement(self, caller, sql, started, seconds):
+        # literals out, so each poll of the same query adds up under one name
+        sql = re.sub(r"'[^']*'", "?", str(sql))
+        sql = re.sub(r"\b\d+\b", "?", ' '.join(sql.split()))
+        self.record('sql', "%s: %s" % (caller, sql[:100]), started, seconds)
+
+    def totals(self, kind):
+        totals = {}
+        for record in self.records:
+            if record[0] == kind:
+                calls, total, longest = totals.get(record[1], (0, 0.0, 0.0))
+                totals[record[1]] = (calls + 1, total + record[5], max(longest, record[5]))
+        return sorted(totals.items(), key=lambda item: -item[1][1])
+
+    def report(self):
+        self.phase('exit')
+        wall = max(time.time() - self.started, 0.001)
+        printit ("Profile: wall time %.3f sec" % wall)
+        for name, (calls, total, longest) in self.totals('phase'):
+            printit ("Profile phase  %-40s %10.3f sec %5.1f%%" % (name, total, 100.0 * total / wall))
+        for name, (calls, total, longest) in self.totals('wait'):
+            printit ("Profile wait   %-40s %10.3f sec  count: %6d  max: %8.3f sec" % (name, total, calls, longest))
+        for name, (calls, total, longest) in self.totals('job'):
+            printit ("Profile job    %-40s %10.3f sec  count: %6d  max: %8.3f sec" % (name, total, calls, longest))
+        statements = self.totals('sql')
+        for name, (calls, total, longest) in statements[:profile_top]:
+            printit ("Profile sql    %10.3f sec  calls: %6d  max: %8.3f sec  %s" % (total, calls, longest, name))
+        if len(statements) > profile_top:
+            rest = statements[profile_top:]
+            printit ("Profile sql    %10.3f sec  calls: %6d  in %d more statements" % (sum([item[1][1] for item in rest]), sum([item[1][0] for item in rest]), len(rest)))
+        if self.path != '-':
+            self.dump()
+
+    def dump(self):
+        import csv
+        try:
+            with open(self.path, 'w') as f:
+                writer = csv.writer(f)
+                writer.writerow(['version', 'kind', 'name', 'phase', 'thread', 'started', 'seconds'])
+                for record in self.records:
+                    writer.writerow([version] + list(record[:4]) + ["%.6f" % record[4], "%.6f" % record[5]])
+            printit ("Profile written to %s" % self.path)
+        except Exception as error:
+            printit ("Profile Exception: %s *** %s" % (type(error), error))
+
+class TimedCursor(psycopg2.extensions.cursor):
+    # v7.9: main connection cursor, timing the statements it runs besides the jobs run_sync runs on it
+    # v8.1: also the cursor of the progress monitor and the adaptive controller, and each statement goes to the profile
+    working = False
+
+    def execute(self, sql, args=None):
+        started = time.time()
+        try:
+            return super(TimedCursor, self).execute(sql, args)
+        finally:
+            if not self.working:
+                seconds = time.time() - started
+                if metrics is not None:
+                    metrics.add('pg_vacuum_catalog_query_seconds_total', seconds)
+                if profiler is not None:
+                    caller = sys._getframe(1).f_code.co_name
+                    profiler.statement('main' if caller == '<module>' else caller, sql, started, seconds)
+
+def use_async(table, tups, size, action):
+    # v6.5: go by the table's measured duration when the history has one, by the static row and size thresholds otherwise
+    if history is not None:
+        expected = history.expected(table, action, size)
+        if expected is not None:
+            return expected > threshold_async_secs
+    return tups > threshold_async_rows or size > threshold_max_sync
+
+def history_plan():
+    # v6.5: expected duration of the work a dry run found, measured where the history knows the table
+    global snapshot
+    if snapshot is None:
+        snapshot = load_snapshot(conn, cur)
+    total    = 0.0
+    measured = 0
+    planned  = sorted([relations[oid] for oid in tablist if oid in relations], key=lambda rel: rel.table)
+    for rel in planned:
+        if history.rate(rel.table, 'VACUUM') is not None:
+            measured = measured + 1
+        expected = estimator.estimate(rel.size, 'VACUUM', rel.table)
+        total = total + expected
+        if _verbose: printit("VERBOSE MODE: planned %-57s expected: %10.2f sec" % (rel.table, expected))
+    printit ("Planned tables: %d  measured in history: %d  expected duration: %.2f sec" % (len(planned), measured, total))
+
+def freeze_plan(rows):
+    # v7.5: oids of the freeze candidates to do in this window, None without --freezewindows.
+    #       Each table is forecast to cross autovacuum_freeze_max_age (or the multixact one) from the burn rates, and given
+    #       the window it must be frozen in. Those due now or over --freeze are taken, then the most urgent until this window
+    #       has its even share of the bytes due over all windows, so tables aging together are not all frozen at once.
+    if freeze_windows < 0:
+        return None
+    rates = history.burn_rates()
+    if rates is None:
+        if freeze != -1:
+            printit ("Freeze plan: XID burn rate not known yet, freezing by --freeze threshold this run.")
+            return None
+        printit ("Freeze plan: XID burn rate not known yet, an hour of runs with this --history file is needed. No freezes this run.")
+        return set()
+    xid_rate, mxid_rate, window = rates
+    due = []
+    for row in rows:
+        xidage, maxage, size, oid, mxidage, mxmax = row[2], row[3], row[6], row[9], row[10], row[11]
+        secs = float('inf')
+        if xid_rate > 0:
+            secs = (maxage - xidage) / xid_rate
+        if mxid_rate is not None and mxid_rate > 0:
+            secs = min(secs, (mxmax - mxidage) / mxid_rate)
+        if freeze != -1 and (xidage >= freeze or mxidage >= freeze * mxmax // maxage):
+            secs = 0
+        slot = int(max(secs, 0) // window) if secs != float('inf') else freeze_windows
+        if slot < freeze_windows:
+            due.append((slot, -xidage, oid, size or 0, row[0], secs))
+    due.sort()
+    share = sum([entry[3] for entry in due]) / float(max(freeze_windows, 1))
+    planned = set()
+    bytes   = 0
+    for slot, negage, oid, size, table, secs in due:
+        if slot == 0 or bytes < share:
+            planned.add(oid)
+            bytes = bytes + size
+        if _verbose: printit("VERBOSE MODE: forecast %-57s crosses freeze max age in %s, window %d%s" % (table, fmt_secs(max(secs, 0)), slot, oid in planned and ", now" or ""))
+    if mxid_rate is None:
+        mxtext = "-"
+    else:
+        mxtext = "%.2f/sec" % mxid_rate
+    printit ("Freeze plan: XID burn rate %.2f/sec  MXID burn rate %s  window %s  due within %d windows: %d tables  this window: %d tables, %s" \
+             % (xid_rate, mxtext, fmt_secs(window), freeze_windows, len(due), len(planned), size_pretty(bytes)))
+    return planned
+
+def admit(job):
+    # v6.4: start a job only if it is expected to finish before the deadline
+    if deadline is None:
+        return True
+    global deadline_skipped
+    expected = estimator.estimate(job.size, job.action(), job.table, job.dbname)
+    left     = time_left()
+    if expected <= left:
+        return True
+    printit ("Deadline   %10s: skip   %-57s expected: %10.2f sec  left: %10.2f sec" % (job.action_name, job.table, expected, max(left, 0.0)))
+    if events is not None:
+        events.emit('job_skipped', reason='deadline', oid=job.oid, relation=job.table, action=job.action_name, size=job.size,
+                    expected=round(expected, 3), left=round(max(left, 0.0), 3))
+    with skiplock:
+        deadline_skipped = deadline_skipped + 1
+    return False
+
+class BasePool(object):
+    # v5.9: bookkeeping shared by the thread and asyncio engines
+    # v6.3: pending is a heap ordered by job priority, then submit order
+    def _push(self, job):
+        self.seq = self.seq + 1
+        heapq.heappush(self.pending, (-job.priority, self.seq, job))
+
+    def _pop(self):
+        return heapq.heappop(self.pending)[2]
+
+    def set_limit(self, limit):
+        # v6.7: concurrency cap set by the adaptive controller, never above the pool size
+        with self.cond:
+            self.limit = min(limit, self.workers)
+            self.cond.notify_all()
+
+    def active(self):
+        with self.cond:
+            return self.running + len(self.pending)
+
+    def cancel(self):
+        # v6.4: cancel the statements running on the pool's connections, the workers report them as failed
+        with self.cond:
+            conns = list(self.busy.keys())
+        for aconn in conns:
+            try:
+                aconn.cancel()
+            except Exception as error:
+                printit ("%s cancel failed: %s" % (self.name, error))
+        return len(conns)
+
+    def wait_idle(self, timeout):
+        with self.cond:
+            ends = time.time() + timeout
+            while self.running + len(self.pending) > 0 and time.time() < ends:
+                self.cond.wait(min(1.0, max(ends - time.time(), 0.0)))
+            return self.running + len(self.pending) == 0
+
+    def summary(self):
+        failed   = [job for job in self.finished if job.error is not None]
+        duration = sum([job.duration() for job in self.finished])
+        line     = "%s jobs completed: %d  failed: %d  total job duration: %.2f sec" % (self.name, len(self.finished) - len(failed), len(failed), duration)
+        if self.skipped > 0:
+            line = line + "  skipped at deadline: %d" % self.skipped
+        printit (line)
+        for job in failed:
+            printit ("%s %10s: FAILED %-57s %s" % (self.name, job.action_name, job.table, job.error))
+
+class JobPool(BasePool):
+    # v5.7: bounded pool of worker threads replacing the detached "nohup psql" jobs.
+    #       Each worker owns one autocommit connection, so no more than "workers" statements ever run at once.
+    # v8.1: to the database of its job, reopened when the next job is for another one
+    def __init__(self, name, workers):
+        self.name     = name
+        self.workers  = workers
+        self.cond     = threading.Condition()
+        self.pending  = []
+        self.seq      = 0
+        self.running  = 0
+        self.finished = []
+        self.skipped  = 0
+        self.busy     = {}
+        self.limit    = workers
+        self.closing  = False
+        self.threads  = []
+        self.pids     = []
+
+    def submit(self, job):
+        with self.cond:
+            self._push(job)
+            # start workers lazily so runs without async work open no extra connections
+            if len(self.threads) < self.workers and len(self.threads) < self.running + len(self.pending):
+                worker = threading.Thread(target=self._worker, name="%s-%d" % (self.name, len(self.threads) + 1))
+                worker.daemon = True
+                self.threads.append(worker)
+                worker.start()
+            self.cond.notify()
+
+    def join(self):
+        with self.cond:
+            self.closing = True
+            self.cond.notify_all()
+        for worker in self.threads:
+            worker.join()
+        self.threads = []
+        self.closing = False
+
+    def _worker(self):
+        conn   = None
+        cur    = None
+        conndb = None
+        pace   = Pacer(pace_ratio, pace_max)
+        while True:
+            with self.cond:
+                # v6.7: queued jobs also wait while the pool runs at its adaptive limit
+                while (len(self.pending) == 0 and not self.closing) or (len(self.pending) > 0 and self.running >= self.limit):
+                    self.cond.wait()
+                if len(self.pending) == 0:
+                    break
+                job = self._pop()
+                self.running = self.running + 1
+
+            # v6.4: the deadline may have come closer while the job was queued
+            if not admit(job):
+                with self.cond:
+                    self.running = self.running - 1
+                    self.skipped = self.skipped + 1
+                    self.cond.notify_all()
+                continue
+
+            if conn is not None and conndb != job.dbname:
+                conn.close()
+                conn = None
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(connect_string(job.dbname))
+                    conn.set_isolation_level(0)
+                    cur = conn.cursor()
+                    conndb = job.dbname
+                    self.pids.append(conn.get_backend_pid())
+                except Exception as error:
+                    conn = None
+                    job.started = job.ended = time.time()
+                    job.error = "Worker Connection Error: %s *** %s" % (type(error), error)
+            if conn is not None:
+                with self.cond:
+                    self.busy[conn] = job
+                run_job(conn, cur, job, pace)
+                with self.cond:
+                    del self.busy[conn]
+
+            report_job(self.name, job)
+
+            with self.cond:
+                self.running = self.running - 1
+                self.finished.append(job)
+                self.cond.notify_all()
+        if conn is not None:
+            conn.close()
+
+class AsyncioPool(BasePool):
+    # v5.9: asyncio engine. One event loop in a background thread drives psycopg2 async connections, so up to
+    #       "workers" statements stay in flight without a thread each. When "monitor" is set, the loop also polls
+    #       pg_stat_progress_vacuum for vacuums run by other pg_vacuum instances and counts them against "workers",
+    #       refilling free slots within seconds instead of waiting out the 5 minute throttle.
+    # v8.1: jobs connect to their own database, connstr is the one the monitor polls from
+    def __init__(self, name, workers, connstr, monitor=False):
+        import asyncio
+        self.name     = name
+        self.workers  = workers
+        self.connstr  = connstr
+        self.monitor  = monitor
+        self.cond     = threading.Condition()
+        self.pending  = []
+        self.seq      = 0
+        self.running  = 0
+        self.finished = []
+        self.skipped  = 0
+        self.busy     = {}
+        self.limit    = workers
+        self.threads  = []
+        self.pids     = []
+        self.idle     = []
+        self.pacers   = {}
+        self.dbnames  = {}
+        self.foreign  = 0
+        self.counted  = not monitor
+        self.watcher  = None
+        self.timer    = None
+        # add_reader/add_writer are not available on the Windows proactor loop
+        self.loop     = asyncio.SelectorEventLoop()
+
+    def submit(self, job):
+        with self.cond:
+            self._push(job)
+            if len(self.threads) == 0:
+                thread = threading.Thread(target=self._run, name="%s-loop" % self.name)
+                thread.daemon = True
+                self.threads.append(thread)
+                thread.start()
+        self.loop.call_soon_threadsafe(self._dispatch)
+
+    def set_limit(self, limit):
+        BasePool.set_limit(self, limit)
+        if len(self.threads) > 0:
+            self.loop.call_soon_threadsafe(self._dispatch)
+
+    def join(self):
+        with self.cond:
+            while self.running + len(self.pending) > 0:
+                self.cond.wait(1)
+        if len(self.threads) > 0:
+            self.loop.call_soon_threadsafe(self._shutdown)
+            for thread in self.threads:
+                thread.join()
+        self.threads = []
+
+    def _run(self):
+        if self.monitor:
+            self.loop.call_soon(self._watch)
+        self.loop.run_forever()
+
+    def _shutdown(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        for aconn in self.idle + ([self.watcher] if self.watcher is not None else []):
+            try:
+                self.loop.remove_reader(aconn.fileno())
+                self.loop.remove_writer(aconn.fileno())
+            except Exception:
+                pass
+            aconn.close()
+        self.idle    = []
+        self.pacers  = {}
+        self.dbnames = {}
+        self.watcher = None
+        self.loop.stop()
+
+    def _poll(self, aconn, callback):
+        # advance an async connection; callback(error) fires once the current connect or query completes
+        try:
+            state = aconn.poll()
+        except Exception as error:
+            callback(error)
+            return
+        if state == psycopg2.extensions.POLL_OK:
+            callback(None)
+        elif state == psycopg2.extensions.POLL_READ:
+            self.loop.add_reader(aconn.fileno(), self._ready, self.loop.remove_reader, aconn, callback)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            self.loop.add_writer(aconn.fileno(), self._ready, self.loop.remove_writer, aconn, callback)
+
+    def _ready(self, remove, aconn, callback):
+        remove(aconn.fileno())
+        self._poll(aconn, callback)
+
+    def _connect(self, connstr, callback):
+        try:
+            aconn = psycopg2.connect(connstr, async_=1)
+        except Exception as error:
+            callback(None, error)
+            return
+        def connected(error):
+            if error is not None:
+                aconn.close()
+                callback(None, error)
+                return
+            self.pids.append(aconn.get_backend_pid())
+            callback(aconn, None)
+        self._poll(aconn, connected)
+
+    def _dispatch(self):
+        with self.cond:
+            jobs = []
+            # hold jobs until the first progress poll tells how many slots other pg_vacuum sessions use
+            while self.counted and len(self.pending) > 0 and self.running + self.foreign < self.limit:
+                jobs.append(self._pop())
+                self.running = self.running + 1
+        for job in jobs:
+            if not admit(job):
+                # v6.4
+                with self.cond:
+                    self.running = self.running - 1
+                    self.skipped = self.skipped + 1
+                    self.cond.notify_all()
+                continue
+            same = [aconn for aconn in self.idle if self.dbnames[aconn] == job.dbname]
+            if len(same) > 0:
+                # v8.1: a connection is paced after its own last job, the slot stays taken meanwhile
+                aconn = same[-1]
+                self.idle.remove(aconn)
+                delay = self.pacers[aconn].delay
+                if delay > 0:
+                    self.loop.call_later(delay, self._paced, aconn, job, delay)
+                else:
+                    self._start(aconn, job)
+            else:
+                # v8.1: an idle connection to another database makes room for one to the job's
+                if len(self.idle) > 0:
+                    self._drop(self.idle.pop(0))
+                self._connect(connect_string(job.dbname), lambda aconn, error, job=job: self._start(aconn, job, error))
+
+    def _drop(self, aconn):
+        aconn.close()
+        self.pacers.pop(aconn, None)
+        self.dbnames.pop(aconn, None)
+
+    def _paced(self, aconn, job, delay):
+        waited('pacing', delay)
+        self._start(aconn, job)
+
+    def _start(self, aconn, job, error=None):
+        job.started = time.time()
+        if error is not None:
+            job.error = "Worker Connection Error: %s *** %s" % (type(error), error)
+            self._done(None, job, None)
+            return
+        del aconn.notices[:]
+        self.dbnames[aconn] = job.dbname
+        job.pid      = aconn.get_backend_pid()
+        tune_job(job)
+        setup        = job.setup_sql()
+        if events is not None:
+            events.job('job_started', job, self.name)
+        with self.cond:
+            self.busy[aconn] = job
+        # v6.8: optional SET before and RESET after the job, each its own statement
+        def finished(error):
+            if setup is None or aconn.closed:
+                self._done(aconn, job, error)
+            else:
+                self._query(aconn, job.reset_sql(), lambda reset_error: self._done(aconn, job, error))
+        def ready(error):
+            if error is not None:
+                finished(error)
+            else:
+                self._query(aconn, job.sql(), finished)
+        if setup is None:
+            ready(None)
+        else:
+            self._query(aconn, setup, ready)
+
+    def _query(self, aconn, sql, callback):
+        try:
+            acur = aconn.cursor()
+            acur.execute(sql)
+        except Exception as error:
+            callback(error)
+            return
+        # the cursor must stay referenced until the statement completes
+        self._poll(aconn, lambda error, acur=acur: callback(error))
+
+    def _done(self, aconn, job, error):
+        job.ended = time.time()
+        if error is not None:
+            job.error = "%s *** %s" % (type(error), error)
+        with self.cond:
+            self.busy.pop(aconn, None)
+        if aconn is not None:
+            job.output = [notice.strip() for notice in aconn.notices]
+            self.pacers.setdefault(aconn, Pacer(pace_ratio, pace_max)).update(job)
+            # a connection that broke mid-statement is dropped, the next job opens a fresh one
+            if not aconn.closed:
+                self.idle.append(aconn)
+            else:
+                self._drop(aconn)
+        release_job(job)
+        estimator.update(job)
+        if history is not None:
+            history.record(job)
+        if metrics is not None:
+            metrics.job(job)
+        if events is not None:
+            events.job('job_finished', job, self.name)
+        if profiler is not None:
+            profiler.record('job', job.action(), job.started, job.duration())
+        report_job(self.name, job)
+        with self.cond:
+            self.running = self.running - 1
+            self.finished.append(job)
+            self.cond.notify_all()
+        self._dispatch()
+
+    def _watch(self):
+        # count vacuums of other pg_vacuum sessions, then admit queued jobs into any slots that freed up
+        if self.watcher is None:
+            def connected(aconn, error):
+                if error is not None:
+                    printit ("%s progress monitor disabled: %s" % (self.name, error))
+                    self.counted = True
+                    self._dispatch()
+                    return
+                self.watcher = aconn
+                self._watch()
+            self._connect(self.connstr, connected)
+            return
+        sql = "SELECT p.pid FROM pg_stat_progress_vacuum p, pg_stat_activity a WHERE p.pid = a.pid AND a.application_name = 'pg_vacuum' AND a.pid <> pg_backend_pid()"
+        wcur = self.watcher.cursor()
+        def counted(error):
+            if error is None:
+                # our own connections may have been opened while the query was in flight, so filter them here:
+                # both pools' and the main connection's, which all run as pg_vacuum
+                # v8.1: the main connection moves between databases, so its pids are kept as it does
+                ours = pool_pids() + main_pids
+                foreign = len([row for row in wcur.fetchall() if row[0] not in ours])
+                if foreign != self.foreign and _verbose:
+                    printit ("VERBOSE MODE: %s vacuums running in other pg_vacuum sessions: %d" % (self.name, foreign))
+                with self.cond:
+                    self.foreign = foreign
+            self.counted = True
+            self._dispatch()
+            self.timer = self.loop.call_later(poll_interval, self._watch)
+        try:
+            wcur.execute(sql)
+        except Exception as error:
+            counted(error)
+            return
+        self._poll(self.watcher, counted)
+
+def fmt_secs(secs):
+    # v6.6: compact duration for status lines
+    secs = int(secs)
+    if secs >= 3600:
+        return "%dh%02dm" % (secs // 3600, (secs % 3600) // 60)
+    if secs >= 60:
+        return "%dm%02ds" % (secs // 60, secs % 60)
+    return "%ds" % secs
+
+def running_jobs():
+    # v6.6: jobs currently executing on pool connections or on the main cursor
+    jobs = []
+    for pool in (async_pool, sync_pool):
+        if pool is not None:
+            with pool.cond:
+                jobs.extend(pool.busy.values())
+    if sync_job is not None:
+        jobs.append(sync_job)
+    return [job for job in jobs if job.pid is not None]
+
+class ProgressMonitor(object):
+    # v6.6: samples the progress views for every job pg_vacuum started and prints one status line per interval.
+    #       Rates are blocks scanned since the job started, the ETA is the rest of its heap at that rate.
+    #       In the vacuuming heap phase they are blocks vacuumed since the phase was first sampled, up to the blocks scanned.
+    #       Runs in a background thread on its own connection so a long statement on the main cursor does not block it.
+    def __init__(self, connstr, interval):
+        self.connstr  = connstr
+        self.interval = interval
+        self.heapvac  = {}
+        self.stopped  = threading.Event()
+        self.thread   = threading.Thread(target=self._run, name="Progress")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _run(self):
+        try:
+            mconn = psycopg2.connect(self.connstr)
+            mconn.set_isolation_level(0)
+            mcur = mconn.cursor(cursor_factory=TimedCursor)
+            mcur.execute("SELECT current_setting('block_size')::int")
+            blocksize = mcur.fetchone()[0]
+        except Exception as error:
+            printit ("Progress monitor disabled: %s *** %s" % (type(error), error))
+            return
+        while not self.stopped.wait(self.interval):
+            try:
+                self._sample(mcur, blocksize)
+            except Exception as error:
+                printit ("Progress Exception: %s *** %s" % (type(error), error))
+        mconn.close()
+
+    def _sample(self, mcur, blocksize):
+        jobs = dict([(job.pid, job) for job in running_jobs()])
+        if len(jobs) == 0:
+            return
+        # pid, phase, blocks total, blocks scanned, blocks vacuumed, index vacuum passes
+        sql = "SELECT pid, phase, heap_blks_total, heap_blks_scanned, heap_blks_vacuumed, index_vacuum_count FROM pg_stat_progress_vacuum WHERE pid = ANY(%s)"
+        if pgversion >= 130000:
+            sql = sql + " UNION ALL SELECT pid, phase, sample_blks_total, sample_blks_scanned, 0, 0 FROM pg_stat_progress_analyze WHERE pid = ANY(%s)"
+            mcur.execute(sql, (list(jobs.keys()), list(jobs.keys())))
+        else:
+            mcur.execute(sql, (list(jobs.keys()),))
+        now       = time.time()
+        total     = 0
+        remaining = 0
+        rate      = 0.0
+        for pid, phase, blks_total, blks_scanned, blks_vacuumed, index_passes in mcur.fetchall():
+            job = jobs[pid]
+            if phase == 'vacuuming heap':
+                # a heap vacuuming pass goes over the blocks scanned so far, timed from its first sample
+                if pid not in self.heapvac or blks_vacuumed < self.heapvac[pid][1]:
+                    self.heapvac[pid] = (now, blks_vacuumed)
+                elapsed, blks_done = now - self.heapvac[pid][0], blks_vacuumed - self.heapvac[pid][1]
+                blks_total, blks_scanned = blks_scanned, blks_vacuumed
+            else:
+                self.heapvac.pop(pid, None)
+                elapsed, blks_done = now - job.started, blks_scanned
+            jobrate = 0.0
+            if elapsed > 0:
+                jobrate = blks_done / elapsed
+            left = max(blks_total - blks_scanned, 0)
+            total     = total + blks_total
+            remaining = remaining + left
+            rate      = rate + jobrate
+            # index vacuuming and cleanup have no block count to extrapolate from
+            if jobrate > 0 and left > 0:
+                eta = fmt_secs(left / jobrate)
+            else:
+                eta = '-'
+            pctdone = 100.0
+            if blks_total > 0:
+                pctdone = 100.0 * blks_scanned / blks_total
+            if _verbose or len(jobs) == 1:
+                printit ("Progress %10s: %-57s %-28s %5.1f%%  %10s/s  index passes: %d  ETA: %s" % (job.action_name, job.table, phase, pctdone, size_pretty(int(jobrate * blocksize)), index_passes, eta))
+        if rate > 0 and remaining > 0:
+            eta = fmt_secs(remaining / rate)
+        else:
+            eta = '-'
+        printit ("Progress: jobs: %d  done: %s of %s  rate: %s/s  ETA: %s" % (len(jobs), size_pretty((total - remaining) * blocksize), size_pretty(total * blocksize), size_pretty(int(rate * blocksize)), eta))
+
+def pressure_sql():
+    # v6.7: one row of server side pressure: active backends other than ours, cumulative buffer writes,
+    #       cumulative WAL position in bytes (NULL on a standby) and the largest replica replay lag in bytes
+    # v6.8: replay_lsn trails flush_lsn, so the replay lag covers the flush lag too
+    if pgversion >= 100000:
+        active = "SELECT count(*) FROM pg_stat_activity WHERE state = 'active' AND backend_type = 'client backend' AND pid <> pg_backend_pid() AND NOT (pid = ANY(%s))"
+        wal    = "CASE WHEN pg_is_in_recovery() THEN NULL ELSE pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0') END"
+        lag    = "SELECT max(pg_wal_lsn_diff(pg_current_wal_lsn(), replay_lsn)) FROM pg_stat_replication WHERE NOT pg_is_in_recovery()"
+    else:
+        active = "SELECT count(*) FROM pg_stat_activity WHERE state = 'active' AND pid <> pg_backend_pid() AND NOT (pid = ANY(%s))"
+        wal    = "CASE WHEN pg_is_in_recovery() THEN NULL ELSE pg_xlog_location_diff(pg_current_xlog_location(), '0/0') END"
+        lag    = "SELECT max(pg_xlog_location_diff(pg_current_xlog_location(), replay_location)) FROM pg_stat_replication WHERE NOT pg_is_in_recovery()"
+    if pgversion >= 170000:
+        # buffers_backend went to pg_stat_io and buffers_checkpoint to pg_stat_checkpointer in 17
+        writes = "(SELECT buffers_clean FROM pg_stat_bgwriter) + (SELECT buffers_written FROM pg_stat_checkpointer)"
+    else:
+        writes = "(SELECT buffers_checkpoint + buffers_clean + buffers_backend FROM pg_stat_bgwriter)"
+    return "SELECT (%s), %s, %s, coalesce((%s), 0)" % (active, writes, wal, lag)
+
+class Controller(object):
+    # v6.7: adaptive concurrency. A background thread samples server side pressure every interval on its own connection and
+    #       sets the pools' concurrency limit: halve it when any signal is over its target, add one job while all are well under.
+    #       Unlike highload(), this looks at the database server rather than the client host, and keeps doing so while jobs run.
+    # v6.8: also the replication lag guard for --maxlag, with or without --adaptive
+    def __init__(self, connstr, interval, workers, adaptive):
+        self.connstr   = connstr
+        self.interval  = interval
+        self.workers   = workers
+        self.adaptive  = adaptive
+        self.limit     = workers
+        self.last      = None
+        self.lagging   = False
+        self.paused    = False
+        self.throttled = False
+        self.resumed   = threading.Event()
+        self.resumed.set()
+        self.stopped   = threading.Event()
+        self.thread    = threading.Thread(target=self._run, name="Controller")
+        self.thread.daemon = True
+
+    def start(self):
+        # the first sample is taken before any job starts, so a lagging replica pauses the very first one
+        try:
+            self.cconn = psycopg2.connect(self.connstr)
+            self.cconn.set_isolation_level(0)
+            self.ccur = self.cconn.cursor(cursor_factory=TimedCursor)
+        except Exception as error:
+            printit ("Controller disabled: %s *** %s" % (type(error), error))
+            return
+        self.sql = pressure_sql()
+        self._sample()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _sample(self):
+        try:
+            self.ccur.execute(self.sql, (pool_pids(),))
+            self._adjust(time.time(), self.ccur.fetchone())
+        except Exception as error:
+            printit ("Controller Exception: %s *** %s" % (type(error), error))
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._sample()
+        self.cconn.close()
+
+    def _adjust(self, now, row):
+        active, writes, wal, lag = [value if value is None else int(value) for value in row]
+        walrate = None
+        if self.last is not None and wal is not None and self.last[2] is not None:
+            walrate = (wal - self.last[2]) / max(now - self.last[0], 0.001)
+        if max_repl_lag >= 0:
+            self._check_lag(lag, walrate)
+        # rates need two samples
+        if self.adaptive and self.last is not None:
+            self._scale(now, active, writes, lag, walrate)
+        self.last = (now, writes, wal)
+
+    def _scale(self, now, active, writes, lag, walrate):
+        elapsed = max(now - self.last[0], 0.001)
+        signals = [('active backends', active, pressure_active_backends),
+                   ('buffer writes/s', (writes - self.last[1]) / elapsed, pressure_buffer_writes),
+                   ('replication lag', lag, pressure_repl_lag)]
+        if walrate is not None:
+            signals.append(('WAL bytes/s', walrate, pressure_wal_rate))
+        if _verbose: printit ("VERBOSE MODE: pressure: %s" % '  '.join(["%s: %d/%d" % (name, value, target) for name, value, target in signals]))
+
+        over  = [(name, value, target) for name, value, target in signals if value > target]
+        limit = self.limit
+        if len(over) > 0:
+            limit = max(1, self.limit // 2)
+            reason = ', '.join(["%s %d > %d" % signal for signal in over])
+        elif all([value < target * 0.8 for name, value, target in signals]):
+            limit = min(self.workers, self.limit + 1)
+            reason = 'pressure below targets'
+        if limit != self.limit:
+            printit ("Adaptive: concurrency %d -> %d (%s)" % (self.limit, limit, reason))
+            if metrics is not None and limit < self.limit:
+                metrics.add('pg_vacuum_throttle_pauses_total', reason='adaptive')
+            if events is not None:
+                events.emit('throttle', reason='adaptive', action='shrink' if limit < self.limit else 'grow', concurrency=limit,
+                            previous=self.limit, cause=reason)
+            self.limit = limit
+            self._apply()
+
+    def _check_lag(self, lag, walrate):
+        # v6.8: trip when lag passes --maxlag, resume once it is down to half of it
+        if not self.lagging and lag > max_repl_lag:
+            self.lagging = True
+            if metrics is not None:
+                metrics.add('pg_vacuum_throttle_pauses_total', reason='replication_lag')
+            rate = ''
+            if walrate is not None:
+                rate = "  WAL rate: %s/s" % size_pretty(int(walrate))
+            if lag_policy == 'throttle':
+                printit ("Replication lag %s is over %s%s. New jobs start with vacuum_cost_limit = %d, vacuum_cost_delay = %d ms." % (size_pretty(lag), size_pretty(max_repl_lag), rate, lag_cost_limit, lag_cost_delay))
+            else:
+                printit ("Replication lag %s is over %s%s. Pausing new jobs." % (size_pretty(lag), size_pretty(max_repl_lag), rate))
+        elif self.lagging and lag <= max_repl_lag // 2:
+            self.lagging = False
+            printit ("Replication lag %s drained. Resuming new jobs at full speed." % size_pretty(lag))
+        else:
+            return
+        if events is not None:
+            events.emit('throttle', reason='replication_lag', action=lag_policy if self.lagging else 'resume', lag=lag, max_lag=max_repl_lag)
+        self.throttled = self.lagging and lag_policy == 'throttle'
+        self.paused    = self.lagging and lag_policy == 'pause'
+        if self.paused:
+            self.resumed.clear()
+        else:
+            self.resumed.set()
+        self._apply()
+
+    def _apply(self):
+        # a pause holds queued jobs in the pools, past the deadline they are let through to be skipped
+        limit = self.limit
+        if self.paused and not deadline_passed():
+            limit = 0
+        for pool in (async_pool, sync_pool):
+            if pool is not None:
+                pool.set_limit(limit)
+
+def wait_for_lag():
+    # v6.8: jobs on the main cursor wait out a replication lag pause like pool jobs do, returns True if it waited
+    if controller is None or not controller.paused:
+        return False
+    printit ("Waiting for replicas to catch up before the next job...")
+    started = time.time()
+    while controller.paused and not deadline_passed():
+        controller.resumed.wait(min(poll_interval, time_left()))
+    waited('replication_lag', time.time() - started)
+    if events is not None:
+        events.emit('throttle', reason='replication_lag', action='wait', waited=round(time.time() - started, 3))
+    return True
+
+def report_job(poolname, job):
+    if job.error is None:
+        printit ("%s %10s: done   %-57s duration: %10.2f sec" % (poolname, job.action_name, job.table, job.duration()))
+    else:
+        printit ("%s %10s: FAILED %-57s duration: %10.2f sec  %s" % (poolname, job.action_name, job.table, job.duration(), job.error))
+    if _verbose:
+        for line in job.output:
+            printit ("VERBOSE MODE: %s" % line)
+    # v6.0: wake up a throttle waiting for a free slot
+    job_done.set()
+
+def run_sync(job):
+    # v5.8: with --jobs N hand sync work to N worker connections, otherwise run it on the main cursor
+    # v6.4: returns False for jobs not expected to finish before the deadline too
+    if defer_parent(job):
+        return True
+    if not admit(job):
+        return False
+    if sync_pool is not None:
+        sync_pool.submit(job)
+        return True
+    # the deadline is closer after a replication lag pause
+    if wait_for_lag() and not admit(job):
+        return False
+    timer = None
+    if deadline is not None and deadline_policy == 'cancel':
+        # the main thread blocks in the statement, so a timer cancels it at the deadline
+        timer = threading.Timer(max(time_left(), 0.0), conn.cancel)
+        timer.daemon = True
+        timer.start()
+    # v6.6: visible to the progress monitor while it runs
+    global sync_job
+    sync_job = job
+    cur.working = True
+    ok = run_job(conn, cur, job, pacer)
+    cur.working = False
+    sync_job = None
+    if timer is not None:
+        timer.cancel()
+    if not ok:
+        printit("Exception: %s" % job.error)
+        return False
+    if _verbose:
+        for line in job.output:
+            printit ("VERBOSE MODE: %s" % line)
+    return True
+
+def dispatch_async(job):
+    # v5.8: paced hand-off to the async worker pool
+    # v8.1: pacing moved to the worker connections
+    # v6.4: returns False for jobs not expected to finish before the deadline
+    if defer_parent(job):
+        return True
+    if not admit(job):
+        return False
+    async_pool.submit(job)
+    return True
+
+def pool_pids():
+    pids = []
+    for pool in (async_pool, sync_pool):
+        if pool is not None:
+            pids.extend(pool.pids)
+    return pids
+
+def finish_jobs():
+    # v5.7: wait for dispatched jobs instead of leaving detached psql processes behind
+    # v7.6: deferred partitioned parents go last
+    profile_phase('finish jobs')
+    analyze_parents()
+    for pool in (sync_pool, async_pool):
+        if pool is None or len(pool.threads) == 0:
+            continue
+        cnt = pool.active()
+        if cnt > 0:
+            printit ("Waiting for %d %s jobs to finish..." % (cnt, pool.name.lower()))
+        # v6.4: apply the deadline policy to jobs still running at the deadline
+        if deadline is not None and not pool.wait_idle(max(time_left(), 0.0)):
+            # v6.8: release jobs held by a replication lag pause, admission skips them now
+            pool.set_limit(pool.workers)
+            if deadline_policy == 'cancel':
+                printit ("Deadline reached. Cancelling %d running %s jobs." % (pool.cancel(), pool.name.lower()))
+            else:
+                printit ("Deadline reached. Waiting for %d running %s jobs to finish." % (pool.active(), pool.name.lower()))
+        pool.join()
+        pool.summary()
+
+def print_counters():
+    # v7.8: the counters line, printed by every action so a fleet run can merge it
+    printit ("Vacuum Freeze: %d  Vacuum Analyze: %d  Total Vacuums: %d  Total Analyzes: %d  Skipped Partitioned Tables: %d  Total Skipped Tables: %d  Total Async Jobs: %d " \
+             % (total_freezes, total_vacuums_analyzes, total_vacuums, total_analyzes, partitioned_tables_skipped, tables_skipped + partitioned_tables_skipped, asyncjobs))
+
 
 ####################
 # MAIN ENTRY POINT #
@@ -463,8 +2989,10 @@ else:
 #sys.exit(0)
 
 # Delay if high load encountered, give up after 30 minutes.
+# v7.8: runs started by --inventory leave this to the run that started them
+run_started = time.time()
 cnt = 0
-while True:
+while os.environ.get('PG_VACUUM_DRIVER') is None:
     if highload():
         printit("Deferring program start for another 5 minutes while high load encountered.")
         cnt = cnt + 1
@@ -475,6 +3003,37 @@ while True:
     else:
         break
 
+async_pool = None
+sync_pool  = None
+# v8.1: paces the main connection, pool connections have their own
+pacer      = Pacer(pace_ratio, pace_max)
+estimator  = Estimator(io_rate, job_overhead)
+history    = None
+sync_job   = None
+# v8.1: backends the main connection had, it moves between databases with --alldatabases
+main_pids  = []
+monitor    = None
+controller = None
+metrics    = None
+events     = None
+profiler   = None
+deadline_skipped = 0
+multipass_jobs   = 0
+memory     = None
+workers    = None
+# v7.2: visibility map counts read per table, predicted vacuum I/O by oid, and the oids skipped as all-visible
+vm_cache     = {}
+vm_predicted = {}
+vm_skipped   = set()
+# v7.3: reclaimable bytes by oid, loaded when first needed, pgstattuple_approx() results, and the oids skipped under --minbloat
+bloat         = None
+bloat_approx  = {}
+bloat_skipped = set()
+# v7.6: partitions skipped as cold, and deferred ANALYZE jobs of partitioned tables
+cold_skipped  = set()
+parent_jobs   = []
+skiplock   = threading.Lock()
+job_done   = threading.Event()
 total_freezes = 0
 total_vacuums_analyzes = 0
 total_vacuums  = 0
@@ -482,7 +3041,9 @@ total_analyzes = 0
 tables_skipped = 0
 partitioned_tables_skipped = 0
 asyncjobs = 0
-tablist = []
+tablist = set()
+snapshot = None
+relations = {}
 
 # Setup up the argument parser
 parser = argparse.ArgumentParser("PostgreSQL Vacumming Tool",  add_help=True)
@@ -497,6 +3058,9 @@ parser.add_argument("-x", "--vacuummaxdays"  ,dest="maxdaysV",      help="Vacuum
 parser.add_argument("-t", "--mindeadtups",dest="mindeadtups",       help="min dead tups",     type=int, default=-1,metavar="MINDEADTUPS")
 parser.add_argument("-z", "--minmodanalyzed",dest="minmodanalyzed", help="min tups analyzed", type=int, default=-1,metavar="MINMODANALYZED")
 parser.add_argument("-b", "--maxtables",dest="maxtables",           help="max tables",        type=int, default=9999,metavar="MAXTABLES")
+parser.add_argument("-j", "--jobs",dest="jobs",                     help="concurrent sync jobs", type=int, default=1,metavar="JOBS")
+parser.add_argument("-o", "--pollinterval", dest="pollinterval",    help="poll interval secs", type=int, default=5, metavar="POLLINTERVAL")
+parser.add_argument("-w", "--engine", dest="engine",                help="job engine",        type=str, default="threads", choices=['threads', 'asyncio'], metavar="ENGINE threads | asyncio")
 parser.add_argument("-f", "--freeze", dest="freeze",                help="vacuum freeze xid%",   type=int, default=-1, metavar="FREEZE > xid_age")
 parser.add_argument("-e", "--autotune", dest="autotune",            help="autotune",          type=float, choices=[Range(0.00001, 0.2)], metavar="AUTOTUNE 0.00001 to 0.2")
 parser.add_argument("-q", "--inquiry", dest="inquiry",              help="inquiry requested", type=str, default="", choices=['all', 'found', ''],  metavar="INQUIRY all | found")
@@ -509,6 +3073,28 @@ parser.add_argument("-c", "--check", dest="check",                  help="check
 parser.add_argument("-v", "--verbose", dest="verbose",              help="verbose mode",            default=False, action="store_true")
 parser.add_argument("-l", "--debug", dest="debug",                  help="debug mode",              default=False, action="store_true")
 parser.add_argument("-k", "--disablepageskipping", dest="disablepageskipping",              help="disable page skipping",      default=False, action="store_true")
+parser.add_argument("-R", "--history", dest="history",              help="run history file",  type=str, default="", metavar="HISTORY")
+parser.add_argument("-S", "--progress", dest="progress",            help="status line every N secs", type=int, default=0, metavar="SECONDS")
+parser.add_argument("-D", "--deadline", dest="deadline",            help="finish by HH:MM",   type=str, default="", metavar="HH:MM")
+parser.add_argument("-B", "--budget", dest="budget",                help="time budget in minutes", type=int, default=-1, metavar="MINUTES")
+parser.add_argument("-L", "--deadlinepolicy", dest="deadlinepolicy", help="running jobs at deadline", type=str, default="wait", choices=['wait', 'cancel'], metavar="DEADLINEPOLICY wait | cancel")
+parser.add_argument("-A", "--adaptive", dest="adaptive",            help="adapt concurrency to server pressure", default=False, action="store_true")
+parser.add_argument("-M", "--maxactive", dest="maxactive",          help="target active backends", type=int, default=-1, metavar="MAXACTIVE")
+parser.add_argument("-X", "--maxlag", dest="maxlag",                help="max replica lag in MB", type=int, default=-1, metavar="MAXLAG")
+parser.add_argument("-T", "--lagpolicy", dest="lagpolicy",          help="over max lag",      type=str, default="pause", choices=['pause', 'throttle'], metavar="LAGPOLICY pause | throttle")
+parser.add_argument("-E", "--membudget", dest="membudget",          help="maintenance_work_mem budget in MB", type=int, default=-1, metavar="MEMBUDGET")
+parser.add_argument("-V", "--vmskip", dest="vmskip",                help="skip vacuums reading less than this percent of the table", type=float, default=-1, metavar="PERCENT")
+parser.add_argument("-O", "--bloat", dest="bloat",                  help="rank by reclaimable bytes", type=str, default="", choices=['estimate', 'approx', ''], metavar="BLOAT estimate | approx")
+parser.add_argument("-F", "--minbloat", dest="minbloat",            help="min reclaimable MB to vacuum", type=int, default=-1, metavar="MINBLOAT")
+parser.add_argument("-W", "--freezewindows", dest="freezewindows", help="spread forecast freezes over N windows", type=int, default=-1, metavar="WINDOWS")
+parser.add_argument("-Z", "--alldatabases", "--all-databases", dest="alldatabases", help="every database, planned one at a time", default=False, action="store_true")
+parser.add_argument("-I", "--inventory", dest="inventory",          help="fleet inventory file", type=str, default="", metavar="INVENTORY")
+parser.add_argument("-J", "--fleetjobs", dest="fleetjobs",          help="clusters at a time", type=int, default=4, metavar="FLEETJOBS")
+parser.add_argument("-C", "--metrics", dest="metrics",              help="Prometheus textfile written at exit", type=str, default="", metavar="METRICS")
+parser.add_argument("-N", "--metricsport", dest="metricsport",      help="serve metrics on this local port", type=int, default=-1, metavar="PORT")
+parser.add_argument("-G", "--events", dest="events",                help="JSON lines event file", type=str, default="", metavar="EVENTS")
+parser.add_argument("-K", "--profile", dest="profile",              help="time phases, statements, jobs and waits, optionally dumped to a CSV file", type=str, nargs='?', const='-', default='', metavar="FILE")
+parser.add_argument("-P", "--priority", dest="priority",            help="order by priority score", default=False, action="store_true")
 parser.add_argument("-g", "--orderbydate", dest="orderbydate",      help="order by date ascending", default=False, action="store_true")
 
 args = parser.parse_args()
@@ -519,6 +3105,7 @@ bautotune           = False
 ignoreparts         = False
 async_              = False
 orderbydate         = args.orderbydate
+priority            = args.priority
 disablepageskipping = args.disablepageskipping
 debug               = args.debug
 
@@ -528,9 +3115,77 @@ if args.ignoreparts:
     ignoreparts = True;
 if args.async_:
     async_ = True;
-if args.dbname == "":
+if args.dbname == "" and args.inventory == "":
     printit("DB Name must be provided.")
     sys.exit(1)
+if args.fleetjobs < 1:
+    printit("Fleet jobs must be at least 1.  Value provided = %d" % args.fleetjobs)
+    sys.exit(1)
+if args.jobs < 1:
+    printit("Jobs must be at least 1.  Value provided = %d" % args.jobs)
+    sys.exit(1)
+if args.maxactive != -1:
+    if args.maxactive < 1:
+        printit("Max active backends must be at least 1.  Value provided = %d" % args.maxactive)
+        sys.exit(1)
+    pressure_active_backends = args.maxactive
+if args.maxlag != -1:
+    if args.maxlag < 1:
+        printit("Max lag must be at least 1 MB.  Value provided = %d" % args.maxlag)
+        sys.exit(1)
+    max_repl_lag = args.maxlag * 1048576
+lag_policy = args.lagpolicy
+if args.membudget != -1:
+    if args.membudget < 1:
+        printit("Memory budget must be at least 1 MB.  Value provided = %d" % args.membudget)
+        sys.exit(1)
+    memory_budget = args.membudget * 1048576
+if args.vmskip != -1:
+    if args.vmskip < 0 or args.vmskip > 100:
+        printit("VM skip percent must be between 0 (off) and 100.  Value provided = %.2f" % args.vmskip)
+        sys.exit(1)
+    vm_skip_pct = args.vmskip
+bloat_mode = args.bloat
+if args.minbloat != -1:
+    if args.minbloat < 0:
+        printit("Min bloat must be 0 or more MB.  Value provided = %d" % args.minbloat)
+        sys.exit(1)
+    bloat_min = args.minbloat * 1048576
+    if bloat_mode == '':
+        bloat_mode = 'estimate'
+if args.metricsport != -1 and (args.metricsport < 1 or args.metricsport > 65535):
+    printit("Metrics port must be between 1 and 65535.  Value provided = %d" % args.metricsport)
+    sys.exit(1)
+if args.progress < 0:
+    printit("Progress interval must be 0 (off) or more seconds.  Value provided = %d" % args.progress)
+    sys.exit(1)
+if args.pollinterval < 1:
+    printit("Poll interval must be at least 1 second.  Value provided = %d" % args.pollinterval)
+    sys.exit(1)
+poll_interval = args.pollinterval
+
+# v6.4: the earlier of the next HH:MM local time and now plus the budget
+if args.deadline != "":
+    try:
+        at = datetime.datetime.strptime(args.deadline, "%H:%M")
+    except ValueError:
+        printit("Deadline must be a local time of day in HH:MM format.  Value provided = %s" % args.deadline)
+        sys.exit(1)
+    now = datetime.datetime.now()
+    at  = now.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+    if at <= now:
+        at = at + datetime.timedelta(days=1)
+    deadline = time.mktime(at.timetuple())
+if args.budget != -1:
+    if args.budget < 1:
+        printit("Budget must be at least 1 minute.  Value provided = %d" % args.budget)
+        sys.exit(1)
+    if deadline is None or time.time() + args.budget * 60 < deadline:
+        deadline = time.time() + args.budget * 60
+deadline_policy = args.deadlinepolicy
+if args.engine == 'asyncio' and sys.version_info < (3, 4):
+    printit("The asyncio engine requires Python 3.4 or later.")
+    sys.exit(1)
 
 # 5 TB threshold, above this table actions are deferred
 threshold_max_size = 5368709120000 
@@ -565,7 +3220,18 @@ freeze = args.freeze
 if freeze != -1:
     bfreeze = True
 
-if bfreeze and (freeze < 100000000 or freeze >  15000000000):
+# v7.5: forecast freezes from the xid burn rate kept in the run history
+if args.freezewindows != -1:
+    if args.freezewindows < 1:
+        printit("Freeze windows must be at least 1.  Value provided = %d" % args.freezewindows)
+        sys.exit(1)
+    if args.history == "":
+        printit("--freezewindows needs --history to keep the xid samples the burn rate is computed from.")
+        sys.exit(1)
+    freeze_windows = args.freezewindows
+    bfreeze = True
+
+if freeze != -1 and (freeze < 100000000 or freeze >  15000000000):
     printit("You must specify --freeze value range between 100,000,000 (100 million) and 1,500,000,000 (1.5 billion). You specified %d" % freeze)
     sys.exit(1)
 
@@ -617,17 +3283,30 @@ else:
         sys.exit(1)
 
 printit ("version: %s" % version)
-printit ("dryrun(%r) inquiry(%s) ignoreparts(%r) host:%s dbname=%s schema=%s dbuser=%s dbport=%d  Analyze max days:%d  Vacuumm max days:%d  min dead tups:%d  max table size(GB/bytes):%d  freeze:%d nullsonly=%r autotune=%f check=%r" \
-        % (dryrun, inquiry, ignoreparts, hostname, dbname, schema, dbuser, dbport, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, args.maxsize, freeze, nullsonly, autotune, checkstats))
+printit ("dryrun(%r) inquiry(%s) ignoreparts(%r) host:%s dbname=%s schema=%s dbuser=%s dbport=%d  Analyze max days:%d  Vacuumm max days:%d  min dead tups:%d  max table size(GB/bytes):%d  freeze:%d nullsonly=%r autotune=%f check=%r jobs=%d engine=%s" \
+        % (dryrun, inquiry, ignoreparts, hostname, dbname, schema, dbuser, dbport, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, args.maxsize, freeze, nullsonly, autotune, checkstats, args.jobs, args.engine))
+if deadline is not None:
+    printit ("deadline: %s  policy: %s" % (datetime.datetime.fromtimestamp(deadline).strftime("%Y-%m-%d %H:%M:%S"), deadline_policy))
+
+# v7.8: a fleet run only starts and supervises one child run per cluster
+if args.inventory != "":
+    run_fleet(args.inventory, args.fleetjobs)
+
+# v8.1: from the start of the run, the high load deferral included
+if args.profile != "":
+    profile_file = args.profile
+    if profile_file != '-':
+        profile_file = child_file(profile_file)
+    profiler = Profiler(run_started, profile_file)
+    if cnt > 0:
+        profiler.record('wait', 'high_load', run_started, cnt * 300.0)
+    atexit.register(profiler.report)
 
 # Connect
 # conn = psycopg2.connect("dbname=testing user=postgres host=locahost password=postgrespass")
 # connstr = "dbname=%s port=%d user=%s host=%s password=postgrespass" % (dbname, dbport, dbuser, hostname )
-# v4.7 fix for ident cases, ie, no hostname provided, even localhost
-if hostname == '':
-    connstr = "dbname=%s port=%d user=%s application_name=%s connect_timeout=5" % (dbname, dbport, dbuser, 'pg_vacuum' )
-else:
-    connstr = "dbname=%s port=%d user=%s host=%s application_name=%s connect_timeout=5" % (dbname, dbport, dbuser, hostname, 'pg_vacuum' )
+# v4.7 fix for ident cases, ie, no hostname provided, even localhost, see connect_string()
+connstr = connect_string(dbname)
 try:
     conn = psycopg2.connect(connstr)
 except Exception as error:
@@ -641,7 +3320,8 @@ old_isolation_level = conn.isolation_level
 conn.set_isolation_level(0)
 
 # Open a cursor to perform database operation
-cur = conn.cursor()
+cur = conn.cursor(cursor_factory=TimedCursor)
+main_pids.append(conn.get_backend_pid())
 
 # Abort if a pg_vacuum instance is already running against this database.
 rc,instances = get_instance_cnt(conn,cur)
@@ -654,6 +3334,7 @@ elif instances > 1:
     printit("Other pg_vacuum instances already running (%d).  Program will close." % (instances))
     conn.close()
     sys.exit (1)
+profile_phase('setup')
 
 # get version since 9.6 and earlier do not have a relispartition column in pg_class table
 # it will look something like this or this: 90618 or 100013, so anything greater than 100000 would be 10+ versions.
@@ -665,13 +3346,38 @@ sql = "show server_version_num"
 try:
     cur.execute(sql)
 except Exception as error:
-    printit ("Unable to get server version number: %s" % (e))
+    printit ("Unable to get server version number: %s" % (error))
     conn.close()
     sys.exit (1)
 
 rows = cur.fetchone()
 pgversion = int(rows[0])
 
+# v7.7: every database of the cluster with --alldatabases
+# v8.1: planned by this run in the loop over databases below, no longer one child run each
+databases = [dbname]
+if args.alldatabases:
+    databases = all_databases()
+
+# v7.9: metrics textfile and endpoint. Child runs of --inventory each write a textfile of their own, see child_file().
+if args.metrics != "" or args.metricsport != -1:
+    metrics = Metrics("%s:%d" % (hostname, dbport), None if args.alldatabases else dbname)
+    if args.metrics != "":
+        atexit.register(metrics.write, child_file(args.metrics))
+    if args.metricsport != -1:
+        metrics.serve(args.metricsport)
+
+# v8.0: JSON lines events, appended to by child runs of --inventory too
+if args.events != "":
+    try:
+        events = EventLog(args.events, "%s:%d" % (hostname, dbport), dbname)
+    except Exception as error:
+        printit ("Unable to open events file %s: %s" % (args.events, error))
+        conn.close()
+        sys.exit (1)
+
+# v7.6: the partition tree, for parallel degrees, bloat sums and partition aware planning
+load_partitions()
 
 #v5.0 fix: DISABLE PAGE SKIPPING Followed by boolean is not valid pre PG v12
 parallelstatement = ''
@@ -685,1550 +3391,1625 @@ if pgversion > 130000:
     try:
         cur.execute(sql)
     except Exception as error:
-        printit ("Unable to get max parallel maintenance workers: %s" % (e))
+        printit ("Unable to get max parallel maintenance workers: %s" % (error))
         conn.close()
         sys.exit (1)
 
     rows = cur.fetchone()
     parallelworkers = int(rows[0])
 
-    if parallelstatement == '':
-        parallelstatement = 'PARALLEL ' + str(parallelworkers)
-    else:
-        parallelstatement = parallel_statement + ', PARALLEL ' + str(parallelworkers)
-
-if _verbose: printit("VERBOSE MODE: PG Version: %s  Parallel:%r  Max Parallel Maintenance Workers: %d  Parallel clause: %s" % (pgversion, bParallel, parallelworkers, parallelstatement))
-active_processes = 0
-
-# add running vacuum/analyzes to table bypass list
-add_runningvacs_to_tablist(conn,cur,tablist)
-
-#print("calling get vacuums...")
-#tables = get_vacuums_in_progress(conn, cur)
-#print(tables)
-#time.sleep(2)
-#print("calling get vacuums...")
-
+    # v7.1: the PARALLEL clause is chosen per table when a job starts, see tune_job(). This used to append
+    #       PARALLEL <max_parallel_maintenance_workers> here and referenced an undefined parallel_statement.
+    # parallel workers come out of max_parallel_workers, itself limited by max_worker_processes
+    try:
+        cur.execute("SELECT least(current_setting('max_parallel_workers')::int, current_setting('max_worker_processes')::int)")
+        maxworkers = int(cur.fetchone()[0])
+    except Exception as error:
+        printit ("Unable to get max parallel workers: %s" % (error))
+        conn.close()
+        sys.exit (1)
+    workers = Budget(maxworkers, 0, parallelworkers)
 
-#################################
-# 1. Check Action Only          #
-#################################
-if checkstats:
-  '''
-  V.4.5 Fix: add autovacuum and autoanalyze counts
-  select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1;
-  select schemaname, count(*) as no_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1;
-  select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum) < now() - interval '10 day' group by 1 order by 1;
-  select schemaname, count(*) as old_analyzes from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1;
-  '''
-  if _verbose: printit("VERBOSE MODE: Check Action Only branch")
-  sql = "select aa.no_vacuums, bb.no_analyzes, cc.old_vacuums as old_vacuums_10days, dd.old_analyzes as old_analyzes_20days FROM " \
-        "(select coalesce(sum(foo.no_vacuums), 0)   as no_vacuums   FROM (select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1) as foo) aa, " \
-        "(select coalesce(sum(foo.no_analyzes), 0)  as no_analyzes  FROM (select schemaname, count(*) as no_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1) as foo) bb, " \
-        "(select coalesce(sum(foo.old_vacuums), 0)  as old_vacuums  FROM (select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum)   < now() - interval '10 day' group by 1 order by 1) as foo) cc, " \
-        "(select coalesce(sum(foo.old_analyzes), 0) as old_analyzes FROM (select schemaname, count(*) as old_analyzes from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1) as foo) dd; "
+if workers is None:
+    workers = Budget(0, 0, 0)
 
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Check Stats Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-  rows = cur.fetchone()
-  no_vacuums   = rows[0]
-  no_analyzes  = rows[1]
-  old_vacuums  = rows[2]
-  old_analyzes = rows[3]
+if _verbose: printit("VERBOSE MODE: PG Version: %s  Parallel:%r  Max Parallel Maintenance Workers: %d  Parallel worker budget: %d" % (pgversion, bParallel, parallelworkers, workers.budget))
 
-  printit("CheckStats  :  no vacuums(%d)   no analyzes(%d)   old vacuums(%d)   old_analyzes(%d)" % (no_vacuums, no_analyzes, old_vacuums, old_analyzes))
+# v6.9: small tables skip the SET vacuum_cost_delay = 0 when our sessions already run without delay
+try:
+    cur.execute("SELECT setting::float FROM pg_settings WHERE name = 'vacuum_cost_delay'")
+    session_cost_delay = float(cur.fetchone()[0])
+except Exception as error:
+    printit ("Unable to get vacuum_cost_delay: %s" % (error))
+    conn.close()
+    sys.exit (1)
 
-  # get individual schema counts
-  sql = "select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1"
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Check Stats Details1 Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit("no vacuums: None Found")
-  cnt = 0
-  for row in rows:
-      cnt = cnt + 1
-      schema = row[0]
-      cnt    = row[1]
-      printit("No vacuums  : %20s  %4d" % (schema,cnt))
+# v7.0: the server's maintenance_work_mem is what a job gets without a SET
+try:
+    cur.execute("SELECT setting::bigint * 1024 FROM pg_settings WHERE name = 'maintenance_work_mem'")
+    maintenance_work_mem = int(cur.fetchone()[0])
+except Exception as error:
+    printit ("Unable to get maintenance_work_mem: %s" % (error))
+    conn.close()
+    sys.exit (1)
+if pgversion >= 170000:
+    memory = Budget(memory_budget, maintenance_work_mem, memory_budget)
+else:
+    memory = Budget(memory_budget, maintenance_work_mem, 1073741824)
 
-  sql = "select schemaname, count(*) as no_analyzes   from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1"
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Check Stats Details2 Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit("No analyzes : %20s  %4d" % ('None Found',0))
-  cnt = 0
-  for row in rows:
-      cnt = cnt + 1
-      schema = row[0]
-      cnt    = row[1]
-      printit("No analyzes : %20s  %4d" % (schema,cnt))
+# v7.2: page size for the vacuum I/O prediction
+try:
+    cur.execute("SELECT current_setting('block_size')::int")
+    block_size = int(cur.fetchone()[0])
+except Exception as error:
+    printit ("Unable to get block_size: %s" % (error))
+    conn.close()
+    sys.exit (1)
 
-  sql = "select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum) < now() - interval '10 day' group by 1 order by 1"
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Check Stats Details3 Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit("old vacuums: None Found")
-  cnt = 0
-  for row in rows:
-      cnt = cnt + 1
-      schema = row[0]
-      cnt    = row[1]
-      printit("old vacuums : %20s  %4d" % (schema,cnt))
+# v6.3: freeze max ages for the --priority score
+# v7.4: and for the freeze planner
+if priority or bfreeze:
+    if pgversion >= 90500:
+        sql = "SELECT current_setting('autovacuum_freeze_max_age')::bigint, current_setting('autovacuum_multixact_freeze_max_age')::bigint"
+    else:
+        sql = "SELECT current_setting('autovacuum_freeze_max_age')::bigint, %d" % multixact_freeze_max_age
+    try:
+        cur.execute(sql)
+    except Exception as error:
+        printit ("Unable to get freeze max ages: %s" % (error))
+        conn.close()
+        sys.exit (1)
+    rows = cur.fetchone()
+    freeze_max_age = int(rows[0])
+    multixact_freeze_max_age = int(rows[1])
 
-  sql = "select schemaname, count(*) as old_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1"
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Check Stats Details4 Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-  rows = cur.fetchall()
-  cnt = 0
-  if len(rows) == 0:
-      printit("old analyzes: None Found")
-  for row in rows:
-      cnt = cnt + 1
-      schema = row[0]
-      cnt    = row[1]
-      printit("old analyzes: %20s  %4d" % (schema,cnt))
+active_processes = 0
 
-  conn.close()
-  printit ("End of check stats action.  Closing the connection and exiting normally.")
-  sys.exit(0)
+# v5.7: async jobs run in-process on their own connections, at most threshold_max_processes at a time
+# v5.9: or on one asyncio event loop, which also counts vacuums of other pg_vacuum sessions (PG 9.6+)
+if args.engine == 'asyncio':
+    async_pool = AsyncioPool('Async', threshold_max_processes, connstr, monitor=pgversion >= 90600)
+else:
+    async_pool = JobPool('Async', threshold_max_processes)
 
+# v5.8: sync jobs go to N concurrent connections if requested, like vacuumdb -j
+if args.jobs > 1:
+    if args.engine == 'asyncio':
+        sync_pool = AsyncioPool('Sync', args.jobs, connstr)
+    else:
+        sync_pool = JobPool('Sync', args.jobs)
 
-#################################
-# 2. Nulls Only                 #
-#################################
-if nullsonly:
-  '''
-  SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
-  pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
-  u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
-  to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze, u.vacuum_count, u.analyze_count
-  FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and
-  t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1;
+# v6.5: measured throughput of earlier runs against this database
+if args.history != "":
+    try:
+        history = History(args.history, "%s:%d" % (hostname, dbport), dbname)
+    except Exception as error:
+        printit ("Unable to open run history %s: %s *** %s" % (args.history, type(error), error))
+        conn.close()
+        sys.exit (1)
+    # v7.5: counters for the burn rate, read from a snapshot since txid_current() would itself use up an xid
+    if pgversion >= 130000:
+        xidsql = "pg_snapshot_xmax(pg_current_snapshot())::text::bigint"
+    else:
+        xidsql = "txid_snapshot_xmax(txid_current_snapshot())"
+    if pgversion >= 90500:
+        mxidsql = "(datminmxid::text::bigint + mxid_age(datminmxid)) % 4294967296"
+    else:
+        mxidsql = "NULL::bigint"
+    try:
+        cur.execute("SELECT %s, %s FROM pg_database WHERE datname = current_database()" % (xidsql, mxidsql))
+        rows = cur.fetchone()
+        history.sample(int(rows[0]), rows[1] is not None and int(rows[1]) or None)
+    except Exception as error:
+        printit ("Unable to sample xid counters: %s" % (error))
+        conn.close()
+        sys.exit (1)
 
-  '''
-  if _verbose: printit("VERBOSE MODE: Nulls Only branch")
-  if pgversion > 100000:
-      if schema == "":
-        sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-        "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-        "u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-        "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-        " u.vacuum_count, u.analyze_count " \
-        "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = n.nspname and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') " \
-        "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  " \
-        "and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1"
-      else:
-        sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-        "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-        "u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-        "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-        " u.vacuum_count, u.analyze_count " \
-        "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and t.schemaname = n.nspname and t.tablename = c.relname and " \
-        "c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1" % (schema)
-  else:
-      if schema == "":
-        sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-            "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-            "u.n_dead_tup::bigint AS dead_tup, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) " \
-            "where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, " \
-            "to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-            "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-            " u.vacuum_count, u.analyze_count " \
-            "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = n.nspname and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and " \
-            "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  " \
-            "and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1"
-      else:
-        sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-            "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-            "u.n_dead_tup::bigint AS dead_tup, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) " \
-            "where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-            "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-            "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze, " \
-            " u.vacuum_count, u.analyze_count " \
-            "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and t.schemaname = n.nspname and " \
-            "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1" % (schema)
-  try:
-      cur.execute(sql)
-  except Exception as error:
-      printit("Nulls Only Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit ("No Nulls Only need to be done.")
-  else:
-      printit ("Nulls Only to be evaluated=%d.  Includes deferred ones too." % len(rows) )
-
-  cnt = 0
-  partcnt = 0
-  action_name = 'VAC/ANALYZ'
-
-  for row in rows:
-      if active_processes > threshold_max_processes:
-          # see how many are currently running and update the active processes again
-          # rc = get_process_cnt()
-          rc = get_query_cnt(conn, cur)
-          if rc > threshold_max_processes:
-              printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-              time.sleep(300)
+# v6.6: progress views exist since PG 9.6
+if args.progress > 0 and not dryrun:
+    if pgversion < 90600:
+        printit ("Progress monitoring requires PG v9.6 or later, ignoring --progress.")
+    else:
+        monitor = ProgressMonitor(connstr, args.progress)
+        monitor.start()
+
+# v6.7: concurrency follows server pressure during the run
+# v6.8: which also guards replication lag
+if (args.adaptive or max_repl_lag >= 0) and not dryrun:
+    controller = Controller(connstr, poll_interval, max(threshold_max_processes, args.jobs), args.adaptive)
+    controller.start()
+
+# v8.1: one pass over the sections per database. Jobs go to the shared pools without waiting for the database before,
+#       an --alldatabases run is one budget for the whole cluster. Actions end after the last database.
+bloat_requested  = bloat_mode
+failed_databases = []
+late_databases   = []
+tablists         = {}
+for datname in databases:
+    if deadline_passed():
+        late_databases.append(datname)
+        continue
+    if not use_database(datname):
+        failed_databases.append(datname)
+        continue
+    if args.alldatabases:
+        printit ("Starting database %s" % dbname)
+    tablist = set()
+    tablists[dbname] = tablist
+
+    # v7.1: indexes large enough for a parallel worker, per table
+    if bParallel:
+        sql = "SELECT i.indrelid, count(*) FROM pg_index i JOIN pg_class c ON (c.oid = i.indexrelid) " \
+              "WHERE c.relpages >= (SELECT setting::bigint FROM pg_settings WHERE name = 'min_parallel_index_scan_size') GROUP BY 1"
+        try:
+            cur.execute(sql)
+            for row in cur.fetchall():
+                parallel_indexes[row[0]] = int(row[1])
+        except Exception as error:
+            printit ("Unable to get parallel index counts: %s" % (error))
+            failed_databases.append(dbname)
+            continue
+        # a VACUUM of a partitioned table processes its partitions one at a time, so it needs the degree of the largest
+        changed  = True
+        while changed:
+            changed = False
+            for child, parent in partition_parent.items():
+                if parallel_indexes.get(child, 0) > parallel_indexes.get(parent, 0):
+                    parallel_indexes[parent] = parallel_indexes[child]
+                    changed = True
+        if _verbose: printit("VERBOSE MODE: Tables with parallel indexes: %d" % len(parallel_indexes))
+
+    # v7.2: the optional pg_visibility extension for the vacuum I/O prediction
+    try:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_visibility')")
+        vm_summary = cur.fetchone()[0]
+    except Exception as error:
+        printit ("Unable to check for the pg_visibility extension: %s" % (error))
+        failed_databases.append(dbname)
+        continue
+    if _verbose: printit("VERBOSE MODE: block size: %d  pg_visibility: %r  VM skip percent: %.2f" % (block_size, vm_summary, vm_skip_pct))
+
+    # v7.3: pgstattuple_approx() needs the pgstattuple extension, 9.5+
+    bloat_mode = bloat_requested
+    if bloat_mode == 'approx':
+        try:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pgstattuple')")
+            if not cur.fetchone()[0]:
+                printit ("pgstattuple extension not installed, estimating bloat from pg_stats.")
+                bloat_mode = 'estimate'
+        except Exception as error:
+            printit ("Unable to check for the pgstattuple extension: %s" % (error))
+            failed_databases.append(dbname)
+            continue
+
+    # add running vacuum/analyzes to table bypass list
+    add_runningvacs_to_tablist(conn,cur,tablist)
+
+    #print("calling get vacuums...")
+    #tables = get_vacuums_in_progress(conn, cur)
+    #print(tables)
+    #time.sleep(2)
+    #print("calling get vacuums...")
+
+
+    #################################
+    # 1. Check Action Only          #
+    #################################
+    if checkstats:
+      profile_phase('1 check')
+      '''
+      V.4.5 Fix: add autovacuum and autoanalyze counts
+      select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1;
+      select schemaname, count(*) as no_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1;
+      select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum) < now() - interval '10 day' group by 1 order by 1;
+      select schemaname, count(*) as old_analyzes from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1;
+      '''
+      if _verbose: printit("VERBOSE MODE: Check Action Only branch")
+      sql = "select aa.no_vacuums, bb.no_analyzes, cc.old_vacuums as old_vacuums_10days, dd.old_analyzes as old_analyzes_20days FROM " \
+            "(select coalesce(sum(foo.no_vacuums), 0)   as no_vacuums   FROM (select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1) as foo) aa, " \
+            "(select coalesce(sum(foo.no_analyzes), 0)  as no_analyzes  FROM (select schemaname, count(*) as no_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1) as foo) bb, " \
+            "(select coalesce(sum(foo.old_vacuums), 0)  as old_vacuums  FROM (select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum)   < now() - interval '10 day' group by 1 order by 1) as foo) cc, " \
+            "(select coalesce(sum(foo.old_analyzes), 0) as old_analyzes FROM (select schemaname, count(*) as old_analyzes from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1) as foo) dd; "
+
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Check Stats Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
+      rows = cur.fetchone()
+      no_vacuums   = rows[0]
+      no_analyzes  = rows[1]
+      old_vacuums  = rows[2]
+      old_analyzes = rows[3]
+
+      printit("CheckStats  :  no vacuums(%d)   no analyzes(%d)   old vacuums(%d)   old_analyzes(%d)" % (no_vacuums, no_analyzes, old_vacuums, old_analyzes))
+
+      # get individual schema counts
+      sql = "select schemaname, count(*) as no_vacuums   from pg_stat_user_tables where schemaname not like 'pg_temp%' and vacuum_count = 0 and autovacuum_count = 0 group by 1 order by 1"
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Check Stats Details1 Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit("no vacuums: None Found")
+      cnt = 0
+      for row in rows:
+          cnt = cnt + 1
+          schema = row[0]
+          cnt    = row[1]
+          printit("No vacuums  : %20s  %4d" % (schema,cnt))
+
+      sql = "select schemaname, count(*) as no_analyzes   from pg_stat_user_tables where schemaname not like 'pg_temp%' and analyze_count = 0 and autoanalyze_count = 0 group by 1 order by 1"
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Check Stats Details2 Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit("No analyzes : %20s  %4d" % ('None Found',0))
+      cnt = 0
+      for row in rows:
+          cnt = cnt + 1
+          schema = row[0]
+          cnt    = row[1]
+          printit("No analyzes : %20s  %4d" % (schema,cnt))
+
+      sql = "select schemaname, count(*) as old_vacuums  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_vacuum, last_autovacuum) < now() - interval '10 day' group by 1 order by 1"
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Check Stats Details3 Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit("old vacuums: None Found")
+      cnt = 0
+      for row in rows:
+          cnt = cnt + 1
+          schema = row[0]
+          cnt    = row[1]
+          printit("old vacuums : %20s  %4d" % (schema,cnt))
+
+      sql = "select schemaname, count(*) as old_analyzes  from pg_stat_user_tables where schemaname not like 'pg_temp%' and greatest(last_analyze, last_autoanalyze) < now() - interval '20 day' group by 1 order by 1"
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Check Stats Details4 Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
+      rows = cur.fetchall()
+      cnt = 0
+      if len(rows) == 0:
+          printit("old analyzes: None Found")
+      for row in rows:
+          cnt = cnt + 1
+          schema = row[0]
+          cnt    = row[1]
+          printit("old analyzes: %20s  %4d" % (schema,cnt))
+
+      continue
+
+
+    #################################
+    # 2. Nulls Only                 #
+    #################################
+    if nullsonly:
+      profile_phase('2 nulls only')
+      '''
+      SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
+      pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
+      u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
+      to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze, u.vacuum_count, u.analyze_count
+      FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and
+      t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1;
+
+      '''
+      if _verbose: printit("VERBOSE MODE: Nulls Only branch")
+      if pgversion > 100000:
+          if schema == "":
+            sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
+            "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
+            "u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
+            "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
+            " u.vacuum_count, u.analyze_count, c.oid " \
+            "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = n.nspname and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') " \
+            "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  " \
+            "and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1"
+          else:
+            sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
+            "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
+            "u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
+            "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
+            " u.vacuum_count, u.analyze_count, c.oid " \
+            "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and t.schemaname = n.nspname and t.tablename = c.relname and " \
+            "c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1" % (schema)
+      else:
+          if schema == "":
+            sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
+                "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
+                "u.n_dead_tup::bigint AS dead_tup, c.oid IN (SELECT inhrelid FROM pg_inherits) " \
+                "as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, " \
+                "to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
+                "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
+                " u.vacuum_count, u.analyze_count, c.oid " \
+                "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = n.nspname and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and " \
+                "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  " \
+                "and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1"
           else:
-              printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-          active_processes = rc
-
-      cnt = cnt + 1
-      table    = row[0]
-      sizep    = row[1]
-      size     = row[2]
-      tups     = row[3]
-      live     = row[4]
-      dead     = row[5]
-      part     = row[6]
-      last_vac = row[7]
-      last_avac= row[8]
-      last_anl = row[9]
-      last_aanl= row[10]
-      vac_cnt  = int(row[11])
-      anal_cnt = int(row[12])
-
-      if vac_cnt == 0 and anal_cnt == 0:
-          action_name = 'VAC/ANALYZ'
-      elif vac_cnt == 0 and anal_cnt > 0:
-          action_name = 'VACUUM'
-      elif vac_cnt > 0 and anal_cnt == 0:
-          action_name = 'ANALYZE'
-
-      #printit("DEBUG action=%s  vac=%d  anal=%d  table=%s" % (action_name, vac_cnt, anal_cnt, table))
-
-      if part and ignoreparts:
-          partcnt = partcnt + 1
-          #print ("ignoring partitioned table: %s" % table)
-          cnt = cnt - 1
+            sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
+                "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
+                "u.n_dead_tup::bigint AS dead_tup, c.oid IN (SELECT inhrelid FROM pg_inherits) " \
+                "as partitioned, " \
+                "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
+                "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze, " \
+                " u.vacuum_count, u.analyze_count, c.oid " \
+                "FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and t.schemaname = n.nspname and " \
+                "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname AND (u.vacuum_count = 0 OR u.analyze_count = 0) order by 1,1" % (schema)
+      try:
+          cur.execute(sql)
+      except Exception as error:
+          printit("Nulls Only Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
           continue
 
-      # check if we already processed this table
-      if skip_table(table, tablist):
-          cnt = cnt - 1
-          continue
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit ("No Nulls Only need to be done.")
+      else:
+          printit ("Nulls Only to be evaluated=%d.  Includes deferred ones too." % len(rows) )
+
+      cnt = 0
+      partcnt = 0
+      action_name = 'VAC/ANALYZ'
+
+      for row in prioritize(rows, 'VACUUM ANALYZE'):
+          if active_processes >= threshold_max_processes:
+              # see how many are currently running and update the active processes again
+              # v6.0: wait for a job to finish instead of sleeping 5 minutes
+              active_processes = wait_for_slot(conn, cur)
+
+          cnt = cnt + 1
+          table    = row[0]
+          sizep    = row[1]
+          size     = row[2]
+          tups     = row[3]
+          live     = row[4]
+          dead     = row[5]
+          part     = row[6]
+          last_vac = row[7]
+          last_avac= row[8]
+          last_anl = row[9]
+          last_aanl= row[10]
+          vac_cnt  = int(row[11])
+          anal_cnt = int(row[12])
+          oid      = row[13]
+
+          if vac_cnt == 0 and anal_cnt == 0:
+              action_name = 'VAC/ANALYZ'
+          elif vac_cnt == 0 and anal_cnt > 0:
+              action_name = 'VACUUM'
+          elif vac_cnt > 0 and anal_cnt == 0:
+              action_name = 'ANALYZE'
+
+          #printit("DEBUG action=%s  vac=%d  anal=%d  table=%s" % (action_name, vac_cnt, anal_cnt, table))
+
+          if part and ignoreparts:
+              partcnt = partcnt + 1
+              #print ("ignoring partitioned table: %s" % table)
+              cnt = cnt - 1
+              candidate('skip', action_name, table, oid, size, tups, dead, reason='ignoreparts')
+              continue
 
-      if size > threshold_max_size:
-          if dryrun:
-              # defer action
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead))
-              tablist.append(table)
-              check_maxtables()
-              tables_skipped = tables_skipped + 1
-          continue
-      elif tups > threshold_async_rows or size > threshold_max_sync:
-          if dryrun:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tables_skipped = tables_skipped + 1
-                  tablist.append(table)
-                  check_maxtables()
+          # check if we already processed this table
+          if skip_table(oid, tablist):
+              cnt = cnt - 1
+              candidate('skip', action_name, table, oid, size, tups, dead, reason='already_listed')
+              continue
+
+          # v8.1: no vacuum where the visibility map says all pages are all-visible, a never analyzed table is still analyzed
+          if action_name != 'ANALYZE' and vm_skip(oid, action_name):
+              if action_name == 'VACUUM':
                   cnt = cnt - 1
                   continue
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-              total_vacuums_analyzes = total_vacuums_analyzes + 1
-              tablist.append(table)
-              check_maxtables()
-              active_processes = active_processes + 1
-          else:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tablist.append(table)
+              action_name = 'ANALYZE'
+              vac_cnt = 1
+              vm_predicted.pop(oid, None)
+
+          if size > threshold_max_size:
+              if dryrun:
+                  # defer action
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead))
+                  candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
+                  tablist.add(oid)
                   check_maxtables()
                   tables_skipped = tables_skipped + 1
-                  cnt = cnt - 1
-                  continue
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-              asyncjobs = asyncjobs + 1
-
-              # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "VACUUM (ANALYZE, VERBOSE, %s) %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, parallelstatement, table)
-              # V4.1 fix, escape double quotes
-              tbl= table.replace('"', '\\"')
-              tbl= tbl.replace('$', '\$')
-
-              if vac_cnt == 0 and anal_cnt == 0:
-                  # v5.0 fix: handle empty parallelstatement string
-                  if parallelstatement == '':
-                      cmd = 'nohup psql -d "%s" -c "VACUUM (ANALYZE) %s" 2>/dev/null &' % (connparms, tbl)
-                  else:
-                      cmd = 'nohup psql -d "%s" -c "VACUUM (ANALYZE, %s) %s" 2>/dev/null &' % (connparms, parallelstatement, tbl)
-                  action_name = 'VAC/ANALYZ'
-              elif vac_cnt == 0 and anal_cnt > 0:
-                  # v5.0 fix: handle empty parallelstatement string
-                  if parallelstatement == '':
-                      cmd = 'nohup psql -d "%s" -c "VACUUM %s" 2>/dev/null &' % (connparms, tbl)
-                  else:
-                      cmd = 'nohup psql -d "%s" -c "VACUUM (%s) %s" 2>/dev/null &' % (connparms, parallelstatement, tbl)
-              elif vac_cnt > 0 and anal_cnt == 0:
-                  cmd = 'nohup psql -d "%s" -c "ANALYZE %s" 2>/dev/null &' % (connparms, tbl)
-
-              time.sleep(0.5)
-              rc = execute_cmd(cmd)
-              print("rc=%d" % rc)
-              total_vacuums_analyzes = total_vacuums_analyzes + 1
-              tablist.append(table)
-              check_maxtables()
-              active_processes = active_processes + 1
+              continue
+          elif use_async(table, tups, size, 'VACUUM ANALYZE'):
+              if dryrun:
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                      tables_skipped = tables_skipped + 1
+                      tablist.add(oid)
+                      check_maxtables()
+                      cnt = cnt - 1
+                      continue
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                  candidate('async', action_name, table, oid, size, tups, dead)
+                  total_vacuums_analyzes = total_vacuums_analyzes + 1
+                  tablist.add(oid)
+                  check_maxtables()
+                  active_processes = active_processes + 1
+              else:
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                      tablist.add(oid)
+                      check_maxtables()
+                      tables_skipped = tables_skipped + 1
+                      cnt = cnt - 1
+                      continue
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                  candidate('async', action_name, table, oid, size, tups, dead)
+                  asyncjobs = asyncjobs + 1
+
+                  # v5.7: run on the worker pool instead of a detached psql process
+                  if vac_cnt == 0 and anal_cnt == 0:
+                      job = VacuumJob(table, 'VACUUM', ['ANALYZE', parallelstatement], action_name, size, tups, oid)
+                  elif vac_cnt == 0 and anal_cnt > 0:
+                      job = VacuumJob(table, 'VACUUM', [parallelstatement], action_name, size, tups, oid)
+                  elif vac_cnt > 0 and anal_cnt == 0:
+                      job = VacuumJob(table, 'ANALYZE', [], action_name, size, tups, oid)
+
+                  if not dispatch_async(job):
+                      asyncjobs = asyncjobs - 1
+                      continue
+                  total_vacuums_analyzes = total_vacuums_analyzes + 1
+                  tablist.add(oid)
+                  check_maxtables()
+                  active_processes = active_processes + 1
 
-      else:
-          if dryrun:
-              printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-              total_vacuums_analyzes = total_vacuums_analyzes + 1
-              tablist.append(table)
-              check_maxtables()
           else:
-              printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+              if dryrun:
+                  printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                  candidate('sync', action_name, table, oid, size, tups, dead)
+                  total_vacuums_analyzes = total_vacuums_analyzes + 1
+                  tablist.add(oid)
+                  check_maxtables()
+              else:
+                  printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                  candidate('sync', action_name, table, oid, size, tups, dead)
+
+                  if vac_cnt == 0 and anal_cnt == 0:
+                      job = VacuumJob(table, 'VACUUM', ['ANALYZE', parallelstatement], action_name, size, tups, oid)
+                  elif vac_cnt == 0 and anal_cnt > 0:
+                      job = VacuumJob(table, 'VACUUM', [parallelstatement], action_name, size, tups, oid)
+                  elif vac_cnt > 0 and anal_cnt == 0:
+                      job = VacuumJob(table, 'ANALYZE', [], action_name, size, tups, oid)
+
+                  # v5.8: main cursor or --jobs worker connections
+                  if not run_sync(job):
+                      cnt = cnt - 1
+                      continue
+                  total_vacuums_analyzes = total_vacuums_analyzes + 1
+                  tablist.add(oid)
+                  check_maxtables()
 
-              if vac_cnt == 0 and anal_cnt == 0:
-                  # v5.0 fix: handle empty parallelstatement string
-                  if parallelstatement == '':
-                      sql = "VACUUM (ANALYZE) %s" % (table)
-                  else:
-                      sql = "VACUUM (ANALYZE, %s) %s" % (parallelstatement, table)
-              elif vac_cnt == 0 and anal_cnt > 0:
-                  # v5.0 fix: handle empty parallelstatement string
-                  if parallelstatement == '':
-                      sql = "VACUUM  %s" % (table)
-                  else:
-                      sql = "VACUUM (%s) %s" % (parallelstatement, table)
-              elif vac_cnt > 0 and anal_cnt == 0:
-                  sql = "ANALYZE %s" % table
-
-              time.sleep(0.5)
-              try:
-                  cur.execute(sql)
-              except Exception as error:
-                  printit("Exception: %s *** %s" % (type(error), error))
-                  cnt = cnt - 1
-                  continue
-              total_vacuums_analyzes = total_vacuums_analyzes + 1
-              tablist.append(table)
-              check_maxtables()
+      if ignoreparts:
+          printit ("Partitioned table vacuum/analyzes bypassed=%d" % partcnt)
+          partitioned_tables_skipped = partitioned_tables_skipped + partcnt
 
-  if ignoreparts:
-      printit ("Partitioned table vacuum/analyzes bypassed=%d" % partcnt)
-      partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+      printit ("Tables vacuumed/analyzed: %d" % cnt)
 
-  printit ("Tables vacuumed/analyzed: %d" % cnt)
+      continue
 
-  if inquiry:
-    rc = _inquiry(conn,cur,tablist)
 
-  conn.close()
-  printit ("End of Nulls Only action.  Closing the connection and exiting normally.")
-  sys.exit(0)
-
-
-#################################
-# 3. Freeze Tables              #
-#################################
-if bfreeze:
-  if _verbose: printit("VERBOSE MODE: (3) Freeze section")
-  # ignore tables less than the minimum threshold, 50 million
-  if pgversion > 100000:
-      if schema == "":
-         sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid)::bigint as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
-         "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
-         "pg_total_relation_size(c.oid) as table_size, c.relispartition, ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct " \
-         "FROM pg_class c, pg_namespace n WHERE n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
-         "age(c.relfrozenxid)::bigint > %d ORDER BY age(c.relfrozenxid) DESC, table_size DESC" % (threshold_freeze)
+    #################################
+    # 3. Freeze Tables              #
+    #################################
+    if bfreeze:
+      profile_phase('3 freeze')
+      if _verbose: printit("VERBOSE MODE: (3) Freeze section")
+      # ignore tables less than the minimum threshold, 50 million
+      # v7.4: or whose multixact age is over the same fraction of autovacuum_multixact_freeze_max_age, closest to its limit first
+      if pgversion >= 90500:
+          mxidage = "mxid_age(c.relminmxid)::bigint"
       else:
-         sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid)::bigint as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
-         "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
-         "pg_total_relation_size(c.oid) as table_size, c.relispartition, ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct " \
-         "FROM pg_class c, pg_namespace n WHERE n.nspname = '%s' and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
-         "age(c.relfrozenxid)::bigint > %d ORDER BY age(c.relfrozenxid) DESC, table_size DESC" % (schema, threshold_freeze)
+          mxidage = "0::bigint"
+      mx_threshold = threshold_freeze * multixact_freeze_max_age // freeze_max_age
+      closest = "GREATEST(age(c.relfrozenxid)::numeric / %d, %s::numeric / %d)" % (freeze_max_age, mxidage, multixact_freeze_max_age)
+      if pgversion > 100000:
+          if schema == "":
+             sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid)::bigint as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
+             "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
+             "pg_total_relation_size(c.oid) as table_size, c.relispartition, ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct, c.oid, %s as mxid_age, %d as mxid_max_age " \
+             "FROM pg_class c, pg_namespace n WHERE n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
+             "(age(c.relfrozenxid)::bigint > %d OR %s > %d) ORDER BY %s DESC, table_size DESC" % (mxidage, multixact_freeze_max_age, threshold_freeze, mxidage, mx_threshold, closest)
+          else:
+             sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid)::bigint as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
+             "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
+             "pg_total_relation_size(c.oid) as table_size, c.relispartition, ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct, c.oid, %s as mxid_age, %d as mxid_max_age " \
+             "FROM pg_class c, pg_namespace n WHERE n.nspname = '%s' and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
+             "(age(c.relfrozenxid)::bigint > %d OR %s > %d) ORDER BY %s DESC, table_size DESC" % (mxidage, multixact_freeze_max_age, schema, threshold_freeze, mxidage, mx_threshold, closest)
 
-  else:
-  # put version 9.x compatible query here
-  # CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
-      if schema == "":
-         sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid) as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
-        "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
-        "pg_total_relation_size(c.oid) as table_size, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-        "ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct " \
-        "FROM pg_class c, pg_namespace n WHERE n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
-        "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint > %d ORDER BY age(c.relfrozenxid) DESC" % (threshold_freeze)
       else:
-         sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid) as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
-        "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
-        "pg_total_relation_size(c.oid) as table_size, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-        "ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct " \
-        "FROM pg_class c, pg_namespace n WHERE n.nspname = '%s' and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
-        "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint > %d ORDER BY age(c.relfrozenxid) DESC" % (schema, threshold_freeze)
-  if debug: printit("DEBUG   QUERY: %s" % sql)
+      # put version 9.x compatible query here
+      # CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
+          if schema == "":
+             sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid) as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
+            "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
+            "pg_total_relation_size(c.oid) as table_size, c.oid IN (SELECT inhrelid FROM pg_inherits) as partitioned, " \
+            "ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct, c.oid, %s as mxid_age, %d as mxid_max_age " \
+            "FROM pg_class c, pg_namespace n WHERE n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
+            "(CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint > %d OR %s > %d) ORDER BY %s DESC" % (mxidage, multixact_freeze_max_age, threshold_freeze, mxidage, mx_threshold, closest)
+          else:
+             sql = "SELECT n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint as rows, age(c.relfrozenxid) as xid_age, CAST(current_setting('autovacuum_freeze_max_age') AS bigint) as freeze_max_age, " \
+            "CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint as howclose, pg_size_pretty(pg_total_relation_size(c.oid)) as table_size_pretty,  " \
+            "pg_total_relation_size(c.oid) as table_size, c.oid IN (SELECT inhrelid FROM pg_inherits) as partitioned, " \
+            "ROUND((age(c.relfrozenxid)::numeric / CAST(current_setting('autovacuum_freeze_max_age') AS numeric)) * 100,0) as pct, c.oid, %s as mxid_age, %d as mxid_max_age " \
+            "FROM pg_class c, pg_namespace n WHERE n.nspname = '%s' and n.oid = c.relnamespace and c.relkind not in ('i','v','S','c') AND " \
+            "(CAST(current_setting('autovacuum_freeze_max_age') AS bigint) - age(c.relfrozenxid)::bigint > %d OR %s > %d) ORDER BY %s DESC" % (mxidage, multixact_freeze_max_age, schema, threshold_freeze, mxidage, mx_threshold, closest)
+      if debug: printit("DEBUG   QUERY: %s" % sql)
+
+      try:
+           cur.execute(sql)
+      except Exception as error:
+          printit("Freeze Tables Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
+          continue
 
-  try:
-       cur.execute(sql)
-  except Exception as error:
-      printit("Freeze Tables Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit ("No FREEZEs need to be done.")
+      else:
+          printit ("VACUUM FREEZEs to be evaluated=%d.  Includes deferred ones too." % len(rows) )
 
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit ("No FREEZEs need to be done.")
-  else:
-      printit ("VACUUM FREEZEs to be evaluated=%d.  Includes deferred ones too." % len(rows) )
+      # v7.5: with --freezewindows, the candidates forecast for this window
+      planned = freeze_plan(rows)
 
-  cnt = 0
-  partcnt = 0
-  action_name = 'VAC/FREEZE'
-  if not dryrun and len(rows) > 0 and not bfreeze:
-      printit ('Bypassing VACUUM FREEZE action for %d tables. Otherwise specify "--freeze" to do them.' % len(rows))
+      cnt = 0
+      partcnt = 0
+      action_name = 'VAC/FREEZE'
+      if not dryrun and len(rows) > 0 and not bfreeze:
+          printit ('Bypassing VACUUM FREEZE action for %d tables. Otherwise specify "--freeze" to do them.' % len(rows))
 
-  for row in rows:
-      if not bfreeze and not dryrun:
-          continue
-      if active_processes > threshold_max_processes:
-          # see how many are currently running and update the active processes again
-          # rc = get_process_cnt()
-          rc = get_query_cnt(conn, cur)
-          if rc > threshold_max_processes:
-              printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-              time.sleep(300)
-          else:
-              printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-          active_processes = rc
-
-      cnt = cnt + 1
-      table    = row[0]
-      tups     = row[1]
-      xidage   = row[2]
-      maxage   = row[3]
-      howclose = row[4]
-      sizep    = row[5]
-      size     = row[6]
-      part     = row[7]
-      #pct      = int(row[8])
-      pct      = row[8]
+      for row in prioritize(rows, 'VACUUM'):
+          if not bfreeze and not dryrun:
+              continue
+          if active_processes >= threshold_max_processes:
+              # see how many are currently running and update the active processes again
+              # v6.0: wait for a job to finish instead of sleeping 5 minutes
+              active_processes = wait_for_slot(conn, cur)
+
+          cnt = cnt + 1
+          table    = row[0]
+          tups     = row[1]
+          xidage   = row[2]
+          maxage   = row[3]
+          howclose = row[4]
+          sizep    = row[5]
+          size     = row[6]
+          part     = row[7]
+          #pct      = int(row[8])
+          pct      = row[8]
+          oid      = row[9]
+          mxidage  = row[10]
+          mxmax    = row[11]
       
       
-      if total_freezes > threshold_max_tables:
-          # exit, since we are finished and notify 
-          printit ("exiting since we exceeded user-provided max tables=%d" % (threshold_max_tables))
-          break
-
-      # bypass tables that are less than 10% of max age
-      #               table                          |   rows    |  xid_age  | freeze_max_age |  howclose  | table_size_pretty |  table_size   | relispartition | pct
-      #----------------------------------------------+-----------+-----------+----------------+------------+-------------------+---------------+----------------+-----
-      #public."amazonnewprod_adtags_update"          |  64689384 | 277193255 |     1500000000 | 1222806745 | 34 GB             |   36666990592 | f              |  18
-      #public."amazonnewprod_adtags_active_metadata" | 233080384 | 276124136 |     1500000000 | 1223875864 | 97 GB             |  103821336576 | f              |  18
-
-      if xidage < freeze:
-        # bypassing table
-        tables_skipped = tables_skipped + 1
-        if _verbose: printit ("bypassing table with xidage=%d.  Threshold minimum=%d" % (xidage, freeze))
-        continue
-
-      if part and ignoreparts:
-          partcnt = partcnt + 1
-          #print ("ignoring partitioned table: %s" % table)
-          continue
+          if total_freezes > threshold_max_tables:
+              # exit, since we are finished and notify 
+              printit ("exiting since we exceeded user-provided max tables=%d" % (threshold_max_tables))
+              break
+
+          # bypass tables that are less than 10% of max age
+          #               table                          |   rows    |  xid_age  | freeze_max_age |  howclose  | table_size_pretty |  table_size   | relispartition | pct
+          #----------------------------------------------+-----------+-----------+----------------+------------+-------------------+---------------+----------------+-----
+          #public."amazonnewprod_adtags_update"          |  64689384 | 277193255 |     1500000000 | 1222806745 | 34 GB             |   36666990592 | f              |  18
+          #public."amazonnewprod_adtags_active_metadata" | 233080384 | 276124136 |     1500000000 | 1223875864 | 97 GB             |  103821336576 | f              |  18
+
+          # v7.4: the --freeze threshold applies to the multixact age at the same fraction of its max age
+          mxfreeze = freeze * mxmax // maxage
+          if planned is not None:
+            if oid not in planned:
+              # v7.5: left for a later window
+              tables_skipped = tables_skipped + 1
+              candidate('skip', action_name, table, oid, size, tups, None, reason='later_window', xid_age=xidage, mxid_age=mxidage)
+              continue
+          elif xidage < freeze and mxidage < mxfreeze:
+            # bypassing table
+            tables_skipped = tables_skipped + 1
+            if _verbose: printit ("bypassing table with xidage=%d mxidage=%d.  Threshold minimum=%d/%d" % (xidage, mxidage, freeze, mxfreeze))
+            candidate('skip', action_name, table, oid, size, tups, None, reason='below_threshold', xid_age=xidage, mxid_age=mxidage)
+            continue
+
+          # v7.4: report against the closest limit, xid or mxid
+          limit = 'xid'
+          age   = xidage
+          if float(mxidage) / mxmax > float(xidage) / maxage:
+              limit    = 'mxid'
+              age      = mxidage
+              maxage   = mxmax
+              howclose = mxmax - mxidage
+
+          if part and ignoreparts:
+              partcnt = partcnt + 1
+              #print ("ignoring partitioned table: %s" % table)
+              candidate('skip', action_name, table, oid, size, tups, None, reason='ignoreparts', xid_age=xidage, mxid_age=mxidage)
+              continue
 
-      # also bypass tables that are less than 15% of max age
-      pctmax = float(xidage) / float(maxage)
-      if _verbose: print("maxage=%10f  xidage=%10f  pctmax=%4f  freeze=%4f pct=%d" % (maxage, xidage, pctmax, freeze, pct))
+          # also bypass tables that are less than 15% of max age
+          pctmax = float(age) / float(maxage)
+          if _verbose: print("maxage=%10f  xidage=%10f  pctmax=%4f  freeze=%4f pct=%d" % (maxage, xidage, pctmax, freeze, pct))
 
-      if size > threshold_max_size:
-          # defer action
-          printit ("Async %10s  %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  xid_age: %10d  how close: %10d NOTICE: Skipping large table.  Do manually." \
-                  % (action_name, cnt, table, tups, sizep, size, maxage, xidage, howclose))
-          tables_skipped = tables_skipped + 1
-          cnt = cnt - 1
-          continue
-      elif tups > threshold_async_rows or size > threshold_max_sync:
+          # v7.2: predicted vacuum I/O for the dry run report, a freeze skips only all-frozen pages
           if dryrun:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tables_skipped = tables_skipped + 1
-                  cnt = cnt - 1
-                  continue
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  xid_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, xidage, howclose, (100 * pctmax)))
-              total_freezes = total_freezes + 1
-              tablist.append(table)
-              check_maxtables()
-              if len(tablist) > threshold_max_tables:
-                  printit ("Max Tables Reached: %d." % len(tablist))
-              active_processes = active_processes + 1
-          else:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tables_skipped = tables_skipped + 1
-                  cnt = cnt - 1
-                  continue
-              # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "VACUUM (FREEZE, VERBOSE) %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, table)
-              # V4.1 fix, escape double quotes
-              tbl= table.replace('"', '\\"')
-              tbl= tbl.replace('$', '\$')
-              cmd = 'nohup psql -d "%s" -c "VACUUM (FREEZE, VERBOSE) %s" 2>/dev/null &' % (connparms, tbl)
-              time.sleep(0.5)
-              asyncjobs = asyncjobs + 1
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  xid_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, xidage, howclose, (100 * pctmax)))
-              rc = execute_cmd(cmd)
-              total_freezes = total_freezes + 1
-              tablist.append(table)
-              check_maxtables()
-              active_processes = active_processes + 1
-      else:
-          if async_:
-              # force async regardless
-              printit ("Async  %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  xid_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, xidage, howclose, (100 * pctmax)))
-              time.sleep(0.5)
-              asyncjobs = asyncjobs + 1
-              cmd = 'nohup psql -d "%s" -c "VACUUM (FREEZE, VERBOSE) %s" 2>/dev/null &' % (connparms, table)
+              vm_note(oid, 'VACUUM FREEZE', action_name)
+
+          if size > threshold_max_size:
+              # defer action
+              printit ("Async %10s  %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  %s_age: %10d  how close: %10d NOTICE: Skipping large table.  Do manually." \
+                      % (action_name, cnt, table, tups, sizep, size, maxage, limit, age, howclose))
+              candidate('skip', action_name, table, oid, size, tups, None, reason='too_large', xid_age=xidage, mxid_age=mxidage)
+              tables_skipped = tables_skipped + 1
+              cnt = cnt - 1
+              continue
+          elif use_async(table, tups, size, 'VACUUM'):
               if dryrun:
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, None, reason='max_processes', xid_age=xidage, mxid_age=mxidage)
+                      tables_skipped = tables_skipped + 1
+                      cnt = cnt - 1
+                      continue
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  %s_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, limit, age, howclose, (100 * pctmax)))
+                  candidate('async', action_name, table, oid, size, tups, None, xid_age=xidage, mxid_age=mxidage)
                   total_freezes = total_freezes + 1
-              else:
-                  rc = execute_cmd(cmd)
-                  total_freezes = total_freezes + 1
-                  tablist.append(table)
+                  tablist.add(oid)
                   check_maxtables()
+                  if len(tablist) > threshold_max_tables:
+                      printit ("Max Tables Reached: %d." % len(tablist))
                   active_processes = active_processes + 1
-          else:
-              printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  xid_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, xidage, howclose, (100 * pctmax)))
-              if dryrun:
-                  total_freezes = total_freezes + 1
-                  tablist.append(table)
-                  check_maxtables()
               else:
-                  sql = "VACUUM (FREEZE, VERBOSE) %s" % table
-                  time.sleep(0.5)
-                  try:
-                      cur.execute(sql)
-                  except Exception as error:
-                      printit("Exception: %s *** %s" % (type(error), error))
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, None, reason='max_processes', xid_age=xidage, mxid_age=mxidage)
+                      tables_skipped = tables_skipped + 1
                       cnt = cnt - 1
                       continue
+                  # v5.7: run on the worker pool instead of a detached psql process
+                  job = VacuumJob(table, 'VACUUM', ['FREEZE', 'VERBOSE'], action_name, size, tups, oid)
+                  asyncjobs = asyncjobs + 1
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  %s_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, limit, age, howclose, (100 * pctmax)))
+                  candidate('async', action_name, table, oid, size, tups, None, xid_age=xidage, mxid_age=mxidage)
+                  if not dispatch_async(job):
+                      asyncjobs = asyncjobs - 1
+                      continue
                   total_freezes = total_freezes + 1
-                  tablist.append(table)
+                  tablist.add(oid)
                   check_maxtables()
-
-  if ignoreparts:
-      printit ("Partitioned table vacuum freezes bypassed=%d" % partcnt)
-      partitioned_tables_skipped = partitioned_tables_skipped + partcnt
-
-  printit ("Table freezes: %d  Async freezes: %d  Tables skipped: %d" % (total_freezes, asyncjobs, tables_skipped))
-
-  if inquiry:
-    rc = _inquiry(conn,cur,tablist)
-
-  conn.close()
-  printit ("End of Freeze action.  Closing the connection and exiting normally.")
-  sys.exit(0)
-
-#################################
-# 4. Autotune Only              #
-#################################
-if bautotune:
-  if _verbose: printit("VERBOSE MODE: (4) Autotune section")
-
-  '''
-  select t.schemaname || '.' || t.relname "Table", pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) "Sizep", pg_catalog.pg_relation_size(c.oid) size,t.n_live_tup live_tup, t.n_dead_tup dead_tup,
-  round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,
-  CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,
-  round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,
-  CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,
-  t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 n_ins_since_vacuum, c.relkind,
-  GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze
-  FROM pg_stat_user_tables t, pg_namespace n, pg_class c
-  WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1,2 LIMIT 20;
-         Table            |  Sizep  |    size    | live_tup | dead_tup | dead_thresh | pct_dead | analyze_thresh | pct_analyze | vac_cnt | autovac_cnt | ana_cnt | autoana_cnt | mod_since_ana | ins_since_vac | last_vacuum | last_autovacuum
-  --------------------- --+---------+------------+----------+----------+-------------+----------+----------------+-------------+---------+-------------+---------+-------------+---------------+---------------+-------------+-----------------
-  public.pgbench_accounts | 1292 MB | 1354416128 | 10000035 |   111274 |      200051 |  0.01113 |         100050 |     0.01185 |       1 |           0 |       1 |           0 |        118462 |             0 | 2022-12-18  |
-  public.pgbench_branches | 16 kB   |      16384 |      100 |      230 |          52 |  2.30000 |             51 |   299.36000 |       3 |           6 |       1 |           6 |         29936 |             0 | 2022-12-18  | 2022-12-18
-  public.pgbench_history  | 4632 kB |    4743168 |    89979 |        0 |        1850 |  0.00000 |            950 |     0.33270 |       1 |           6 |       1 |           6 |         29936 |         29936 | 2022-12-18  | 2022-12-18
-  public.pgbench_tellers  | 240 kB  |     245760 |     1000 |      715 |          70 |  0.71500 |             60 |    29.93600 |       3 |           6 |       1 |           6 |         29936 |             0 | 2022-12-18  | 2022-12-18
-  '''
-  if pgversion < 130000:
-    # earlier versions do not have n_ins_since_vacuum column
-    if schema == "":
-      sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
-            "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
-            "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
-            "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 ins_since_vac, c.relkind, " \
-            "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze  " \
-            "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
-            "WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "
-    else:
-      sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
-            "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
-            "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
-            "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 ins_since_vac, c.relkind, " \
-            "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze  " \
-            "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
-            "WHERE n.nspname = '%s' AND n.nspname = t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "  % (schema)
-  else:
-    if schema == "":
-      sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
-            "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
-            "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
-            "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, t.n_ins_since_vacuum  ins_since_vac, c.relkind, " \
-            "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze  " \
-            "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
-            "WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "
-    else:
-      sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
-            "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
-            "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
-            "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
-            "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, t.n_ins_since_vacuum  ins_since_vac, c.relkind, " \
-            "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze  " \
-            "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
-            "WHERE n.nspname = '%s' AND n.nspname = t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "  % (schema)
-  try:
-       cur.execute(sql)
-  except Exception as error:
-      printit("Autotune Tables Exception: %s *** %s" % (type(error), error))
-      conn.close()
-      sys.exit (1)
-
-  rows = cur.fetchall()
-  if len(rows) == 0:
-      printit ("AUTOTUNE: no threshold candidates to evaluate for vacuums/analyzes.")
-  else:
-      printit ("AUTOTUNE tables to be evaluated=%d.  Includes deferred ones too." % len(rows) )
-
-  cnt = 0
-  partcnt = 0
-  for row in rows:
-      if active_processes > threshold_max_processes:
-          # see how many are currently running and update the active processes again
-          # rc = get_process_cnt()
-          rc = get_query_cnt(conn, cur)
-          if rc > threshold_max_processes:
-              printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-              time.sleep(300)
+                  active_processes = active_processes + 1
           else:
-              printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-          active_processes = rc
-
-      cnt = cnt + 1
-      table         = row[0]
-      sizep         = row[1]
-      size          = row[2]
-      tups          = row[3]
-      deadtups      = row[4]
-      deadthresh    = row[5]
-      pct_dead      = float(row[6])
-      analthresh    = row[7]
-      pct_anal      = float(row[8])
-      vac_cnt       = row[9]
-      autovac_cnt   = row[10]
-      ana_cnt       = row[11]
-      autoana_cnt   = row[12]
-      mod_since_ana = row[13]
-      ins_since_vac = row[14]
-      relkind       = row[15]
-      last_vacuum   = row[16]
-      last_analyze  = row[17]
-
-      #print (row)
-      sql2 = ''
-      if autotune <= pct_dead and autotune <= pct_anal:
-        sql2 = 'VACUUM ANALYZE'
-        action_name = 'VAC/ANALYZ'
-      elif autotune <= pct_dead:
-        sql2 = 'VACUUM'
-        action_name = 'VACUUM'
-      elif autotune <= pct_anal:
-        sql2 = 'ANALYZE'
-        action_name = 'ANALYZE'
-      if sql2 == '':
-        # nothing to do
-        cnt = cnt - 1
-        continue
-
-      #if _verbose: printit('tbl=%s  sql=%s' % (table,sql2))
-
-      if relkind == 'p' and ignoreparts:
-          partcnt = partcnt + 1
-          cnt = cnt - 1
-          #print ("ignoring partitioned table: %s" % table)
+              if async_:
+                  # force async regardless
+                  printit ("Async  %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  %s_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, limit, age, howclose, (100 * pctmax)))
+                  candidate('async', action_name, table, oid, size, tups, None, xid_age=xidage, mxid_age=mxidage)
+                  asyncjobs = asyncjobs + 1
+                  job = VacuumJob(table, 'VACUUM', ['FREEZE', 'VERBOSE'], action_name, size, tups, oid)
+                  if dryrun:
+                      total_freezes = total_freezes + 1
+                  else:
+                      if not dispatch_async(job):
+                          asyncjobs = asyncjobs - 1
+                          continue
+                      total_freezes = total_freezes + 1
+                      tablist.add(oid)
+                      check_maxtables()
+                      active_processes = active_processes + 1
+              else:
+                  printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d freeze_max: %10d  %s_age: %10d  how close: %10d  pct: %d" % (action_name, cnt, table, tups, sizep, size, maxage, limit, age, howclose, (100 * pctmax)))
+                  candidate('sync', action_name, table, oid, size, tups, None, xid_age=xidage, mxid_age=mxidage)
+                  if dryrun:
+                      total_freezes = total_freezes + 1
+                      tablist.add(oid)
+                      check_maxtables()
+                  else:
+                      # v5.8: main cursor or --jobs worker connections
+                      job = VacuumJob(table, 'VACUUM', ['FREEZE', 'VERBOSE'], action_name, size, tups, oid)
+                      if not run_sync(job):
+                          cnt = cnt - 1
+                          continue
+                      total_freezes = total_freezes + 1
+                      tablist.add(oid)
+                      check_maxtables()
+
+      if ignoreparts:
+          printit ("Partitioned table vacuum freezes bypassed=%d" % partcnt)
+          partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+
+      printit ("Table freezes: %d  Async freezes: %d  Tables skipped: %d" % (total_freezes, asyncjobs, tables_skipped))
+
+      continue
+
+    #################################
+    # 4. Autotune Only              #
+    #################################
+    if bautotune:
+      profile_phase('4 autotune')
+      if _verbose: printit("VERBOSE MODE: (4) Autotune section")
+
+      '''
+      select t.schemaname || '.' || t.relname "Table", pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) "Sizep", pg_catalog.pg_relation_size(c.oid) size,t.n_live_tup live_tup, t.n_dead_tup dead_tup,
+      round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,
+      CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,
+      round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,
+      CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,
+      t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 n_ins_since_vacuum, c.relkind,
+      GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze
+      FROM pg_stat_user_tables t, pg_namespace n, pg_class c
+      WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1,2 LIMIT 20;
+             Table            |  Sizep  |    size    | live_tup | dead_tup | dead_thresh | pct_dead | analyze_thresh | pct_analyze | vac_cnt | autovac_cnt | ana_cnt | autoana_cnt | mod_since_ana | ins_since_vac | last_vacuum | last_autovacuum
+      --------------------- --+---------+------------+----------+----------+-------------+----------+----------------+-------------+---------+-------------+---------+-------------+---------------+---------------+-------------+-----------------
+      public.pgbench_accounts | 1292 MB | 1354416128 | 10000035 |   111274 |      200051 |  0.01113 |         100050 |     0.01185 |       1 |           0 |       1 |           0 |        118462 |             0 | 2022-12-18  |
+      public.pgbench_branches | 16 kB   |      16384 |      100 |      230 |          52 |  2.30000 |             51 |   299.36000 |       3 |           6 |       1 |           6 |         29936 |             0 | 2022-12-18  | 2022-12-18
+      public.pgbench_history  | 4632 kB |    4743168 |    89979 |        0 |        1850 |  0.00000 |            950 |     0.33270 |       1 |           6 |       1 |           6 |         29936 |         29936 | 2022-12-18  | 2022-12-18
+      public.pgbench_tellers  | 240 kB  |     245760 |     1000 |      715 |          70 |  0.71500 |             60 |    29.93600 |       3 |           6 |       1 |           6 |         29936 |             0 | 2022-12-18  | 2022-12-18
+      '''
+      if pgversion < 130000:
+        # earlier versions do not have n_ins_since_vacuum column
+        if schema == "":
+          sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
+                "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
+                "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
+                "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 ins_since_vac, c.relkind, " \
+                "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze, c.oid  " \
+                "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
+                "WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "
+        else:
+          sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
+                "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
+                "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
+                "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, -1 ins_since_vac, c.relkind, " \
+                "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze, c.oid  " \
+                "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
+                "WHERE n.nspname = '%s' AND n.nspname = t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "  % (schema)
+      else:
+        if schema == "":
+          sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
+                "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
+                "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
+                "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, t.n_ins_since_vacuum  ins_since_vac, c.relkind, " \
+                "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze, c.oid  " \
+                "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
+                "WHERE n.nspname =  t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "
+        else:
+          sql = "SELECT t.schemaname || '.\"' || t.relname || '\"' as atable, pg_catalog.pg_size_pretty(pg_catalog.pg_relation_size(c.oid)) Sizep, pg_catalog.pg_relation_size(c.oid) Size, t.n_live_tup live_tup, t.n_dead_tup dead_tup, " \
+                "round((n_live_tup * current_setting('autovacuum_vacuum_scale_factor')::float8 ) + current_setting('autovacuum_vacuum_threshold')::float8) dead_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_dead_tup = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_dead_tup > 0 THEN 100.00 ELSE round((t.n_dead_tup::numeric / t.n_live_tup::numeric),5) END pct_dead,  " \
+                "round((n_live_tup * current_setting('autovacuum_analyze_scale_factor')::float8 ) + current_setting('autovacuum_analyze_threshold')::float8) analyze_thresh,  " \
+                "CASE WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze = 0 THEN 0.00 WHEN t.n_live_tup = 0 AND t.n_mod_since_analyze > 0 THEN 100.00 ELSE round((t.n_mod_since_analyze::numeric / t.n_live_tup::numeric),5) END pct_analyze,  " \
+                "t.vacuum_count vac_cnt, t.autovacuum_count autovac_cnt, t.analyze_count ana_cnt, t.autoanalyze_count autoana_cnt, t.n_mod_since_analyze mod_since_ana, t.n_ins_since_vacuum  ins_since_vac, c.relkind, " \
+                "GREATEST(t.last_vacuum, t.last_autovacuum)::date as last_vacuum,  GREATEST(t.last_analyze,t.last_autoanalyze)::date as last_analyze, c.oid  " \
+                "FROM pg_stat_user_tables t, pg_namespace n, pg_class c  " \
+                "WHERE n.nspname = '%s' AND n.nspname = t.schemaname AND n.oid = c.relnamespace AND t.relname = c.relname AND (t.n_dead_tup > 0 OR t.n_mod_since_analyze > 0) ORDER BY 1, 2 "  % (schema)
+      try:
+           cur.execute(sql)
+      except Exception as error:
+          printit("Autotune Tables Exception: %s *** %s" % (type(error), error))
+          failed_databases.append(dbname)
           continue
 
-      if size > threshold_max_size:
-        # defer action
-        printit ("Async %10s  %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d  NOTICE: Skipping large table.  Do manually." \
-                % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
-        tables_skipped = tables_skipped + 1
-        cnt = cnt - 1
-        continue
-      elif tups > threshold_async_rows or size > threshold_max_sync:
-          if dryrun:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tables_skipped = tables_skipped + 1
-                  cnt = cnt - 1
-                  continue
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
-              tablist.append(table)
-              check_maxtables()
-              if len(tablist) > threshold_max_tables:
-                  printit ("Max Tables Reached: %d." % len(tablist))
-              active_processes = active_processes + 1
-          else:
-              if active_processes > threshold_max_processes:
-                  printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                  tables_skipped = tables_skipped + 1
-                  cnt = cnt - 1
-                  continue
-              tbl= table.replace('"', '\\"')
-              tbl= tbl.replace('$', '\$')
-              cmd = 'nohup psql -d "%s" -c "%s %s" 2>/dev/null &' % (connparms, sql2, tbl)
-              time.sleep(0.5)
-              asyncjobs = asyncjobs + 1
-              printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
-              rc = execute_cmd(cmd)
-              tablist.append(table)
-              check_maxtables()
-              active_processes = active_processes + 1
+      rows = cur.fetchall()
+      if len(rows) == 0:
+          printit ("AUTOTUNE: no threshold candidates to evaluate for vacuums/analyzes.")
       else:
-          if dryrun:
-              tablist.append(table)
-              printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
-          else:
-              printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
-              sql = "%s %s" % (sql2, table)
-              time.sleep(0.5)
-          try:
-              cur.execute(sql)
-          except Exception as error:
-              printit("Exception: %s *** %s" % (type(error), error))
+          printit ("AUTOTUNE tables to be evaluated=%d.  Includes deferred ones too." % len(rows) )
+
+      cnt = 0
+      partcnt = 0
+      for row in prioritize(rows, 'VACUUM ANALYZE'):
+          if active_processes >= threshold_max_processes:
+              # see how many are currently running and update the active processes again
+              # v6.0: wait for a job to finish instead of sleeping 5 minutes
+              active_processes = wait_for_slot(conn, cur)
+
+          cnt = cnt + 1
+          table         = row[0]
+          sizep         = row[1]
+          size          = row[2]
+          tups          = row[3]
+          deadtups      = row[4]
+          deadthresh    = row[5]
+          pct_dead      = float(row[6])
+          analthresh    = row[7]
+          pct_anal      = float(row[8])
+          vac_cnt       = row[9]
+          autovac_cnt   = row[10]
+          ana_cnt       = row[11]
+          autoana_cnt   = row[12]
+          mod_since_ana = row[13]
+          ins_since_vac = row[14]
+          relkind       = row[15]
+          last_vacuum   = row[16]
+          last_analyze  = row[17]
+          oid           = row[18]
+
+          #print (row)
+          sql2 = ''
+          if autotune <= pct_dead and autotune <= pct_anal:
+            sql2 = 'VACUUM ANALYZE'
+            action_name = 'VAC/ANALYZ'
+          elif autotune <= pct_dead:
+            sql2 = 'VACUUM'
+            action_name = 'VACUUM'
+          elif autotune <= pct_anal:
+            sql2 = 'ANALYZE'
+            action_name = 'ANALYZE'
+          if sql2 == '':
+            # nothing to do
+            cnt = cnt - 1
+            continue
+
+          #if _verbose: printit('tbl=%s  sql=%s' % (table,sql2))
+
+          if relkind == 'p' and ignoreparts:
+              partcnt = partcnt + 1
               cnt = cnt - 1
+              #print ("ignoring partitioned table: %s" % table)
+              candidate('skip', action_name, table, oid, size, tups, deadtups, reason='ignoreparts')
               continue
-          tablist.append(table)
-          check_maxtables()
-
-  if ignoreparts:
-      printit ("Partitioned tables bypassed=%d" % partcnt)
-      partitioned_tables_skipped = partitioned_tables_skipped + partcnt
-
-  printit ("Tables vacuumed/analyzed: %d" % cnt)
-
-  if inquiry:
-    rc = _inquiry(conn,cur,tablist)
-
-  conn.close()
-  printit ("End of Autotune action.  Closing the connection and exiting normally.")
-  sys.exit(0)
-
-
-#################################
-# 5. Vacuum and Analyze query
-#################################
-
-if _verbose: printit("VERBOSE MODE: (5) Vacuum/Analyze section")
-
-# V2.3: Fixed query date problem
-#V 2.4 Fix, needed to add logic to check for null timestamps!
-'''
--- all >10+
-SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
-pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
-u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze,
-c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
-to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,
-CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END
-FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p')
-AND (u.n_dead_tup >= -1 AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > -1 AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > -1
-OR (-1 = -1 AND -1 = -1 AND -1 = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL))
-ORDER BY 1;
--- all < 10
-SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
-pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
-u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint AS since_analyzed, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
-to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,
-CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END, now()::date - GREATEST(last_analyze, last_autoanalyze)::date
-FROM pg_namespace n, pg_class c, pg_stat_user_tables u where n.oid = c.relnamespace AND c.relkind in ('r','m','p') AND c.relname = u.relname and n.nspname = u.schemaname
-AND (u.n_dead_tup >= -1 AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > -1 AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > -1
-OR (-1 = -1 AND -1 = -1 AND -1 = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL))
-ORDER BY 1;
-
-'''
-# V4.3 fix: relation size < instead of > maxsize!
-# V5.0 fix: New logic regarding vacuuming/analyzing. We don't consider null vacuum/analyze timestamps anymore
-if pgversion > 100000:
-    if schema == "":
-      sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-      "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-      "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END " \
-      "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid AND u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p') " \
-      "AND (u.n_dead_tup >= %d AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d " \
-      "OR (%d = -1 AND %d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY 1" % (threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum)
-    else:
-      sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-      "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-      "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END " \
-      "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p') " \
-      "AND (u.n_dead_tup >= %d AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d " \
-      "OR (%d = -1 AND %d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY 1" % (schema, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum)
-else:
-# put version 9.x compatible query here
-#CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
-    if schema == "":
-      sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-      "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-      "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END " \
-      "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid AND u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p') " \
-      "AND (u.n_dead_tup >= %d AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d " \
-      "OR (%d = -1 AND %d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY 1" % (threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum)
-    else:
-      sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,  " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,  " \
-      "u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,  " \
-      "to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END " \
-      "FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname = '%s' and u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p') " \
-      "AND (u.n_dead_tup >= %d AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d " \
-      "OR (%d = -1 AND %d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY 1" % (schema, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_analyze, threshold_max_days_vacuum)
-
-try:
-     cur.execute(sql)
-except Exception as error:
-    printit("Exception: %s *** %s" % (type(error), error))
-    conn.close()
-    sys.exit (1)
-
-rows = cur.fetchall()
-if len(rows) == 0:
-    printit ("No vacuum/analyze pairs to be done.")
-else:
-    printit ("vacuums/analyzes to be evaluated=%d.  Asterisk (*) indicates no vacuums/analyzes for table exists." % len(rows) )
 
-cnt = 0
-partcnt = 0
-action_name = 'VAC/ANALYZ'
-for row in rows:
-    if active_processes > threshold_max_processes:
-        # see how many are currently running and update the active processes again
-        # rc = get_process_cnt()
-        rc = get_query_cnt(conn, cur)
-        if rc > threshold_max_processes:
-            printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-            time.sleep(300)
-        else:
-            printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-        active_processes = rc
+          # v8.1: no vacuum where the visibility map says all pages are all-visible, a due analyze still runs
+          if sql2 != 'ANALYZE' and vm_skip(oid, action_name):
+              if sql2 == 'VACUUM':
+                  cnt = cnt - 1
+                  continue
+              sql2 = 'ANALYZE'
+              action_name = 'ANALYZE'
+              vm_predicted.pop(oid, None)
+
+          if size > threshold_max_size:
+            # defer action
+            printit ("Async %10s  %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d  NOTICE: Skipping large table.  Do manually." \
+                    % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
+            candidate('skip', action_name, table, oid, size, tups, deadtups, reason='too_large')
+            tables_skipped = tables_skipped + 1
+            cnt = cnt - 1
+            continue
+          elif use_async(table, tups, size, 'VACUUM ANALYZE'):
+              if dryrun:
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, deadtups, reason='max_processes')
+                      tables_skipped = tables_skipped + 1
+                      cnt = cnt - 1
+                      continue
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
+                  candidate('async', action_name, table, oid, size, tups, deadtups)
+                  tablist.add(oid)
+                  check_maxtables()
+                  if len(tablist) > threshold_max_tables:
+                      printit ("Max Tables Reached: %d." % len(tablist))
+                  active_processes = active_processes + 1
+              else:
+                  if active_processes >= threshold_max_processes:
+                      printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                      candidate('skip', action_name, table, oid, size, tups, deadtups, reason='max_processes')
+                      tables_skipped = tables_skipped + 1
+                      cnt = cnt - 1
+                      continue
+                  # v5.7: run on the worker pool instead of a detached psql process
+                  if sql2 == 'VACUUM ANALYZE':
+                      job = VacuumJob(table, 'VACUUM', ['ANALYZE'], action_name, size, tups, oid)
+                  else:
+                      job = VacuumJob(table, sql2, [], action_name, size, tups, oid)
+                  asyncjobs = asyncjobs + 1
+                  printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
+                  candidate('async', action_name, table, oid, size, tups, deadtups)
+                  if not dispatch_async(job):
+                      asyncjobs = asyncjobs - 1
+                      continue
+                  tablist.add(oid)
+                  check_maxtables()
+                  active_processes = active_processes + 1
+          else:
+              if dryrun:
+                  printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
+                  candidate('sync', action_name, table, oid, size, tups, deadtups)
+              else:
+                  printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %10d analyzed: %10d" % (action_name, cnt, table, tups, sizep, size, deadtups, mod_since_ana))
+                  candidate('sync', action_name, table, oid, size, tups, deadtups)
+                  # v5.8: main cursor or --jobs worker connections.  Also fixed dryrun re-executing the catalog query for every table.
+                  if sql2 == 'VACUUM ANALYZE':
+                      job = VacuumJob(table, 'VACUUM', ['ANALYZE'], action_name, size, tups, oid)
+                  else:
+                      job = VacuumJob(table, sql2, [], action_name, size, tups, oid)
+                  if not run_sync(job):
+                      cnt = cnt - 1
+                      continue
+              tablist.add(oid)
+              check_maxtables()
 
-    cnt = cnt + 1
-    table    = row[0]
-    sizep    = row[1]
-    size     = row[2]
-    tups     = row[3]
-    live     = row[4]
-    dead     = row[5]
-    analyzed = row[6]
-    part     = row[7]
-    vacs     = row[12]
-
-    if vacs == 'NOVACS':
-       ASYNC= '*Async'
-       SYNC = '*Sync'
+      if ignoreparts:
+          printit ("Partitioned tables bypassed=%d" % partcnt)
+          partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+
+      printit ("Tables vacuumed/analyzed: %d" % cnt)
+
+      continue
+
+
+    #################################
+    # 5. Vacuum and Analyze query
+    #################################
+
+    if _verbose: printit("VERBOSE MODE: (5) Vacuum/Analyze section")
+
+    # V2.3: Fixed query date problem
+    #V 2.4 Fix, needed to add logic to check for null timestamps!
+    '''
+    -- all >10+
+    SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
+    pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
+    u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze,
+    c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
+    to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,
+    CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END
+    FROM pg_namespace n, pg_class c, pg_stat_user_tables u where c.relnamespace = n.oid and u.schemaname = n.nspname and u.relname = c.relname AND c.relkind in ('r','m','p')
+    AND (u.n_dead_tup >= -1 AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > -1 AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > -1
+    OR (-1 = -1 AND -1 = -1 AND -1 = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL))
+    ORDER BY 1;
+    -- all < 10
+    SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
+    pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup,
+    u.n_dead_tup::bigint AS dead_tup, u.n_mod_since_analyze::bigint AS since_analyzed, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum,
+    to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze,
+    CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END, now()::date - GREATEST(last_analyze, last_autoanalyze)::date
+    FROM pg_namespace n, pg_class c, pg_stat_user_tables u where n.oid = c.relnamespace AND c.relkind in ('r','m','p') AND c.relname = u.relname and n.nspname = u.schemaname
+    AND (u.n_dead_tup >= -1 AND now()::date - GREATEST(last_analyze, last_autoanalyze)::date > -1 AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > -1
+    OR (-1 = -1 AND -1 = -1 AND -1 = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL))
+    ORDER BY 1;
+
+    '''
+    # V4.3 fix: relation size < instead of > maxsize!
+    # V5.0 fix: New logic regarding vacuuming/analyzing. We don't consider null vacuum/analyze timestamps anymore
+    # v6.1: take the catalog snapshot shared by the remaining sections, then filter it for this one
+    profile_phase('catalog snapshot')
+    snapshot = load_snapshot(conn, cur)
+    profile_phase('5 vacuum/analyze')
+    rows = snapshot_vacuum_analyze()
+    if len(rows) == 0:
+        printit ("No vacuum/analyze pairs to be done.")
     else:
-       ASYNC= ' Async'
-       SYNC = ' Sync'
-
-    if part and ignoreparts:
-        partcnt = partcnt + 1
-        #print ("ignoring partitioned table: %s" % table)
-        continue
+        printit ("vacuums/analyzes to be evaluated=%d.  Asterisk (*) indicates no vacuums/analyzes for table exists." % len(rows) )
 
-    # check if we already processed this table
-    if skip_table(table, tablist):
-        continue
+    cnt = 0
+    partcnt = 0
+    action_name = 'VAC/ANALYZ'
+    # v6.3: most valuable first with --priority
+    for row in prioritize(rows, 'VACUUM ANALYZE'):
+        if active_processes >= threshold_max_processes:
+            # see how many are currently running and update the active processes again
+            # v6.0: wait for a job to finish instead of sleeping 5 minutes
+            active_processes = wait_for_slot(conn, cur)
 
-    if size > threshold_max_size:
-        # defer action
-        if dryrun:
-            printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d NOTICE: Skipping large table.  Do manually." % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            tablist.append(table)
-            check_maxtables()
-            tables_skipped = tables_skipped + 1
-        continue
-    elif tups > threshold_async_rows or size > threshold_max_sync:
-    #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
-        if dryrun:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                tables_skipped = tables_skipped + 1
-                tablist.append(table)
-                check_maxtables()
-                continue
-            printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            total_vacuums_analyzes = total_vacuums_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
-            active_processes = active_processes + 1
+        cnt = cnt + 1
+        table    = row[0]
+        sizep    = row[1]
+        size     = row[2]
+        tups     = row[3]
+        live     = row[4]
+        dead     = row[5]
+        analyzed = row[6]
+        part     = row[7]
+        vacs     = row[12]
+        oid      = row[13]
+
+        if vacs == 'NOVACS':
+           ASYNC= '*Async'
+           SYNC = '*Sync'
         else:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                tablist.append(table)
+           ASYNC= ' Async'
+           SYNC = ' Sync'
+
+        if part and ignoreparts:
+            partcnt = partcnt + 1
+            #print ("ignoring partitioned table: %s" % table)
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='ignoreparts')
+            continue
+
+        # check if we already processed this table
+        if skip_table(oid, tablist):
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='already_listed')
+            continue
+
+        # v8.1: nothing to do where the visibility map says all pages are all-visible, section 7 still analyzes them when due
+        if vm_skip(oid, action_name):
+            continue
+
+        # v7.3: skip pairs that would reclaim too little, section 7 still analyzes them when due
+        if bloat_skip(oid, action_name):
+            continue
+
+        # v7.6: and cold partitions
+        if partition_skip(oid, action_name):
+            continue
+
+        if size > threshold_max_size:
+            # defer action
+            if dryrun:
+                printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d NOTICE: Skipping large table.  Do manually." % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
+                tablist.add(oid)
                 check_maxtables()
                 tables_skipped = tables_skipped + 1
-                continue
-            printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            asyncjobs = asyncjobs + 1
-
-            # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "VACUUM (ANALYZE, VERBOSE, %s) %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, parallelstatement, table)
-            # V4.1 fix, escape double quotes
-            tbl= table.replace('"', '\\"')
-            tbl= tbl.replace('$', '\$')
-            if parallelstatement == '':
-              cmd = 'nohup psql -d "%s" -c "VACUUM (ANALYZE, VERBOSE) %s" 2>/dev/null &' % (connparms, tbl)
+            continue
+        elif use_async(table, tups, size, 'VACUUM ANALYZE'):
+        #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
+            if dryrun:
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    tablist.add(oid)
+                    check_maxtables()
+                    continue
+                printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                total_vacuums_analyzes = total_vacuums_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
+                active_processes = active_processes + 1
             else:
-              cmd = 'nohup psql -d "%s" -c "VACUUM (ANALYZE, VERBOSE, %s) %s" 2>/dev/null &' % (connparms, parallelstatement, tbl)
-            time.sleep(0.5)
-            rc = execute_cmd(cmd)
-            print("rc=%d" % rc)
-            total_vacuums_analyzes = total_vacuums_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
-            active_processes = active_processes + 1
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tablist.add(oid)
+                    check_maxtables()
+                    tables_skipped = tables_skipped + 1
+                    continue
+                printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (ASYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                asyncjobs = asyncjobs + 1
+
+                # v5.7: run on the worker pool instead of a detached psql process
+                job = VacuumJob(table, 'VACUUM', ['ANALYZE', 'VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not dispatch_async(job):
+                    asyncjobs = asyncjobs - 1
+                    continue
+                total_vacuums_analyzes = total_vacuums_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
+                active_processes = active_processes + 1
 
-    else:
-        if dryrun:
-            printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            total_vacuums_analyzes = total_vacuums_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
         else:
-            printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            if parallelstatement == '':
-              sql = "VACUUM (ANALYZE, VERBOSE) %s" % (table)
+            if dryrun:
+                printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                total_vacuums_analyzes = total_vacuums_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
             else:
-              sql = "VACUUM (ANALYZE, VERBOSE, %s) %s" % (parallelstatement, table)
-            time.sleep(0.5)
-            try:
-                cur.execute(sql)
-            except Exception as error:
-                printit("Exception: %s *** %s" % (type(error), error))
-                continue
-            total_vacuums_analyzes = total_vacuums_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
+                printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                # v5.8: main cursor or --jobs worker connections
+                job = VacuumJob(table, 'VACUUM', ['ANALYZE', 'VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not run_sync(job):
+                    continue
+                total_vacuums_analyzes = total_vacuums_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
 
-if ignoreparts:
-    printit ("Partitioned table vacuum/analyzes bypassed=%d" % partcnt)
-    partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+    if ignoreparts:
+        printit ("Partitioned table vacuum/analyzes bypassed=%d" % partcnt)
+        partitioned_tables_skipped = partitioned_tables_skipped + partcnt
 
-printit ("Tables vacuumed/analyzed: %d" % cnt)
+    printit ("Tables vacuumed/analyzed: %d" % cnt)
 
 
-#################################
-# 6. Vacuum determination query #
-#################################
-'''
--- all
+    #################################
+    # 6. Vacuum determination query #
+    #################################
+    '''
+    -- all
 
-'''
-# v4.0 fix: >= dead tups not just > dead tups
-# v4.0 fix: also add max days for vacuum to where condition
-# V4.3 fix: also add max relation size to the filter
-# V4.7 fix: Use ORing condition for max days and dead tuples not ANDing
-# V5.0 fix: New logic regarding vacuuming/analyzing. We don't consider null vacuum/analyze timestamps anymore
-if _verbose: printit("VERBOSE MODE: (6) Vacuum query section")
-
-if orderbydate:
-    ORDERBY="GREATEST(last_vacuum, last_autovacuum) asc"
-else:
-    ORDERBY="1 asc"
-
-if pgversion > 100000:
-    if schema == "":
-       sql = "SELECT psut.schemaname || '.\"' || psut.relname || '\"' as table, to_char(psut.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(psut.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, " \
-      "c.reltuples::bigint AS n_tup,  psut.n_dead_tup::bigint AS dead_tup, pg_size_pretty(pg_total_relation_size(quote_ident(psut.schemaname) || '.' || quote_ident(psut.relname))::bigint), " \
-      "pg_total_relation_size(quote_ident(psut.schemaname) || '.' ||quote_ident(psut.relname)) as size, c.relispartition, to_char(CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples), '9G999G999G999') AS av_threshold, CASE WHEN CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples) < psut.n_dead_tup THEN '*' ELSE '' END AS expect_av,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END " \
-      "FROM pg_stat_user_tables psut JOIN pg_class c on psut.relid = c.oid  where psut.schemaname not in ('pg_catalog', 'pg_toast', 'information_schema') AND c.relkind in ('r','m','p') " \
-      "AND (now()::date - GREATEST(last_vacuum, last_autovacuum)::date >= %d AND psut.n_dead_tup >= %d " \
-      "OR (%d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY %s;" % (threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups, ORDERBY)
-      ####"ORDER BY 1 asc;" % (threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups)
-    else:
-       sql = "SELECT psut.schemaname || '.\"' || psut.relname || '\"' as table, to_char(psut.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(psut.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, " \
-      "c.reltuples::bigint AS n_tup,  psut.n_dead_tup::bigint AS dead_tup, pg_size_pretty(pg_total_relation_size(quote_ident(psut.schemaname) || '.' || quote_ident(psut.relname))::bigint), " \
-      "pg_total_relation_size(quote_ident(psut.schemaname) || '.' ||quote_ident(psut.relname)) as size, c.relispartition, to_char(CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples), '9G999G999G999') AS av_threshold, CASE WHEN CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * c.reltuples) < psut.n_dead_tup THEN '*' ELSE '' END AS expect_av, " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END as vacs " \
-      "FROM pg_stat_user_tables psut JOIN pg_class c on psut.relid = c.oid  where psut.schemaname = '%s' AND c.relkind in ('r','m','p') " \
-      "AND (now()::date - GREATEST(last_vacuum, last_autovacuum)::date >= %d AND psut.n_dead_tup >= %d " \
-      "OR (%d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY %s;" % (schema, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups, ORDERBY)
-      ####"ORDER BY 1 asc;" % (schema, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups)
-else:
-    # put version 9.x compatible query here
-    # CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
-    if schema == "":
-       sql = "SELECT psut.schemaname || '.\"' || psut.relname || '\"' as table, to_char(psut.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(psut.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, " \
-      "pg_class.reltuples::bigint AS n_tup,  psut.n_dead_tup::bigint AS dead_tup, pg_size_pretty(pg_total_relation_size(quote_ident(psut.schemaname) || '.' || quote_ident(psut.relname))::bigint), " \
-      "pg_total_relation_size(quote_ident(psut.schemaname) || '.' ||quote_ident(psut.relname)) as size, " \
-      "CASE WHEN (SELECT pg_class.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=pg_class.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-      "to_char(CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * pg_class.reltuples), '9G999G999G999') AS av_threshold, CASE WHEN CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * pg_class.reltuples) < psut.n_dead_tup THEN '*' ELSE '' END AS expect_av, " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END as vacs " \
-      "FROM pg_stat_user_tables psut JOIN pg_class on psut.relid = pg_class.oid  where psut.schemaname not in ('pg_catalog', 'pg_toast', 'information_schema') AND c.relkind in ('r','m','p') " \
-      "AND (now()::date - GREATEST(last_vacuum, last_autovacuum)::date >= %d AND psut.n_dead_tup >= %d " \
-      "OR (%d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY %s;" % (threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups, ORDERBY)
-      ####"ORDER BY 1 asc;" % (threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups)
-    else:
-       sql = "SELECT psut.schemaname || '.\"' || psut.relname || '\"' as table, to_char(psut.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(psut.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, " \
-      "pg_class.reltuples::bigint AS n_tup,  psut.n_dead_tup::bigint AS dead_tup, pg_size_pretty(pg_total_relation_size(quote_ident(psut.schemaname) || '.' || quote_ident(psut.relname))::bigint) pretty, " \
-      "pg_total_relation_size(quote_ident(psut.schemaname) || '.' ||quote_ident(psut.relname)) as size, " \
-      "CASE WHEN (SELECT pg_class.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=pg_class.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-      "to_char(CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * pg_class.reltuples), '9G999G999G999') AS av_threshold, CASE WHEN CAST(current_setting('autovacuum_vacuum_threshold') AS bigint) + " \
-      "(CAST(current_setting('autovacuum_vacuum_scale_factor') AS numeric) * pg_class.reltuples) < psut.n_dead_tup THEN '*' ELSE '' END AS expect_av,  " \
-      "CASE WHEN last_vacuum is null and last_autovacuum is null THEN 'NOVACS' ELSE 'VACS' END as vacs " \
-      "FROM pg_stat_user_tables psut JOIN pg_class on psut.relid = pg_class.oid  where psut.schemaname = '%s' AND c.relkind in ('r','m','p') " \
-      "AND (now()::date - GREATEST(last_vacuum, last_autovacuum)::date >= %d AND psut.n_dead_tup >= %d " \
-      "OR (%d = -1 AND %d = -1 AND last_vacuum IS NULL AND last_autovacuum IS NULL AND last_analyze IS NULL AND last_autoanalyze IS NULL)) " \
-      "ORDER BY %s;" % (schema, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups, ORDERBY)
-      ####"ORDER BY 1 asc;" % (schema, threshold_max_days_vacuum, threshold_dead_tups, threshold_max_days_vacuum, threshold_dead_tups)
-try:
-     cur.execute(sql)
-except Exception as error:
-    printit("Exception: %s *** %s" % (type(error), error))
-    conn.close()
-    sys.exit (1)
-
-rows = cur.fetchall()
-if len(rows) == 0:
-    printit ("No vacuums to be done.")
-else:
-    printit ("vacuums to be evaluated=%d.  Asterisk (*) indicates no vacuums for table exists." % len(rows) )
-
-cnt = 0
-partcnt = 0
-action_name = 'VACUUM'
-for row in rows:
-    if active_processes > threshold_max_processes:
-        # see how many are currently running and update the active processes again
-        # rc = get_process_cnt()
-        rc = get_query_cnt(conn, cur)
-        if rc > threshold_max_processes:
-            printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-            time.sleep(300)
-        else:
-            printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-        active_processes = rc
+    '''
+    # v4.0 fix: >= dead tups not just > dead tups
+    # v4.0 fix: also add max days for vacuum to where condition
+    # V4.3 fix: also add max relation size to the filter
+    # V4.7 fix: Use ORing condition for max days and dead tuples not ANDing
+    # V5.0 fix: New logic regarding vacuuming/analyzing. We don't consider null vacuum/analyze timestamps anymore
+    profile_phase('6 vacuum')
+    if _verbose: printit("VERBOSE MODE: (6) Vacuum query section")
 
-    cnt = cnt + 1
-    table         = row[0]
-    last_vacuum   = row[1]
-    last_autovac  = row[2]
-    tups          = row[3]
-    dead          = row[4]
-    sizep         = row[5]
-    size          = row[6]
-    part          = row[7]
-    av_threshold  = row[8]
-    expect_av     = row[9]
-    vacs          = row[10]
-    if vacs == 'NOVACS':
-       ASYNC= '*Async'
-       SYNC = '*Sync'
+    # v6.1: filtered from the catalog snapshot, ordered by name or by last vacuum date with -g
+    rows = snapshot_vacuum()
+    if len(rows) == 0:
+        printit ("No vacuums to be done.")
     else:
-       ASYNC= ' Async'
-       SYNC = ' Sync'
+        printit ("vacuums to be evaluated=%d.  Asterisk (*) indicates no vacuums for table exists." % len(rows) )
 
-    if part and ignoreparts:
-        partcnt = partcnt + 1
-        #print ("ignoring partitioned table: %s" % table)
-        cnt = cnt - 1
-        continue
+    cnt = 0
+    partcnt = 0
+    action_name = 'VACUUM'
+    # v6.3: most valuable first with --priority
+    for row in prioritize(rows, 'VACUUM'):
+        if active_processes >= threshold_max_processes:
+            # see how many are currently running and update the active processes again
+            # v6.0: wait for a job to finish instead of sleeping 5 minutes
+            active_processes = wait_for_slot(conn, cur)
 
-    # check if we already processed this table
-    if skip_table(table, tablist):
-        cnt = cnt - 1
-        continue
-    #else:
-        #printit("table = %s will NOT be skipped." % table)
-
-    if size > threshold_max_size:
-        # defer action
-        printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d NOTICE: Skipping large table.  Do manually." % (ASYNC, action_name, cnt, table, tups, sizep, size, dead))
-        tables_skipped = tables_skipped + 1
-        tablist.append(table)
-        check_maxtables()
-        cnt = cnt - 1
-        continue
-    elif tups > threshold_async_rows or size > threshold_max_sync:
-    #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
-        if dryrun:
-            if active_processes > threshold_max_processes:
-                printit ("%s %10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (ASYNC,action_name, table, sizep))
-                tables_skipped = tables_skipped + 1
-                continue
-            printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (ASYNC,action_name, cnt, table, tups, sizep, size, dead))
-            tablist.append(table)
-            check_maxtables()
-            total_vacuums  = total_vacuums + 1
-            active_processes = active_processes + 1
+        cnt = cnt + 1
+        table         = row[0]
+        last_vacuum   = row[1]
+        last_autovac  = row[2]
+        tups          = row[3]
+        dead          = row[4]
+        sizep         = row[5]
+        size          = row[6]
+        part          = row[7]
+        av_threshold  = row[8]
+        expect_av     = row[9]
+        vacs          = row[10]
+        oid           = row[12]
+        if vacs == 'NOVACS':
+           ASYNC= '*Async'
+           SYNC = '*Sync'
         else:
-            if active_processes > threshold_max_processes:
-                printit ("%s %10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (ASYNC, action_name, table, sizep))
-                tables_skipped = tables_skipped + 1
-                cnt = cnt - 1
-                continue
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-            asyncjobs = asyncjobs + 1
-
-            # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "VACUUM (VERBOSE, %s) %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, parallelstatement, table)
-            # V4.1 fix, escape double quotes
-            tbl= table.replace('"', '\\"')
-            tbl= tbl.replace('$', '\$')
-            if parallelstatement == '':
-              cmd = 'nohup psql -d "%s" -c "VACUUM (VERBOSE) %s" 2>/dev/null &' % (connparms, tbl)
-            else:
-              cmd = 'nohup psql -d "%s" -c "VACUUM (VERBOSE, %s) %s" 2>/dev/null &' % (connparms, parallelstatement, tbl)
-
-            time.sleep(0.5)
-            rc = execute_cmd(cmd)
-            total_vacuums  = total_vacuums + 1
-            active_processes = active_processes + 1
-            tablist.append(table)
+           ASYNC= ' Async'
+           SYNC = ' Sync'
+
+        if part and ignoreparts:
+            partcnt = partcnt + 1
+            #print ("ignoring partitioned table: %s" % table)
+            cnt = cnt - 1
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='ignoreparts')
+            continue
+
+        # check if we already processed this table
+        if skip_table(oid, tablist):
+            cnt = cnt - 1
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='already_listed')
+            continue
+        #else:
+            #printit("table = %s will NOT be skipped." % table)
+
+        # v7.2: nothing to do where the visibility map says all pages are all-visible
+        if vm_skip(oid, action_name):
+            cnt = cnt - 1
+            continue
+
+        # v7.3: nor where too little space would be reclaimed
+        if bloat_skip(oid, action_name):
+            cnt = cnt - 1
+            continue
+
+        # v7.6: nor on cold partitions
+        if partition_skip(oid, action_name):
+            cnt = cnt - 1
+            continue
+
+        if size > threshold_max_size:
+            # defer action
+            printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d NOTICE: Skipping large table.  Do manually." % (ASYNC, action_name, cnt, table, tups, sizep, size, dead))
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
+            tables_skipped = tables_skipped + 1
+            tablist.add(oid)
             check_maxtables()
+            cnt = cnt - 1
+            continue
+        elif use_async(table, tups, size, 'VACUUM'):
+        #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
+            if dryrun:
+                if active_processes >= threshold_max_processes:
+                    printit ("%s %10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (ASYNC,action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    continue
+                printit ("%s %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (ASYNC,action_name, cnt, table, tups, sizep, size, dead))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                tablist.add(oid)
+                check_maxtables()
+                total_vacuums  = total_vacuums + 1
+                active_processes = active_processes + 1
+            else:
+                if active_processes >= threshold_max_processes:
+                    printit ("%s %10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (ASYNC, action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    cnt = cnt - 1
+                    continue
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                asyncjobs = asyncjobs + 1
+
+                # v5.7: run on the worker pool instead of a detached psql process
+                job = VacuumJob(table, 'VACUUM', ['VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not dispatch_async(job):
+                    asyncjobs = asyncjobs - 1
+                    continue
+                total_vacuums  = total_vacuums + 1
+                active_processes = active_processes + 1
+                tablist.add(oid)
+                check_maxtables()
 
-    else:
-        if dryrun:
-            printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead))
-            total_vacuums  = total_vacuums + 1
-            tablist.append(table)
-            check_maxtables()
         else:
-            printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" %  (SYNC, action_name, cnt, table, tups, sizep, size, dead))
-            if parallelstatement == '':
-              sql = "VACUUM (VERBOSE) %s" % (table)
+            if dryrun:
+                printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (SYNC, action_name, cnt, table, tups, sizep, size, dead))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                total_vacuums  = total_vacuums + 1
+                tablist.add(oid)
+                check_maxtables()
             else:
-              sql = "VACUUM (VERBOSE, %s) %s" % (parallelstatement, table)
-            time.sleep(0.5)
-            try:
-                cur.execute(sql)
-            except Exception as error:
-                printit("Exception: %s *** %s" % (type(error), error))
-                cnt = cnt - 1
-                continue
-            total_vacuums  = total_vacuums + 1
-            tablist.append(table)
-            check_maxtables()
-
-if ignoreparts:
-    printit ("Partitioned table vacuums bypassed=%d" % partcnt)
-    partitioned_tables_skipped = partitioned_tables_skipped + partcnt
-
-printit ("Tables vacuumed: %d" % cnt)
-
-#################################
-# 7. Analyze Section            #
-#################################
-'''
-select n.nspname || '.' || c.relname as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname))::bigint),
-pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze,
-CASE WHEN c.reltuples = 0 THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, now()::date  - last_analyze::date as lastanalyzed2
-FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and
-u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > 5 and
-pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= 50000000 order by 1,2;
-
--- public schema
-select n.nspname || '.' || c.relname as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname))::bigint),  pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, now()::date  - last_analyze::date as lastanalyzed2 from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = 'public' and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > 5 and
-pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= 50000000 order by 1,2;
-'''
+                printit ("%s  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" %  (SYNC, action_name, cnt, table, tups, sizep, size, dead))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                # v5.8: main cursor or --jobs worker connections
+                job = VacuumJob(table, 'VACUUM', ['VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not run_sync(job):
+                    cnt = cnt - 1
+                    continue
+                total_vacuums  = total_vacuums + 1
+                tablist.add(oid)
+                check_maxtables()
 
-if _verbose: printit("VERBOSE MODE: (7) Analyze section")
-if pgversion > 100000:
-    if schema == "":
-       sql = "select n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' ||  " \
-      "quote_ident(c.relname))::bigint), pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 " \
-      "THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, now()::date  - last_analyze::date as lastanalyzed2 " \
-      "from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and " \
-      "t.schemaname = n.nspname and t.tablename = c.relname and " \
-      "c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d " \
-      "and pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= %d order by 1,2" % (threshold_max_days_analyze, threshold_max_size)
-    else:
-       sql = "select n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || " \
-      "quote_ident(c.relname))::bigint), pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 " \
-      "THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, " \
-      "now()::date  - last_analyze::date as lastanalyzed2 from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = '%s' and t.schemaname = n.nspname and " \
-      "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d " \
-      "and pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= %d order by 1,2" % (schema, threshold_max_days_analyze, threshold_max_size)
-else:
-# put version 9.x compatible query here
-# CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
-    if schema == "":
-       sql = "select n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' ||  " \
-      "quote_ident(c.relname))::bigint), pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i " \
-      "JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 " \
-      "THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, " \
-      "now()::date  - last_analyze::date as lastanalyzed2 from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in " \
-      "('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname and t.tablename = c.relname and " \
-      "c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d " \
-      "and pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= %d order by 1,2" % (threshold_max_days_analyze, threshold_max_size)
+    if ignoreparts:
+        printit ("Partitioned table vacuums bypassed=%d" % partcnt)
+        partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+
+    printit ("Tables vacuumed: %d" % cnt)
+
+    #################################
+    # 7. Analyze Section            #
+    #################################
+    '''
+    select n.nspname || '.' || c.relname as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname))::bigint),
+    pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze,
+    CASE WHEN c.reltuples = 0 THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, now()::date  - last_analyze::date as lastanalyzed2
+    FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and
+    u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog') and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > 5 and
+    pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= 50000000 order by 1,2;
+
+    -- public schema
+    select n.nspname || '.' || c.relname as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname))::bigint),  pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, c.relispartition, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 THEN -1 ELSE round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, now()::date  - last_analyze::date as lastanalyzed2 from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = 'public' and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > 5 and
+    pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= 50000000 order by 1,2;
+    '''
+
+    profile_phase('7 analyze')
+    if _verbose: printit("VERBOSE MODE: (7) Analyze section")
+    # v6.1: filtered from the catalog snapshot
+    if debug: printit("DEBUG   MODE: (7) snapshot filter: days since analyze > %d and size <= %d" % (threshold_max_days_analyze, threshold_max_size))
+    rows = snapshot_analyze()
+    if len(rows) == 0:
+        printit ("No tables require analyzes to be done.")
     else:
-       sql = "select n.nspname || '.\"' || c.relname || '\"' as table, c.reltuples::bigint, u.n_live_tup::bigint, u.n_dead_tup::bigint, u.n_mod_since_analyze::bigint, pg_size_pretty(pg_total_relation_size(quote_ident(n.nspname) || '.' || " \
-      "quote_ident(c.relname))::bigint), pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) as size, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i " \
-      "JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned, u.last_analyze, u.last_autoanalyze, case when c.reltuples = 0 THEN -1 ELSE " \
-      "round((u.n_live_tup / c.reltuples) * 100) END as tupdiff, " \
-      "now()::date  - last_analyze::date as lastanalyzed2 from pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = '%s' and t.schemaname = n.nspname and " \
-      "t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_analyze, last_autoanalyze)::date > %d " \
-      "and pg_total_relation_size(quote_ident(n.nspname) || '.' || quote_ident(c.relname)) <= %d order by 1,2" % (schema, threshold_max_days_analyze, threshold_max_size)
+        printit ("Table analyzes to be evaluated=%d" % len(rows) )
 
-if debug: printit("DEBUG   MODE: (7) %s" % sql)
-
-try:
-    cur.execute(sql)
-except Exception as error:
-    printit("Exception: %s *** %s" % (type(error), error))
-    conn.close()
-    sys.exit (1)
-
-rows = cur.fetchall()
-if len(rows) == 0:
-    printit ("No tables require analyzes to be done.")
-else:
-    printit ("Table analyzes to be evaluated=%d" % len(rows) )
-
-cnt = 0
-partcnt = 0
-action_name = 'ANALYZE'
-for row in rows:
-    cnt = cnt + 1
-    table    = row[0]
-    tups     = row[1]
-    dead     = row[3]
-    analyzed = row[4]
-    sizep    = row[5]
-    size     = row[6]
-    part     = row[7]
-
-    if part and ignoreparts:
-        partcnt = partcnt + 1
-        #print *"ignoring partitioned table: %s" % table)
-        cnt = cnt - 1
-        continue
-
-    # check if we already processed this table
-    if skip_table(table, tablist):
-        cnt = cnt - 1
-        continue
-
-    if analyzed < minmodanalyzed:
-        #print ('skipping table under threshold level: %s' % table)
-        cnt = cnt - 1
-        continue
-
-    # skip tables that are too large
-    if active_processes > threshold_max_processes:
-        # see how many are currently running and update the active processes again
-        # rc = get_process_cnt()
-        rc = get_query_cnt(conn, cur)
-        if rc > threshold_max_processes:
-            printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-            time.sleep(300)
-        else:
-            printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-        active_processes = rc
-
-    if size > threshold_max_size:
-        if dryrun:
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d  NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            tables_skipped = tables_skipped + 1
-        else:
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d  NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            tables_skipped = tables_skipped + 1
-        continue
-    elif size > threshold_max_sync:
-        if dryrun:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %-57s.  Size=%s.  Do manually." % (action_name, table, sizep))
+    cnt = 0
+    partcnt = 0
+    action_name = 'ANALYZE'
+    # v6.3: most valuable first with --priority
+    for row in prioritize(rows, 'ANALYZE'):
+        cnt = cnt + 1
+        table    = row[0]
+        tups     = row[1]
+        dead     = row[3]
+        analyzed = row[4]
+        sizep    = row[5]
+        size     = row[6]
+        part     = row[7]
+        oid      = row[12]
+
+        if part and ignoreparts:
+            partcnt = partcnt + 1
+            #print *"ignoring partitioned table: %s" % table)
+            cnt = cnt - 1
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='ignoreparts')
+            continue
+
+        # check if we already processed this table
+        if skip_table(oid, tablist):
+            cnt = cnt - 1
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='already_listed')
+            continue
+
+        # v7.6: cold partitions have nothing new to analyze
+        if partition_skip(oid, action_name):
+            cnt = cnt - 1
+            continue
+
+        if analyzed < minmodanalyzed:
+            #print ('skipping table under threshold level: %s' % table)
+            cnt = cnt - 1
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='below_threshold')
+            continue
+
+        # skip tables that are too large
+        if active_processes >= threshold_max_processes:
+            # see how many are currently running and update the active processes again
+            # v6.0: wait for a job to finish instead of sleeping 5 minutes
+            active_processes = wait_for_slot(conn, cur)
+
+        if size > threshold_max_size:
+            if dryrun:
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d  NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
                 tables_skipped = tables_skipped + 1
-                continue
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            active_processes = active_processes + 1
-            total_analyzes  = total_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
-        else:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %-57s.  Size=%s.  Do manually." % (action_name, table, sizep))
+            else:
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d  NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
                 tables_skipped = tables_skipped + 1
-                cnt = cnt - 1
-                continue
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            tablist.append(table)
-            check_maxtables()
-            asyncjobs = asyncjobs + 1
-
-            # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "ANALYZE VERBOSE %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, table)
-            # V4.1 fix, escape double quotes
-            tbl= table.replace('"', '\\"')
-            tbl= tbl.replace('$', '\$')
-            cmd = 'nohup psql -d "%s" -c "ANALYZE VERBOSE %s" 2>/dev/null &' % (connparms, tbl)
-
-            time.sleep(0.5)
-            rc = execute_cmd(cmd)
-            active_processes = active_processes + 1
-            total_analyzes  = total_analyzes + 1
-    else:
-        if dryrun:
-            printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            total_analyzes  = total_analyzes + 1
-            tablist.append(table)
-            check_maxtables()
+            continue
+        elif use_async(table, 0, size, 'ANALYZE'):
+            if dryrun:
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %-57s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    continue
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                active_processes = active_processes + 1
+                total_analyzes  = total_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
+            else:
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %-57s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    cnt = cnt - 1
+                    continue
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                tablist.add(oid)
+                check_maxtables()
+                asyncjobs = asyncjobs + 1
+
+                # v5.7: run on the worker pool instead of a detached psql process
+                job = VacuumJob(table, 'ANALYZE', ['VERBOSE'], action_name, size, tups, oid)
+                if not dispatch_async(job):
+                    asyncjobs = asyncjobs - 1
+                    continue
+                active_processes = active_processes + 1
+                total_analyzes  = total_analyzes + 1
         else:
-            printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
-            tablist.append(table)
-            check_maxtables()
-            sql = "ANALYZE VERBOSE %s" % table
-            time.sleep(0.5)
-            try:
-                cur.execute(sql)
-            except Exception as error:
-                printit("Exception: %s *** %s" % (type(error), error))
-                cnt = cnt - 1
-                continue
-            total_analyzes  = total_analyzes + 1
-
-if ignoreparts:
-    printit ("Big partitioned table analyzes bypassed=%d" % partcnt)
-    partitioned_tables_skipped = partitioned_tables_skipped + partcnt
-
-printit ("Tables analyzed: %d" % cnt)
-
-
-#################################
-# 8. Catchall query for analyze that have not happened for over 30 days weeks.
-#    Removed this section since we are trying to out think the user
-#################################
-if _verbose: printit("VERBOSE MODE: (8) Skipping Catchall analyze section for old analyzes > 30 days")
-
-#################################
-# 9. Catchall query for vacuums that have not happened past vacuum max days threshold
-#################################
-# V2.3: Introduced
-'''
--- all
--- v10 or higher
-SELECT u.schemaname || '.' || u.relname as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze
-FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 5 and u.n_dead_tup >= 1000 order by 1,1;
-
--- v9.6 or lower
-SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
-pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup,
-CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned,
-to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,
-to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and
-t.schemaname = n.nspname  and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND
-now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 30 and u.n_dead_tup >= 0 order by 1,1;
-
-
--- public schema
-SELECT u.schemaname || '.' || u.relname as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze
-FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = 'public' and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 30 and u.n_dead_tup >= 0 order by 1,1;
-'''
-# v 4.0 fix: >= dead tups, not > only
-# V4.3 fix: also add max relation size to the filter
-if _verbose: printit("VERBOSE MODE: (9) Catchall vacuum query section")
-if pgversion > 100000:
-    if schema == "":
-       sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, " \
-      "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,  " \
-      "to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname  " \
-      "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND  " \
-      "now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d and u.n_dead_tup >= %d order by 1,1" % (threshold_max_days_vacuum, threshold_dead_tups)
-    else:
-       sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, " \
-      "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,  " \
-      "to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = '%s' and t.schemaname = n.nspname  " \
-      "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  AND  now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d and u.n_dead_tup >= %d order by 1,1" % (schema, threshold_max_days_vacuum, threshold_dead_tups)
-else:
-# put version 9.x compatible query here
-# CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False' ELSE 'True' END as partitioned
-    if schema == "":
-       sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-      "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,  " \
-      "to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname  " \
-      "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND  " \
-      "now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d and u.n_dead_tup >= %d order by 1,1" % (threshold_max_days_vacuum, threshold_dead_tups)
+            if dryrun:
+                printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                total_analyzes  = total_analyzes + 1
+                tablist.add(oid)
+                check_maxtables()
+            else:
+                printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d analyzed: %8d" % (action_name, cnt, table, tups, sizep, size, dead, analyzed))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                tablist.add(oid)
+                check_maxtables()
+                # v5.8: main cursor or --jobs worker connections
+                job = VacuumJob(table, 'ANALYZE', ['VERBOSE'], action_name, size, tups, oid)
+                if not run_sync(job):
+                    cnt = cnt - 1
+                    continue
+                total_analyzes  = total_analyzes + 1
+
+    if ignoreparts:
+        printit ("Big partitioned table analyzes bypassed=%d" % partcnt)
+        partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+
+    printit ("Tables analyzed: %d" % cnt)
+
+
+    #################################
+    # 8. Catchall query for analyze that have not happened for over 30 days weeks.
+    #    Removed this section since we are trying to out think the user
+    #################################
+    if _verbose: printit("VERBOSE MODE: (8) Skipping Catchall analyze section for old analyzes > 30 days")
+
+    #################################
+    # 9. Catchall query for vacuums that have not happened past vacuum max days threshold
+    #################################
+    # V2.3: Introduced
+    '''
+    -- all
+    -- v10 or higher
+    SELECT u.schemaname || '.' || u.relname as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze
+    FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 5 and u.n_dead_tup >= 1000 order by 1,1;
+
+    -- v9.6 or lower
+    SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty,
+    pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup,
+    CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned,
+    to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,
+    to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and n.nspname not in ('pg_catalog', 'pg_toast', 'information_schema') and
+    t.schemaname = n.nspname  and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and n.nspname not in ('information_schema','pg_catalog', 'pg_toast') AND
+    now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 30 and u.n_dead_tup >= 0 order by 1,1;
+
+
+    -- public schema
+    SELECT u.schemaname || '.' || u.relname as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, c.relispartition, to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze, to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze
+    FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = 'public' and t.schemaname = n.nspname and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname and now()::date - GREATEST(last_vacuum, last_autovacuum)::date > 30 and u.n_dead_tup >= 0 order by 1,1;
+    '''
+    # v 4.0 fix: >= dead tups, not > only
+    # V4.3 fix: also add max relation size to the filter
+    profile_phase('9 old vacuums')
+    if _verbose: printit("VERBOSE MODE: (9) Catchall vacuum query section")
+    # v6.1: filtered from the catalog snapshot
+    rows = snapshot_old_vacuums()
+    if len(rows) == 0:
+        printit ("No old vacuums to be done > maxdays=%d." % threshold_max_days_vacuum)
     else:
-       sql = "SELECT u.schemaname || '.\"' || u.relname || '\"' as table, pg_size_pretty(pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname))::bigint) as size_pretty, " \
-      "pg_total_relation_size(quote_ident(u.schemaname) || '.' || quote_ident(u.relname)) as size, c.reltuples::bigint AS n_tup, u.n_live_tup::bigint as n_live_tup, u.n_dead_tup::bigint AS dead_tup, CASE WHEN (SELECT c.relname AS child FROM pg_inherits i JOIN pg_class p ON (i.inhparent=p.oid) where i.inhrelid=c.oid) IS NULL THEN 'False'::boolean ELSE 'True'::boolean END as partitioned, " \
-      "to_char(u.last_vacuum, 'YYYY-MM-DD HH24:MI') as last_vacuum, to_char(u.last_autovacuum, 'YYYY-MM-DD HH24:MI') as last_autovacuum, to_char(u.last_analyze,'YYYY-MM-DD HH24:MI') as last_analyze,  " \
-      "to_char(u.last_autoanalyze,'YYYY-MM-DD HH24:MI') as last_autoanalyze FROM pg_namespace n, pg_class c, pg_tables t, pg_stat_user_tables u where c.relnamespace = n.oid and t.schemaname = '%s' and t.schemaname = n.nspname  " \
-      "and t.tablename = c.relname and c.relname = u.relname and u.schemaname = n.nspname  AND  now()::date - GREATEST(last_vacuum, last_autovacuum)::date > %d and u.n_dead_tup >= %d order by 1,1" % (schema, threshold_max_days_vacuum, threshold_dead_tups)
+        printit ("vacuums to be evaluated=%d greater than maxdays=%d and dead tups > %d" % (len(rows), threshold_max_days_vacuum, threshold_dead_tups))
 
-try:
-     cur.execute(sql)
-except Exception as error:
-    printit("Exception: %s *** %s" % (type(error), error))
-    conn.close()
-    sys.exit (1)
-
-rows = cur.fetchall()
-if len(rows) == 0:
-    printit ("No old vacuums to be done > maxdays=%d." % threshold_max_days_vacuum)
-else:
-    printit ("vacuums to be evaluated=%d greater than maxdays=%d and dead tups > %d" % (len(rows), threshold_max_days_vacuum, threshold_dead_tups))
-
-cnt = 0
-partcnt = 0
-action_name = 'VACUUM(2)'
-for row in rows:
-    if active_processes > threshold_max_processes:
-        # see how many are currently running and update the active processes again
-        # rc = get_process_cnt()
-        rc = get_query_cnt(conn, cur)
-        if rc > threshold_max_processes:
-            printit ("Current process cnt(%d) is still higher than threshold (%d). Sleeping for 5 minutes..." % (rc, threshold_max_processes))
-            time.sleep(300)
-        else:
-            printit ("Current process cnt(%d) is less than threshold (%d).  Processing will continue..." % (rc, threshold_max_processes))
-        active_processes = rc
-
-    cnt = cnt + 1
-    table  = row[0]
-    sizep  = row[1]
-    size   = row[2]
-    tups   = row[3]
-    live   = row[4]
-    dead   = row[5]
-    part   = row[6]
-
-    if part and ignoreparts:
-        partcnt = partcnt + 1
-        #print ("ignoring partitioned table: %s" % table)
-        continue
-
-    # check if we already processed this table
-    if skip_table(table, tablist):
-        continue
+    cnt = 0
+    partcnt = 0
+    action_name = 'VACUUM(2)'
+    # v6.3: most valuable first with --priority
+    for row in prioritize(rows, 'VACUUM'):
+        if active_processes >= threshold_max_processes:
+            # see how many are currently running and update the active processes again
+            # v6.0: wait for a job to finish instead of sleeping 5 minutes
+            active_processes = wait_for_slot(conn, cur)
 
-    if size > threshold_max_size:
-        # defer action
-        if dryrun:
-            printit ("Async %10s: %04d %-57s rows: %11d  dead: %8d  size: %10s :%13d NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, dead, sizep, size))
-            tables_skipped = tables_skipped + 1
-        continue
-    elif tups > threshold_async_rows or size > threshold_max_sync:
-    #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
-        if dryrun:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
-                tables_skipped = tables_skipped + 1
-                continue
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-            total_vacuums = total_vacuums + 1
-            tablist.append(table)
-            check_maxtables()
-            active_processes = active_processes + 1
-        else:
-            if active_processes > threshold_max_processes:
-                printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+        cnt = cnt + 1
+        table  = row[0]
+        sizep  = row[1]
+        size   = row[2]
+        tups   = row[3]
+        live   = row[4]
+        dead   = row[5]
+        part   = row[6]
+        oid    = row[11]
+
+        if part and ignoreparts:
+            partcnt = partcnt + 1
+            #print ("ignoring partitioned table: %s" % table)
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='ignoreparts')
+            continue
+
+        # check if we already processed this table
+        if skip_table(oid, tablist):
+            candidate('skip', action_name, table, oid, size, tups, dead, reason='already_listed')
+            continue
+
+        # v7.2: nothing to do where the visibility map says all pages are all-visible
+        if vm_skip(oid, action_name):
+            continue
+
+        # v7.3: nor where too little space would be reclaimed
+        if bloat_skip(oid, action_name):
+            continue
+
+        # v7.6: nor on cold partitions
+        if partition_skip(oid, action_name):
+            continue
+
+        if size > threshold_max_size:
+            # defer action
+            if dryrun:
+                printit ("Async %10s: %04d %-57s rows: %11d  dead: %8d  size: %10s :%13d NOTICE: Skipping large table.  Do manually." % (action_name, cnt, table, tups, dead, sizep, size))
+                candidate('skip', action_name, table, oid, size, tups, dead, reason='too_large')
                 tables_skipped = tables_skipped + 1
-                continue
-            printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-            asyncjobs = asyncjobs + 1
-
-            # cmd = 'nohup psql -h %s -d %s -p %s -U %s -c "VACUUM (VERBOSE, %s) %s" 2>/dev/null &' % (hostname, dbname, dbport, dbuser, parallelstatement, table)
-            # V4.1 fix, escape double quotes
-            tbl= table.replace('"', '\\"')
-            tbl= tbl.replace('$', '\$')
-            if parallelstatement == '':
-              cmd = 'nohup psql -d "%s" -c "VACUUM (VERBOSE) %s" 2>/dev/null &' % (connparms, tbl)
+            continue
+        elif use_async(table, tups, size, 'VACUUM'):
+        #elif (tups > threshold_async_rows or size > threshold_max_sync) and async_:
+            if dryrun:
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    continue
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                total_vacuums = total_vacuums + 1
+                tablist.add(oid)
+                check_maxtables()
+                active_processes = active_processes + 1
             else:
-              cmd = 'nohup psql -d "%s" -c "VACUUM (VERBOSE, %s) %s" 2>/dev/null &' % (connparms, parallelstatement, tbl)
-
-            time.sleep(0.5)
-            rc = execute_cmd(cmd)
-            total_vacuums = total_vacuums + 1
-            tablist.append(table)
-            check_maxtables()
-            active_processes = active_processes + 1
+                if active_processes >= threshold_max_processes:
+                    printit ("%10s: Max processes reached. Skipping further Async activity for very large table, %s.  Size=%s.  Do manually." % (action_name, table, sizep))
+                    candidate('skip', action_name, table, oid, size, tups, dead, reason='max_processes')
+                    tables_skipped = tables_skipped + 1
+                    continue
+                printit ("Async %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                candidate('async', action_name, table, oid, size, tups, dead)
+                asyncjobs = asyncjobs + 1
+
+                # v5.7: run on the worker pool instead of a detached psql process
+                job = VacuumJob(table, 'VACUUM', ['VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not dispatch_async(job):
+                    asyncjobs = asyncjobs - 1
+                    continue
+                total_vacuums = total_vacuums + 1
+                tablist.add(oid)
+                check_maxtables()
+                active_processes = active_processes + 1
 
-    else:
-        if dryrun:
-            printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-            tablist.append(table)
-            check_maxtables()
         else:
-            printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
-            if parallelstatement == '':
-              sql = "VACUUM (VERBOSE) %s" % (table)
+            if dryrun:
+                printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                tablist.add(oid)
+                check_maxtables()
             else:
-              sql = "VACUUM (VERBOSE, %s) %s" % (parallelstatement, table)
-            time.sleep(0.5)
-            try:
-                cur.execute(sql)
-            except Exception as error:
-                printit("Exception: %s *** %s" % (type(error), error))
-                continue
-
-            total_vacuums = total_vacuums + 1
-            tablist.append(table)
-            check_maxtables()
+                printit ("Sync  %10s: %04d %-57s rows: %11d size: %10s :%13d dead: %8d" % (action_name, cnt, table, tups, sizep, size, dead))
+                candidate('sync', action_name, table, oid, size, tups, dead)
+                # v5.8: main cursor or --jobs worker connections
+                job = VacuumJob(table, 'VACUUM', ['VERBOSE', parallelstatement], action_name, size, tups, oid)
+                if not run_sync(job):
+                    continue
+
+                total_vacuums = total_vacuums + 1
+                tablist.add(oid)
+                check_maxtables()
 
-if ignoreparts:
-    printit ("Very old partitioned table vacuums bypassed=%d" % partcnt)
-    partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+    if ignoreparts:
+        printit ("Very old partitioned table vacuums bypassed=%d" % partcnt)
+        partitioned_tables_skipped = partitioned_tables_skipped + partcnt
+
+    # v6.5: expected duration and v7.2: predicted vacuum I/O of what a dry run found in this database
+    if dryrun:
+        if history is not None:
+            history_plan()
+        vm_plan()
+
+if len(late_databases) > 0:
+    printit ("Deadline reached. Databases skipped: %s" % ', '.join(late_databases))
+if args.alldatabases:
+    printit ("Databases processed: %d  failed: %d%s" % (len(databases) - len(late_databases), len(failed_databases), ' (%s)' % ', '.join(failed_databases) if failed_databases else ''))
+
+# v8.1: the actions end here, once for all databases
+if checkstats or nullsonly or bfreeze or bautotune:
+    if not checkstats:
+        # v5.7: wait for jobs started by this action
+        finish_jobs()
+        if inquiry:
+            inquire_databases()
+    if checkstats:
+        action = 'check stats'
+    elif nullsonly:
+        action = 'Nulls Only'
+    elif bfreeze:
+        action = 'Freeze'
+    else:
+        action = 'Autotune'
+    print_counters()
+    conn.close()
+    printit ("End of %s action.  Closing the connection and exiting normally." % action)
+    sys.exit(1 if failed_databases else 0)
 
-# wait for up to 2 hours for ongoing vacuums/analyzes to finish.
+# v5.7: wait for our own async jobs, then for up to 2 hours for any other ongoing vacuums/analyzes to finish.
 if not dryrun:
+    finish_jobs()
     wait_for_processes(conn,cur)
-
-printit ("Vacuum Freeze: %d  Vacuum Analyze: %d  Total Vacuums: %d  Total Analyzes: %d  Skipped Partitioned Tables: %d  Total Skipped Tables: %d  Total Async Jobs: %d " \
-         % (total_freezes, total_vacuums_analyzes, total_vacuums, total_analyzes, partitioned_tables_skipped, tables_skipped + partitioned_tables_skipped, asyncjobs))
-rc = get_query_cnt(conn, cur)
+    if monitor is not None:
+        monitor.stop()
+    if controller is not None:
+        controller.stop()
+
+print_counters()
+if deadline is not None:
+    printit ("Skipped at deadline: %d" % (deadline_skipped))
+if multipass_jobs > 0:
+    printit ("Vacuums with more than one index pass: %d" % (multipass_jobs))
+if not dryrun and len(vm_skipped) > 0:
+    printit ("Vacuums skipped as all-visible: %d" % (len(vm_skipped)))
+if bloat_min >= 0:
+    printit ("Vacuums skipped under min bloat: %d" % (len(bloat_skipped)))
+if len(cold_skipped) > 0:
+    printit ("Cold partitions skipped: %d" % (len(cold_skipped)))
+rc = get_query_cnt(conn, cur, pool_pids())
 if rc > 0:
     printit ("NOTE: Current vacuums/analyzes still in progress: %d" % (rc))
 
@@ -2238,9 +5019,11 @@ psjobs = "ps -ef | grep 'psql -h %s'| grep -v '\--color'" % hostname
 #print ("psjobs = %s" % psjobs)
 
 if inquiry:
-  _inquiry(conn,cur,tablist)
+  inquire_databases()
 
 # Close communication with the database
+if history is not None:
+    history.close()
 conn.close()
 printit ("Closed the connection and exiting normally.")
-sys.exit(0)
+sys.exit(1 if failed_databases else 0)
@@ -0,0 +1,284 @@
+# Unit tests of pg_vacuum's planning helpers, on hand-built catalog rows. No server needed.
+#
+# pg_vacuum.py is a script: it parses its arguments and connects when run, so it is not imported.
+# Its imports and settings (everything before the first definition) and its functions and classes
+# are run into a namespace instead, and each test sets the run-time globals it needs there.
+import ast, os, re, sys
+import pytest
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pg_vacuum.py')
+
+def compile_definitions():
+    with open(SOURCE) as f:
+        tree = ast.parse(f.read(), SOURCE)
+    definitions = [node.lineno for node in tree.body if isinstance(node, (ast.FunctionDef, ast.ClassDef))]
+    # the main script starts after the last definition, the assignments between definitions are locks and patterns
+    tree.body = [node for node in tree.body if node.lineno < min(definitions) or
+                 (node.lineno <= max(definitions) and isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Assign)))]
+    return compile(tree, SOURCE, 'exec')
+
+CODE = compile_definitions()
+
+COLUMNS = ('oid', 'table', 'relkind', 'size', 'reltuples', 'n_tup', 'n_live_tup', 'n_dead_tup', 'n_mod_since_analyze', 'partitioned', 'xid_age',
+           'last_vacuum', 'last_autovacuum', 'last_analyze', 'last_autoanalyze', 'last_analyze_ts', 'last_autoanalyze_ts', 'last_vacuumed_ts',
+           'last_vacuumed', 'last_analyzed', 'days_vacuum', 'days_analyze', 'days_last_analyze', 'av_threshold', 'expect_av', 'mxid_age',
+           'relpages', 'relallvisible', 'relallfrozen')
+
+DEFAULTS = dict(relkind='r', size=0, reltuples=0, n_tup=0, n_live_tup=0, n_dead_tup=0, n_mod_since_analyze=0, partitioned=False, xid_age=0,
+                last_vacuum=None, last_autovacuum=None, last_analyze=None, last_autoanalyze=None, last_analyze_ts=None, last_autoanalyze_ts=None,
+                last_vacuumed_ts=None, last_vacuumed=None, last_analyzed=None, days_vacuum=None, days_analyze=None, days_last_analyze=None,
+                av_threshold='', expect_av='', mxid_age=0, relpages=0, relallvisible=0, relallfrozen=None)
+
+@pytest.fixture
+def pgv():
+    ns = {'__name__': 'pg_vacuum', '__file__': SOURCE}
+    exec(CODE, ns)
+    ns.update(dbname='testing', relations={}, vm_cache={}, vm_predicted={}, bloat=None, bloat_approx={}, bloat_mode='',
+              history=None, priority=False, disablepageskipping=False, orderbydate=False, freeze=-1, snapshot=None,
+              _verbose=False, debug=False, threshold_max_days_analyze=-1, threshold_max_days_vacuum=-1)
+    ns['estimator'] = ns['Estimator'](ns['io_rate'], ns['job_overhead'])
+    return ns
+
+def relation(pgv, oid, **fields):
+    values = dict(DEFAULTS, oid=oid, table='public."t%d"' % oid)
+    values.update(fields)
+    rel = pgv['Relation'](COLUMNS, [values[column] for column in COLUMNS])
+    pgv['relations'][oid] = rel
+    return rel
+
+def partitions(pgv, parent, children):
+    pgv['partition_children'][parent] = list(children)
+    for child in children:
+        pgv['partition_parent'][child] = parent
+
+
+def test_sql_options(pgv):
+    job = lambda command, options: pgv['VacuumJob']('public."t"', command, options, 'X')
+    assert job('VACUUM', ['']).sql() == 'VACUUM public."t"'
+    assert job('VACUUM', ['ANALYZE', '']).sql() == 'VACUUM (ANALYZE) public."t"'
+    assert job('VACUUM', ['FREEZE', 'VERBOSE']).sql() == 'VACUUM (FREEZE, VERBOSE) public."t"'
+    assert job('VACUUM', ['VERBOSE', 'DISABLE_PAGE_SKIPPING FALSE']).sql() == 'VACUUM (VERBOSE, DISABLE_PAGE_SKIPPING FALSE) public."t"'
+    assert job('ANALYZE', []).sql() == 'ANALYZE public."t"'
+    assert job('ANALYZE', ['VERBOSE']).sql() == 'ANALYZE VERBOSE public."t"'
+    assert job('VACUUM ANALYZE', []).sql() == 'VACUUM ANALYZE public."t"'
+
+    tuned = job('VACUUM ANALYZE', [])
+    tuned.parallel     = 2
+    tuned.buffer_limit = '256MB'
+    assert tuned.sql() == "VACUUM (ANALYZE, PARALLEL 2, BUFFER_USAGE_LIMIT '256MB') public.\"t\""
+
+    parent = job('ANALYZE', ['VERBOSE'])
+    parent.only = True
+    assert parent.sql() == 'ANALYZE VERBOSE ONLY public."t"'
+
+def test_sql_matches_get_query_cnt_pattern(pgv):
+    # every statement a job can run must be counted by get_query_cnt() in the other pg_vacuum runs
+    class Cursor(object):
+        def execute(self, sql):
+            self.sql = sql
+        def fetchone(self):
+            return (0,)
+    cursor = Cursor()
+    pgv['get_query_cnt'](None, cursor, [1, 2])
+    pattern = re.search(r"query ~\* '([^']*)'", cursor.sql).group(1)
+    assert pattern == pgv['job_query_re']
+
+    commands = [('VACUUM', ['ANALYZE', '']), ('VACUUM', ['']), ('ANALYZE', []), ('VACUUM', ['FREEZE', 'VERBOSE']), ('VACUUM', ['ANALYZE']),
+                ('VACUUM ANALYZE', []), ('VACUUM', ['ANALYZE', 'VERBOSE', 'DISABLE_PAGE_SKIPPING FALSE']), ('VACUUM', ['VERBOSE', '']), ('ANALYZE', ['VERBOSE'])]
+    for command, options in commands:
+        for parallel, buffer_limit, only in [(None, None, False), (2, None, False), (None, '1GB', False), (1, '256MB', False), (None, None, True)]:
+            job = pgv['VacuumJob']('public."t"', command, options, 'X')
+            job.parallel, job.buffer_limit, job.only = parallel, buffer_limit, only
+            assert re.match(pattern, job.sql(), re.I), job.sql()
+            assert re.match(pattern, job.sql().lower(), re.I), job.sql()
+    assert not re.match(pattern, "SET vacuum_cost_delay = 0", re.I)
+
+def test_priority_score(pgv):
+    estimate = lambda size: pgv['job_overhead'] + float(size) / pgv['io_rate']
+    dirty = relation(pgv, 1, size=4 * pgv['io_rate'], n_live_tup=5000, n_dead_tup=1000, n_mod_since_analyze=200, last_analyzed='2026-10-01')
+    assert pgv['priority_score'](dirty, 'VACUUM') == pytest.approx(1000 / estimate(4 * pgv['io_rate']))
+    # analyzes read a sample, and count the tuples modified since the last one
+    assert pgv['priority_score'](dirty, 'ANALYZE') == pytest.approx(200 / estimate(pgv['analyze_sample_bytes']))
+
+    never = relation(pgv, 2, size=8192, n_live_tup=300)
+    assert pgv['priority_score'](never, 'ANALYZE') == pytest.approx(300 / estimate(8192))
+
+    # three quarters of the way to the freeze max age: half its tuples to freeze
+    old = relation(pgv, 3, size=8192, reltuples=4000, n_live_tup=4000, xid_age=pgv['freeze_max_age'] * 3 // 4)
+    assert pgv['priority_score'](old, 'VACUUM') == pytest.approx(2000 / estimate(8192))
+
+    # the visibility map leaves a vacuum of a mostly all-visible table less to read
+    allvisible = relation(pgv, 4, size=100 * 8192, n_dead_tup=10, relpages=100, relallvisible=100)
+    notvisible = relation(pgv, 5, size=100 * 8192, n_dead_tup=10, relpages=100, relallvisible=0)
+    assert pgv['priority_score'](allvisible, 'VACUUM') > pgv['priority_score'](notvisible, 'VACUUM')
+
+def test_priority_score_partitioned(pgv):
+    estimate = lambda size: pgv['job_overhead'] + float(size) / pgv['io_rate']
+    parent = relation(pgv, 10, relkind='p', n_dead_tup=0, xid_age=2147483647)
+    relation(pgv, 11, size=8192, reltuples=100, n_live_tup=100, xid_age=pgv['freeze_max_age'])
+    relation(pgv, 12, size=8192, reltuples=100, n_live_tup=100)
+    partitions(pgv, 10, [11, 12])
+    # the age and size of its partitions, not its own INT_MAX age and zero size
+    assert pgv['priority_score'](parent, 'VACUUM') == pytest.approx(100 / estimate(2 * 8192))
+
+def test_visibility(pgv):
+    rel = relation(pgv, 1, relpages=100, relallvisible=80, n_dead_tup=5, n_mod_since_analyze=10)
+    assert pgv['visibility'](rel) == (100, 70, None)
+    rel.relallfrozen = 90
+    assert pgv['visibility'](rel) == (100, 70, 70)
+    rel.relallvisible = 500
+    assert pgv['visibility'](rel) == (100, 90, 90)
+    pgv['vm_cache'][1] = (100, 99, 98)
+    assert pgv['visibility'](rel) == (100, 99, 98)
+
+def test_vacuum_io(pgv):
+    block = pgv['block_size']
+    rel = relation(pgv, 1, size=120 * block, relpages=100, relallvisible=70, relallfrozen=40)
+    assert pgv['vacuum_io'](rel, False) == (100, 30, 30 * block)
+    assert pgv['vacuum_io'](rel, True) == (100, 60, 60 * block)
+    # dead tuples to remove: indexes and TOAST are read too, and each may have cleared an all-visible bit
+    rel.n_dead_tup = 1
+    assert pgv['vacuum_io'](rel, False) == (100, 31, 31 * block + 20 * block)
+    pgv['disablepageskipping'] = True
+    assert pgv['vacuum_io'](rel, False) == (100, 100, 120 * block)
+    assert pgv['vacuum_io'](relation(pgv, 2, relkind='p', relpages=10), False) is None
+    assert pgv['vacuum_io'](relation(pgv, 3, relpages=0), False) is None
+
+def test_reclaimable(pgv):
+    pgv['bloat'] = {1: [8192, 4096, 100], 2: [0, 0, 100]}
+    assert pgv['reclaimable'](1) == 12288
+    assert pgv['reclaimable'](2) == 0
+    assert pgv['reclaimable'](3) is None
+    # pgstattuple_approx() figures already read replace the heap estimate
+    relation(pgv, 1)
+    pgv['bloat_mode'] = 'approx'
+    pgv['bloat_approx'][1] = 100
+    assert pgv['reclaimable'](1) == 4196
+
+def test_reclaimable_partitioned(pgv):
+    pgv['bloat'] = {11: [100, 10, 100], 12: [200, 20, 90]}
+    children = {10: [11, 12], 20: [21, 11]}
+    assert pgv['partition_bloat'](10, children) == [300, 30, 100]
+    assert pgv['reclaimable'](10) == 330
+    # one partition without an estimate leaves its parent without one
+    assert pgv['partition_bloat'](20, children) is None
+    assert pgv['reclaimable'](20) is None
+
+def test_partition_order(pgv):
+    partitions(pgv, 100, [1, 2, 3])
+    partitions(pgv, 200, [4, 5])
+    for oid, dead in [(1, 10), (2, 30), (3, 20), (4, 5), (5, 50)]:
+        relation(pgv, oid, n_dead_tup=dead)
+    rows = [('a', 1), ('plain', 9), ('b', 2), ('c', 3), ('d', 4), ('e', 5)]
+    # hottest first within each parent, taking from each parent in turn, plain tables keep their place
+    assert [row[-1] for row in pgv['partition_order'](rows)] == [2, 9, 5, 3, 4, 1]
+    assert pgv['partition_order']([('a', 1), ('plain', 9)]) == [('a', 1), ('plain', 9)]
+
+def test_child_args(pgv, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['pg_vacuum.py', '-H', 'host', '-d', 'db', '-Z', '-D', '23:00', '-j', '4', '--budget=30', '-Iinv.ini', '-r'])
+    drop = [('-Z', '--alldatabases', False), ('-I', '--inventory', True)]
+    assert pgv['child_args'](drop, ['-d', 'other'], 12) == \
+           [sys.executable, SOURCE, '-H', 'host', '-d', 'db', '-j', '4', '-r', '-d', 'other', '-B', '12']
+    assert pgv['child_args']([], [], None) == [sys.executable, SOURCE, '-H', 'host', '-d', 'db', '-Z', '-j', '4', '-Iinv.ini', '-r']
+
+def test_freeze_plan(pgv):
+    class History(object):
+        rates = (10.0, None, 3600.0)
+        def burn_rates(self):
+            return self.rates
+    pgv['history'] = History()
+    # table, sizep, xid_age, freeze max age, ..., size, ..., oid, mxid_age, multixact freeze max age
+    row = lambda oid, xidage, size: ('public."t%d"' % oid, '', xidage, 1000000, 0, 0, size, 0, 0, oid, 0, 4000000)
+    rows = [row(1, 1000000 - 100, 10), row(2, 1000000 - 36100, 100), row(3, 1000000 - 72100, 100), row(4, 0, 100)]
+
+    assert pgv['freeze_plan'](rows) is None
+    pgv['freeze_windows'] = 3
+    # due now, then the next most urgent until this window has a third of the bytes due within three windows
+    assert pgv['freeze_plan'](rows) == set([1, 2])
+    pgv['freeze'] = 500000
+    assert pgv['freeze_plan'](rows) == set([1, 2, 3])
+
+    History.rates = None
+    assert pgv['freeze_plan'](rows) is None
+    pgv['freeze'] = -1
+    assert pgv['freeze_plan'](rows) == set()
+
+def test_budget(pgv):
+    job1, job2, job3 = object(), object(), object()
+    budget = pgv['Budget'](1000, 100, 600)
+    assert budget.reserve(job1, 800) == 600
+    assert budget.reserve(job2, 800) == 400
+    # never less than the floor, the server setting each job gets anyway
+    assert budget.reserve(job3, 50) == 100
+    assert budget.used == 1100
+    budget.release(job1)
+    assert budget.used == 500
+    budget.release(job1)
+    assert budget.used == 500
+    budget.release(job2)
+    budget.release(job3)
+    assert budget.used == 0 and budget.grants == {}
+
+def snapshot(pgv, *rels):
+    pgv['snapshot'] = list(rels)
+    return rels
+
+def test_snapshot_vacuum_analyze(pgv):
+    snapshot(pgv,
+        relation(pgv, 1, n_dead_tup=2000, days_analyze=3, days_vacuum=3, last_vacuum='x', last_analyze='x'),
+        relation(pgv, 2, n_dead_tup=2000, days_analyze=0, days_vacuum=3, last_vacuum='x', last_analyze='x'),
+        relation(pgv, 3, n_dead_tup=2000),
+        relation(pgv, 4, last_autovacuum='x'))
+    pgv['threshold_dead_tups'] = 1000
+    pgv['threshold_max_days_analyze'] = 1
+    pgv['threshold_max_days_vacuum'] = 1
+    # no days since a vacuum or analyze that never happened satisfy a threshold
+    assert [row[-1] for row in pgv['snapshot_vacuum_analyze']()] == [1]
+    pgv['threshold_dead_tups'] = -1
+    pgv['threshold_max_days_analyze'] = -1
+    pgv['threshold_max_days_vacuum'] = -1
+    rows = pgv['snapshot_vacuum_analyze']()
+    assert [row[-1] for row in rows] == [1, 2, 3]
+    assert rows[2][-2] == 'NOVACS' and rows[0][-2] == 'VACS'
+
+def test_snapshot_vacuum(pgv):
+    snapshot(pgv,
+        relation(pgv, 1, n_dead_tup=5, days_vacuum=1, last_vacuum='x', last_vacuumed_ts=20),
+        relation(pgv, 2, n_dead_tup=5),
+        relation(pgv, 3, n_dead_tup=5, days_vacuum=1, last_autovacuum='x', last_vacuumed_ts=10),
+        relation(pgv, 4, n_dead_tup=0, days_vacuum=1, last_vacuum='x', last_vacuumed_ts=5))
+    pgv['threshold_dead_tups'] = 1
+    pgv['threshold_max_days_vacuum'] = 1
+    assert [row[-1] for row in pgv['snapshot_vacuum']()] == [1, 3]
+    pgv['threshold_dead_tups'] = 0
+    pgv['threshold_max_days_vacuum'] = 0
+    pgv['orderbydate'] = True
+    assert [row[-1] for row in pgv['snapshot_vacuum']()] == [4, 3, 1]
+    pgv['threshold_dead_tups'] = -1
+    pgv['threshold_max_days_vacuum'] = -1
+    # never vacuumed last
+    assert [row[-1] for row in pgv['snapshot_vacuum']()] == [4, 3, 1, 2]
+
+def test_snapshot_analyze(pgv):
+    snapshot(pgv,
+        relation(pgv, 1, days_analyze=5, size=100, reltuples=200.0, n_live_tup=100),
+        relation(pgv, 2, relkind='m', days_analyze=5),
+        relation(pgv, 3, relkind='p', days_analyze=5, size=100),
+        relation(pgv, 4, days_analyze=5, size=10000),
+        relation(pgv, 5, days_analyze=1))
+    pgv['threshold_max_days_analyze'] = 1
+    pgv['threshold_max_size'] = 1000
+    rows = pgv['snapshot_analyze']()
+    assert [row[-1] for row in rows] == [1, 3]
+    assert [row[-3] for row in rows] == [50, -1]
+
+def test_snapshot_old_vacuums(pgv):
+    snapshot(pgv,
+        relation(pgv, 1, days_vacuum=10, n_dead_tup=50),
+        relation(pgv, 2, days_vacuum=10, n_dead_tup=5),
+        relation(pgv, 3, relkind='m', days_vacuum=10, n_dead_tup=50),
+        relation(pgv, 4, n_dead_tup=50),
+        relation(pgv, 5, relkind='p', days_vacuum=8, n_dead_tup=50))
+    pgv['threshold_max_days_vacuum'] = 7
+    pgv['threshold_dead_tups'] = 10
+    assert [row[-1] for row in pgv['snapshot_old_vacuums']()] == [1, 5]